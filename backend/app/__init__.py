@@ -1,6 +1,6 @@
 import os
 from flask import Flask
-from backend.app.extensions import db
+from backend.app.extensions import db, cache
 from backend.app.api.auth.routes import bp as auth_bp
 from backend.app.api.users.routes import bp as users_bp
 from backend.app.api.data import bp as data_bp
@@ -15,6 +15,7 @@ def create_app():
     app = Flask(__name__)
     app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev-secret")
     db.init_db()
+    cache.init_cache()
     if CORS:
         origins = os.getenv("CORS_ORIGINS", "*")
         CORS(app,
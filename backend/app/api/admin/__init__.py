@@ -2,7 +2,10 @@ from flask import Blueprint, request
 from functools import wraps
 from backend.app.utils.response import ok, bad_request, unauthorized, forbidden
 from backend.app.services.auth import verify_token
-from backend.app.repositories import cities, sync_logs, analytics
+from backend.app.repositories import cities, sync_logs, analytics, users
+from backend.app.utils.pagination import parse_bool
+from backend.app.services import data_cache, sources, health_advice
+from backend.app.tasks import jobs
 from datetime import datetime, date, timedelta
 
 bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -14,7 +17,11 @@ def require_admin(f):
         if not token:
             return unauthorized('token_required')
         
-        user_info = verify_token(token)
+        user_id = verify_token(token)
+        if not user_id:
+            return unauthorized('invalid_token')
+        
+        user_info = users.get_by_id(user_id)
         if not user_info:
             return unauthorized('invalid_token')
         
@@ -44,6 +51,8 @@ def create_city():
         if error:
             return bad_request('create_failed')
         
+        data_cache.invalidate_city(city['id'])
+        
         return ok(city, 'created')
     except Exception as e:
         return bad_request('server_error')
@@ -69,6 +78,8 @@ def update_city(city_id):
         if error:
             return bad_request('update_failed')
         
+        data_cache.invalidate_city(city_id)
+        
         return ok(updated_city, 'updated')
     except Exception as e:
         return bad_request('server_error')
@@ -86,6 +97,8 @@ def delete_city(city_id):
         if not success:
             return bad_request('delete_failed')
         
+        data_cache.invalidate_city(city_id)
+        
         return ok({}, 'deleted')
     except Exception as e:
         return bad_request('server_error')
@@ -96,30 +109,43 @@ def trigger_sync():
     try:
         data = request.get_json() or {}
         source = data.get('source', 'AQICN').upper()
+        city_ids = data.get('city_ids')
         
-        if source not in ['AQICN', 'OPENAQ']:
+        if source not in sources.SOURCES:
             return bad_request('invalid_source')
         
-        log_id, error = sync_logs.log_sync(
-            sync_type='manual',
-            data_source=source,
-            start_time=datetime.utcnow(),
-            status='in_progress'
-        )
+        if city_ids is not None:
+            if not isinstance(city_ids, list) or not all(isinstance(c, int) for c in city_ids):
+                return bad_request('invalid_city_ids')
+            found, error = cities.get_cities_by_ids(city_ids)
+            if error:
+                return bad_request('query_failed')
+            if len(found) != len(set(city_ids)):
+                return bad_request('city_not_found')
         
+        job, error = jobs.submit_sync(source, city_ids or None)
+        
+        if error == 'source_not_supported':
+            return bad_request('source_not_supported')
         if error:
             return bad_request('sync_failed')
         
-        sync_logs.update_sync_log(
-            log_id,
-            end_time=datetime.utcnow(),
-            status='success',
-            success_count=0,
-            fail_count=0,
-            total_count=0
-        )
+        return ok(job, 'sync_triggered')
+    except Exception as e:
+        return bad_request('server_error')
+
+@bp.route('/data/sync/<int:sync_id>', methods=['GET'])
+@require_admin
+def get_sync_status(sync_id):
+    try:
+        log, error = sync_logs.get_sync_log(sync_id)
         
-        return ok({'sync_id': log_id}, 'sync_triggered')
+        if error == 'not_found':
+            return bad_request('sync_not_found')
+        if error:
+            return bad_request('query_failed')
+        
+        return ok(log, 'success')
     except Exception as e:
         return bad_request('server_error')
 
@@ -146,6 +172,23 @@ def get_sync_logs():
         
         page_size = min(page_size, 100)
         
+        if 'cursor' in request.args:
+            items, next_cursor, total, error = sync_logs.get_sync_logs_keyset(
+                start_date, end_date, request.args.get('cursor'), page_size,
+                with_total=parse_bool(request.args.get('with_total'))
+            )
+            if error == 'invalid_cursor':
+                return bad_request('invalid_cursor')
+            if error:
+                return bad_request('query_failed')
+            
+            return ok({
+                'items': items,
+                'next_cursor': next_cursor,
+                'total': total,
+                'page_size': page_size,
+            }, 'success')
+        
         items, total, error = sync_logs.get_sync_logs(start_date, end_date, page, page_size)
         
         if error:
@@ -186,14 +229,33 @@ def get_usage_stats():
         end_date = date.today()
         start_date = end_date - timedelta(days=days)
         
-        dau_items, error1 = analytics.get_dau_stats(start_date, end_date)
-        top_cities_items, error2 = analytics.get_top_cities(start_date, end_date, limit=5)
-        feature_items, error3 = analytics.get_feature_usage(start_date, end_date)
+        summary, error = analytics.get_usage_summary(start_date, end_date, top_limit=5)
         
         return ok({
-            'dau': dau_items,
-            'top_cities': top_cities_items,
-            'feature_usage': feature_items,
+            'dau': summary['dau'],
+            'top_cities': summary['top_cities'],
+            'feature_usage': summary['feature_usage'],
         }, 'success')
     except Exception as e:
         return bad_request('server_error')
+
+@bp.route('/cache/stats', methods=['GET'])
+@require_admin
+def get_cache_stats():
+    try:
+        return ok(data_cache.stats(), 'success')
+    except Exception as e:
+        return bad_request('server_error')
+
+@bp.route('/health-advice/reload', methods=['POST'])
+@require_admin
+def reload_health_advice():
+    try:
+        # Every worker rebuilds its advice index on its next lookup
+        data_cache.invalidate_health_advice()
+        index, error = health_advice.get_index()
+        if error:
+            return bad_request('query_failed')
+        return ok({'rules': index.rules, 'entries': len(index.entries)}, 'reloaded')
+    except Exception as e:
+        return bad_request('server_error')
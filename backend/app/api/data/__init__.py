@@ -1,9 +1,11 @@
-from flask import Blueprint, request
+from flask import Blueprint, Response, request
 from functools import wraps
 from backend.app.utils.response import ok, bad_request, unauthorized
 from backend.app.services.auth import verify_token
-from backend.app.repositories import cities, air_quality, analytics
-from datetime import datetime
+from backend.app.repositories import cities, air_quality, analytics, series
+from backend.app.utils.pagination import parse_bool
+from backend.app.services import data_cache, city_index, export, forecast, health_advice
+from datetime import datetime, timedelta
 
 bp = Blueprint('data', __name__, url_prefix='/data')
 
@@ -18,10 +20,17 @@ def require_login(f):
         if not user_info:
             return unauthorized('invalid_token')
         
-        request.user = user_info
+        request.user = {'id': user_info}
         return f(*args, **kwargs)
     return decorated_function
 
+def parse_city_ids(value):
+    # "1,2,3" -> [1, 2, 3] without duplicates, None when malformed
+    try:
+        return list(dict.fromkeys(int(x) for x in value.split(',') if x.strip()))
+    except ValueError:
+        return None
+
 @bp.route('/cities', methods=['GET'])
 @require_login
 def list_cities():
@@ -33,6 +42,23 @@ def list_cities():
         
         page_size = min(page_size, 100)
         
+        if 'cursor' in request.args:
+            items, next_cursor, total, error = cities.get_all_cities_keyset(
+                q, province, request.args.get('cursor'), page_size,
+                with_total=parse_bool(request.args.get('with_total'))
+            )
+            if error == 'invalid_cursor':
+                return bad_request('invalid_cursor')
+            if error:
+                return bad_request('query_failed')
+            
+            return ok('success', {
+                'items': items,
+                'next_cursor': next_cursor,
+                'total': total,
+                'page_size': page_size,
+            })
+        
         items, total, error = cities.get_all_cities(q, province, page, page_size)
         
         if error:
@@ -47,11 +73,63 @@ def list_cities():
     except Exception as e:
         return bad_request('server_error')
 
+@bp.route('/cities/search', methods=['GET'])
+@require_login
+def search_cities():
+    try:
+        q = request.args.get('q', default='', type=str).strip()
+        limit = request.args.get('limit', default=10, type=int)
+        
+        if not q:
+            return bad_request('q_required')
+        
+        limit = max(1, min(limit, 50))
+        items, error = city_index.search(q, limit)
+        
+        if error:
+            return bad_request('query_failed')
+        
+        return ok('success', {
+            'items': items,
+            'q': q,
+        })
+    except Exception as e:
+        return bad_request('server_error')
+
+@bp.route('/cities/nearby', methods=['GET'])
+@require_login
+def nearby_cities():
+    try:
+        lat = request.args.get('lat', type=float)
+        lon = request.args.get('lon', type=float)
+        k = request.args.get('k', default=5, type=int)
+        radius_km = request.args.get('radius_km', default=None, type=float)
+        
+        if lat is None or lon is None or not -90 <= lat <= 90 or not -180 <= lon <= 180:
+            return bad_request('invalid_coordinates')
+        
+        if radius_km is not None and radius_km <= 0:
+            return bad_request('invalid_radius')
+        
+        k = max(1, min(k, 50))
+        items, error = city_index.nearby(lat, lon, k, radius_km)
+        
+        if error:
+            return bad_request('query_failed')
+        
+        return ok('success', {
+            'items': items,
+            'k': k,
+            'radius_km': radius_km,
+        })
+    except Exception as e:
+        return bad_request('server_error')
+
 @bp.route('/cities/<int:city_id>', methods=['GET'])
 @require_login
 def get_city(city_id):
     try:
-        city = cities.get_city_by_id(city_id)
+        city = data_cache.get_city(city_id)
         if not city:
             return bad_request('city_not_found')
         
@@ -86,6 +164,23 @@ def query_air_quality():
         
         page_size = min(page_size, 100)
         
+        if 'cursor' in request.args:
+            items, next_cursor, total, error = air_quality.query_air_quality_data_keyset(
+                city_id, start_time, end_time, request.args.get('cursor'), page_size,
+                with_total=parse_bool(request.args.get('with_total'))
+            )
+            if error == 'invalid_cursor':
+                return bad_request('invalid_cursor')
+            if error:
+                return bad_request('query_failed')
+            
+            return ok('success', {
+                'items': items,
+                'next_cursor': next_cursor,
+                'total': total,
+                'page_size': page_size,
+            })
+        
         items, total, error = air_quality.query_air_quality_data(
             city_id, start_time, end_time, None, page, page_size
         )
@@ -112,18 +207,197 @@ def get_latest_detail():
         if not city_id:
             return bad_request('city_id_required')
         
-        city = cities.get_city_by_id(city_id)
+        city = data_cache.get_city(city_id)
         if not city:
             return bad_request('city_not_found')
         
-        data = air_quality.get_latest_air_quality(city_id)
+        data = data_cache.get_latest_air_quality(city_id)
         
         user_id = request.user.get('id')
         analytics.log_user_action(user_id, 'view_data', city_id)
         
+        # Matched in memory; advice is extra, so an index that cannot load
+        # leaves it empty rather than failing the request
+        tag = data_cache.get_user_tag(user_id)
+        advice, _ = health_advice.advice_for(data, tag)
+        
         return ok('success', {
             'city': city,
             'latest_data': data,
+            'target_group': tag or health_advice.GENERAL_TARGET_GROUP,
+            'health_advice': advice,
+        })
+    except Exception as e:
+        return bad_request('server_error')
+
+@bp.route('/latest', methods=['GET'])
+@require_login
+def get_latest_many():
+    try:
+        city_ids = request.args.get('city_ids', default='', type=str)
+        
+        catalog, error = city_index.get_catalog()
+        if error:
+            return bad_request('query_failed')
+        
+        if city_ids:
+            city_ids = parse_city_ids(city_ids)
+            if city_ids is None:
+                return bad_request('invalid_city_ids')
+            if len(city_ids) > 500:
+                return bad_request('too_many_city_ids')
+            city_ids = [city_id for city_id in city_ids if city_id in catalog.cities]
+        else:
+            # National overview: every city in one round trip
+            city_ids = list(catalog.cities)
+        
+        readings, error = data_cache.get_latest_air_quality_many(city_ids)
+        
+        if error:
+            return bad_request('query_failed')
+        
+        return ok('success', {
+            'items': [
+                {'city': catalog.cities[city_id], 'latest_data': readings.get(city_id)}
+                for city_id in city_ids
+            ],
+            'total': len(city_ids),
+        })
+    except Exception as e:
+        return bad_request('server_error')
+
+@bp.route('/export', methods=['GET'])
+@require_login
+def export_air_quality():
+    try:
+        city_ids = request.args.get('city_ids', default='', type=str)
+        start_time = request.args.get('start_time', default=None, type=str)
+        end_time = request.args.get('end_time', default=None, type=str)
+        fmt = request.args.get('format', default='csv', type=str)
+        
+        if fmt not in export.EXPORT_FORMATS:
+            return bad_request('invalid_format')
+        
+        if city_ids:
+            city_ids = parse_city_ids(city_ids)
+            if city_ids is None:
+                return bad_request('invalid_city_ids')
+        else:
+            city_ids = None
+        
+        if start_time:
+            try:
+                start_time = datetime.fromisoformat(start_time)
+            except:
+                return bad_request('invalid_start_time')
+        
+        if end_time:
+            try:
+                end_time = datetime.fromisoformat(end_time)
+            except:
+                return bad_request('invalid_end_time')
+        
+        stream, error = export.open_export(fmt, city_ids, start_time, end_time)
+        if error:
+            return bad_request(error)
+        
+        mimetype, extension = export.EXPORT_FORMATS[fmt]
+        return Response(stream, mimetype=mimetype, headers={
+            'Content-Disposition': f'attachment; filename=air_quality.{extension}',
+        })
+    except Exception as e:
+        return bad_request('server_error')
+
+# Upper bound on buckets x cities per /series response
+SERIES_MAX_POINTS = 20000
+SERIES_BUCKET_HOURS = {'hour': 1, 'day': 24, 'week': 168, 'month': 672}
+
+@bp.route('/series', methods=['GET'])
+@require_login
+def get_series():
+    try:
+        city_ids = request.args.get('city_ids', default=None, type=str) or request.args.get('city_id', default='', type=str)
+        start_time = request.args.get('start_time', default=None, type=str)
+        end_time = request.args.get('end_time', default=None, type=str)
+        interval = request.args.get('interval', default='day', type=str)
+        pollutants = request.args.get('pollutants', default='aqi', type=str).split(',')
+        aggregates = request.args.get('aggregates', default='avg', type=str).split(',')
+        
+        city_ids = parse_city_ids(city_ids)
+        if not city_ids:
+            return bad_request('city_id_required')
+        
+        if interval not in series.SERIES_INTERVALS:
+            return bad_request('invalid_interval')
+        
+        pollutants = list(dict.fromkeys(p.strip() for p in pollutants if p.strip()))
+        if not pollutants or any(p not in series.SERIES_POLLUTANTS for p in pollutants):
+            return bad_request('invalid_pollutants')
+        
+        aggregates = list(dict.fromkeys(a.strip() for a in aggregates if a.strip()))
+        if not aggregates or any(a not in series.SERIES_AGGREGATES for a in aggregates):
+            return bad_request('invalid_aggregates')
+        
+        try:
+            end_time = datetime.fromisoformat(end_time) if end_time else datetime.utcnow()
+        except:
+            return bad_request('invalid_end_time')
+        
+        try:
+            start_time = datetime.fromisoformat(start_time) if start_time else end_time - timedelta(days=30)
+        except:
+            return bad_request('invalid_start_time')
+        
+        buckets = (end_time - start_time).total_seconds() / 3600 / SERIES_BUCKET_HOURS[interval]
+        if buckets * len(city_ids) > SERIES_MAX_POINTS:
+            return bad_request('too_many_points')
+        
+        result, error = series.get_series(city_ids, start_time, end_time, interval, pollutants, aggregates)
+        
+        if error:
+            return bad_request('query_failed')
+        
+        return ok('success', {
+            'interval': interval,
+            'start_time': start_time.isoformat(),
+            'end_time': end_time.isoformat(),
+            'source': result['source'],
+            'columns': result['columns'],
+            'series': [
+                {'city_id': city_id, **values} for city_id, values in result['series'].items()
+            ],
+        })
+    except Exception as e:
+        return bad_request('server_error')
+
+@bp.route('/forecast', methods=['GET'])
+@require_login
+def get_forecast():
+    try:
+        city_id = request.args.get('city_id', type=int)
+        hours = request.args.get('hours', default=forecast.HORIZON, type=int)
+        
+        if not city_id:
+            return bad_request('city_id_required')
+        
+        if hours < 1 or hours > forecast.HORIZON:
+            return bad_request('invalid_hours')
+        
+        city = data_cache.get_city(city_id)
+        if not city:
+            return bad_request('city_not_found')
+        
+        result, error = forecast.get_forecast(city_id)
+        
+        if error:
+            return bad_request('query_failed')
+        if result is None:
+            return bad_request('not_enough_data')
+        
+        return ok('success', {
+            'city': city,
+            **result,
+            'points': result['points'][:hours],
         })
     except Exception as e:
         return bad_request('server_error')
@@ -138,12 +412,12 @@ def get_monthly_stats():
         if not city_id:
             return bad_request('city_id_required')
         
-        city = cities.get_city_by_id(city_id)
+        city = data_cache.get_city(city_id)
         if not city:
             return bad_request('city_not_found')
         
         months = min(months, 24)
-        items, error = air_quality.get_monthly_stats(city_id, months)
+        items, error = data_cache.get_monthly_stats(city_id, months)
         
         if error:
             return bad_request('query_failed')
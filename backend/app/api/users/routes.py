@@ -2,6 +2,7 @@ from flask import Blueprint, request
 from backend.app.utils.response import ok, bad_request, unauthorized, conflict
 from backend.app.repositories.users import get_by_id, update_user, update_tag
 from backend.app.services.auth import verify_token
+from backend.app.services import data_cache
 
 bp = Blueprint("users", __name__, url_prefix="/users")
 
@@ -49,4 +50,5 @@ def update_me_tags():
     user, err = update_tag(uid, tag)
     if err == "bad_request":
         return bad_request("invalid tag")
+    data_cache.invalidate_user(uid)
     return ok({k: user[k] for k in ["id", "phone", "nickname", "tag", "default_city_id", "role"]})
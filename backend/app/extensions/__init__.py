@@ -1 +1,2 @@
 from . import db
+from . import cache
@@ -0,0 +1,271 @@
+import os
+import json
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+MISS = object()
+
+cache = None
+
+class MemoryCache:
+    # Thread-safe TTL cache with LRU eviction. Values may be None, so lookups
+    # return the MISS sentinel when nothing usable is cached.
+    def __init__(self, max_entries=1000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return MISS
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def peek(self, key):
+        # Like get() but left out of the hit/miss counters. It still counts as
+        # a use, so keys only ever peeked (the index version keys) are not
+        # evicted as the least recently used.
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                return MISS
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def get_many(self, keys):
+        # {key: value} for the keys currently cached; absent keys are misses
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None or entry[0] <= now:
+                    if entry is not None:
+                        del self._entries[key]
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(key)
+                self.hits += 1
+                found[key] = entry[1]
+        return found
+
+    def set(self, key, value, ttl=None):
+        self.set_many({key: value}, ttl)
+
+    def set_many(self, items, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            for key, value in items.items():
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._entries if isinstance(k, str) and k.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "memory",
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else None,
+            }
+
+class FileCache:
+    # SQLite-backed cache shared by every process on the host (e.g. all
+    # Gunicorn workers), so invalidations and warm entries survive across
+    # workers and restarts. Values must be JSON serializable. When the store
+    # is full the entries closest to expiry are dropped first.
+    def __init__(self, path, max_entries=10000, ttl=300):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writes = 0
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_entries_expires ON cache_entries(expires_at)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _read(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM cache_entries WHERE key=? AND expires_at>?",
+            (str(key), time.time())
+        ).fetchone()
+        return MISS if row is None else json.loads(row[0])
+
+    def get(self, key):
+        value = self._read(key)
+        self._count(value is not MISS)
+        return value
+
+    def peek(self, key):
+        return self._read(key)
+
+    def get_many(self, keys):
+        keys = [str(key) for key in keys]
+        found = {}
+        conn = self._conn()
+        now = time.time()
+        # Stay below SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = conn.execute(
+                f"SELECT key, value FROM cache_entries WHERE key IN ({','.join('?' * len(chunk))}) AND expires_at>?",
+                (*chunk, now)
+            ).fetchall()
+            found.update((key, json.loads(value)) for key, value in rows)
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set(self, key, value, ttl=None):
+        self.set_many({key: value}, ttl)
+
+    def set_many(self, items, ttl=None):
+        if not items:
+            return
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        conn = self._conn()
+        rows = [(str(key), json.dumps(value), expires_at) for key, value in items.items()]
+        if len(rows) == 1:
+            conn.execute("INSERT OR REPLACE INTO cache_entries(key, value, expires_at) VALUES (?, ?, ?)", rows[0])
+        else:
+            # One transaction instead of one fsync'd commit per entry
+            with conn:
+                conn.execute("BEGIN")
+                conn.executemany(
+                    "INSERT OR REPLACE INTO cache_entries(key, value, expires_at) VALUES (?, ?, ?)", rows
+                )
+        with self._lock:
+            # Every 100th write, as before batching
+            check_size = (self._writes - 1) // 100 != (self._writes + len(rows) - 1) // 100
+            self._writes += len(rows)
+        if check_size:
+            self._enforce_limit(conn, now)
+
+    def _enforce_limit(self, conn, now):
+        count = conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        conn.execute("DELETE FROM cache_entries WHERE expires_at<=?", (now,))
+        overflow = conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM cache_entries WHERE key IN "
+                "(SELECT key FROM cache_entries ORDER BY expires_at LIMIT ?)",
+                (overflow,)
+            )
+            with self._lock:
+                self.evictions += overflow
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM cache_entries WHERE key=?", (str(key),))
+
+    def delete_prefix(self, prefix):
+        self._conn().execute(
+            "DELETE FROM cache_entries WHERE key>=? AND key<?",
+            (prefix, prefix + "\uffff")
+        )
+
+    def clear(self):
+        self._conn().execute("DELETE FROM cache_entries")
+
+    def stats(self):
+        entries = self._conn().execute(
+            "SELECT COUNT(*) FROM cache_entries WHERE expires_at>?", (time.time(),)
+        ).fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "file",
+                "path": self.path,
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else None,
+            }
+
+def init_cache():
+    global cache
+    if cache is not None:
+        return cache
+    backend = os.getenv("CACHE_BACKEND", "memory").lower()
+    max_entries = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+    ttl = float(os.getenv("CACHE_DEFAULT_TTL", "300"))
+    if backend == "file":
+        path = os.getenv("CACHE_PATH") or os.path.join(tempfile.gettempdir(), "aqi_cache.sqlite3")
+        try:
+            cache = FileCache(path, max_entries=max_entries, ttl=ttl)
+            return cache
+        except Exception as e:
+            print(f"Warning: File cache unavailable ({e}), falling back to memory cache.")
+    cache = MemoryCache(max_entries=max_entries, ttl=ttl)
+    return cache
+
+def get_cache():
+    if cache is None:
+        init_cache()
+    return cache
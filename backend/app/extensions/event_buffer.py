@@ -0,0 +1,109 @@
+import atexit
+import threading
+import time
+from collections import deque
+
+class EventBuffer:
+    # Bounded in-process queue drained by a background thread. A batch is
+    # written once `batch_size` events are waiting or `flush_interval` seconds
+    # have passed. When full, policy 'drop' discards new events right away and
+    # 'block' makes producers wait up to `block_timeout` before dropping.
+    def __init__(self, writer, max_size=10000, batch_size=500, flush_interval=2.0,
+                 policy='drop', block_timeout=0.05, name='event-buffer'):
+        self.writer = writer
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.name = name
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopped = False
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        atexit.register(self.stop)
+
+    def put(self, event):
+        with self._cond:
+            if len(self._queue) >= self.max_size and self.policy == 'block':
+                deadline = time.monotonic() + self.block_timeout
+                while len(self._queue) >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            if len(self._queue) >= self.max_size or self._stopped:
+                self.dropped += 1
+                return False
+            self._queue.append(event)
+            self.enqueued += 1
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+        self._ensure_thread()
+        return True
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _take_batch(self):
+        batch = []
+        while self._queue and len(batch) < self.batch_size:
+            batch.append(self._queue.popleft())
+        if batch:
+            self._cond.notify_all()
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stopped and len(self._queue) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                if self._stopped:
+                    return
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            while True:
+                with self._cond:
+                    batch = self._take_batch()
+                if not batch:
+                    return
+                try:
+                    _, error = self.writer(batch)
+                except Exception as e:
+                    error = str(e)
+                if error:
+                    self.failed += len(batch)
+                    print(f"Warning: {self.name} failed to write {len(batch)} events: {error}")
+                else:
+                    self.written += len(batch)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self.flush()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queued": len(self._queue),
+                "max_size": self.max_size,
+                "policy": self.policy,
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+            }
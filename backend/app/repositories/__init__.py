@@ -4,5 +4,9 @@ from . import air_quality
 from . import sync_logs
 from . import analytics
 from . import users
+from . import rollups
+from . import partitions
+from . import sync_state
+from . import series
 
-__all__ = ['cities', 'air_quality', 'sync_logs', 'analytics', 'users']
+__all__ = ['cities', 'air_quality', 'sync_logs', 'analytics', 'users', 'rollups', 'partitions', 'sync_state', 'series']
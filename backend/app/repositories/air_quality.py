@@ -1,6 +1,13 @@
-from backend.app.extensions.db import get_conn, put_conn
+import psycopg2
+from backend.app.extensions.db import get_conn, put_conn, database_url
+from backend.app.utils.pagination import encode_cursor, decode_cursor
+from backend.app.repositories.rollups import ROLLUP_POLLUTANTS, refresh_rollups_for, refresh_rollups_from_query
+from psycopg2.extras import execute_values
 from datetime import datetime
 
+READING_COLUMNS = ('city_id', 'recorded_time', 'aqi', 'aqi_level', 'dominant_pol',
+                   'pm25', 'pm10', 'o3', 'no2', 'so2', 'co', 'source', 'attribution')
+
 def save_air_quality_data(city_id, recorded_time, aqi=None, aqi_level=None, dominant_pol=None,
                          pm25=None, pm10=None, o3=None, no2=None, so2=None, co=None,
                          source=None, attribution=None):
@@ -14,7 +21,8 @@ def save_air_quality_data(city_id, recorded_time, aqi=None, aqi_level=None, domi
             ON CONFLICT (city_id, recorded_time) DO UPDATE SET
             aqi=EXCLUDED.aqi, aqi_level=EXCLUDED.aqi_level, dominant_pol=EXCLUDED.dominant_pol,
             pm25=EXCLUDED.pm25, pm10=EXCLUDED.pm10, o3=EXCLUDED.o3, no2=EXCLUDED.no2,
-            so2=EXCLUDED.so2, co=EXCLUDED.co, source=EXCLUDED.source, attribution=EXCLUDED.attribution
+            so2=EXCLUDED.so2, co=EXCLUDED.co, source=EXCLUDED.source, attribution=EXCLUDED.attribution,
+            is_suspect=FALSE, suspect_reason=NULL
             RETURNING id
         """, (city_id, recorded_time, aqi, aqi_level, dominant_pol, pm25, pm10, o3, no2, so2, co, source, attribution))
         
@@ -27,6 +35,117 @@ def save_air_quality_data(city_id, recorded_time, aqi=None, aqi_level=None, domi
     finally:
         put_conn(conn)
 
+def save_air_quality_batch(rows, page_size=500):
+    # Later rows win when the same (city_id, recorded_time) appears twice,
+    # matching what sequential upserts would leave behind.
+    deduped = {}
+    for row in rows:
+        deduped[(row['city_id'], row['recorded_time'])] = tuple(row.get(col) for col in READING_COLUMNS)
+    if not deduped:
+        return [], None
+    
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        result = execute_values(cur, """
+            INSERT INTO air_quality_data
+            (city_id, recorded_time, aqi, aqi_level, dominant_pol, pm25, pm10, o3, no2, so2, co, source, attribution)
+            VALUES %s
+            ON CONFLICT (city_id, recorded_time) DO UPDATE SET
+            aqi=EXCLUDED.aqi, aqi_level=EXCLUDED.aqi_level, dominant_pol=EXCLUDED.dominant_pol,
+            pm25=EXCLUDED.pm25, pm10=EXCLUDED.pm10, o3=EXCLUDED.o3, no2=EXCLUDED.no2,
+            so2=EXCLUDED.so2, co=EXCLUDED.co, source=EXCLUDED.source, attribution=EXCLUDED.attribution,
+            is_suspect=FALSE, suspect_reason=NULL
+            RETURNING id, city_id, recorded_time, aqi, aqi_level, dominant_pol,
+                      pm25, pm10, o3, no2, so2, co, source, attribution
+        """, list(deduped.values()), page_size=page_size, fetch=True)
+        
+        refresh_rollups_for(cur, {(city_id, recorded_time.date()) for city_id, recorded_time in deduped})
+        
+        conn.commit()
+        return [_reading_from_row(row) for row in result], None
+    except Exception as e:
+        conn.rollback()
+        return [], str(e)
+    finally:
+        put_conn(conn)
+
+def copy_air_quality_history(source, buffer_size=65536):
+    # `source` is a file-like object yielding CSV lines in READING_COLUMNS order.
+    # Rows go through COPY into a per-transaction staging table and are merged
+    # with the same (city_id, recorded_time) upsert rule as save_air_quality_batch.
+    columns = ", ".join(READING_COLUMNS)
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TEMP TABLE air_quality_staging (
+                seq BIGSERIAL,
+                city_id INT,
+                recorded_time TIMESTAMP,
+                aqi INT,
+                aqi_level VARCHAR(32),
+                dominant_pol VARCHAR(16),
+                pm25 DECIMAL(8, 2),
+                pm10 DECIMAL(8, 2),
+                o3 DECIMAL(8, 2),
+                no2 DECIMAL(8, 2),
+                so2 DECIMAL(8, 2),
+                co DECIMAL(8, 2),
+                source VARCHAR(32),
+                attribution TEXT
+            ) ON COMMIT DROP
+        """)
+        cur.copy_expert(
+            f"COPY air_quality_staging ({columns}) FROM STDIN WITH (FORMAT csv)",
+            source,
+            size=buffer_size
+        )
+        copied = cur.rowcount
+        
+        cur.execute(f"""
+            INSERT INTO air_quality_data ({columns})
+            SELECT DISTINCT ON (city_id, recorded_time) {columns}
+            FROM air_quality_staging
+            ORDER BY city_id, recorded_time, seq DESC
+            ON CONFLICT (city_id, recorded_time) DO UPDATE SET
+            aqi=EXCLUDED.aqi, aqi_level=EXCLUDED.aqi_level, dominant_pol=EXCLUDED.dominant_pol,
+            pm25=EXCLUDED.pm25, pm10=EXCLUDED.pm10, o3=EXCLUDED.o3, no2=EXCLUDED.no2,
+            so2=EXCLUDED.so2, co=EXCLUDED.co, source=EXCLUDED.source, attribution=EXCLUDED.attribution,
+            is_suspect=FALSE, suspect_reason=NULL
+        """)
+        merged = cur.rowcount
+        
+        refresh_rollups_from_query(
+            cur, "SELECT DISTINCT city_id, recorded_time::date FROM air_quality_staging"
+        )
+        
+        conn.commit()
+        return {"copied": copied, "merged": merged}, None
+    except Exception as e:
+        conn.rollback()
+        return None, str(e)
+    finally:
+        put_conn(conn)
+
+def _reading_from_row(row):
+    return {
+        "id": row[0],
+        "city_id": row[1],
+        "recorded_time": row[2].isoformat() if row[2] else None,
+        "aqi": row[3],
+        "aqi_level": row[4],
+        "dominant_pol": row[5],
+        "pm25": float(row[6]) if row[6] else None,
+        "pm10": float(row[7]) if row[7] else None,
+        "o3": float(row[8]) if row[8] else None,
+        "no2": float(row[9]) if row[9] else None,
+        "so2": float(row[10]) if row[10] else None,
+        "co": float(row[11]) if row[11] else None,
+        "source": row[12],
+        "attribution": row[13],
+    }
+
 def query_air_quality_data(city_id, start_time=None, end_time=None, pollutant=None, page=1, page_size=20):
     conn = get_conn()
     try:
@@ -86,6 +205,234 @@ def query_air_quality_data(city_id, start_time=None, end_time=None, pollutant=No
     finally:
         put_conn(conn)
 
+def query_air_quality_data_keyset(city_id, start_time=None, end_time=None, cursor=None,
+                                  page_size=20, with_total=False):
+    # Seeks on (recorded_time, id) instead of OFFSET so deep pages cost the same
+    # as the first one; the exact COUNT(*) only runs when asked for.
+    try:
+        after = decode_cursor(cursor, 2)
+        after_key = [datetime.fromisoformat(after[0]), int(after[1])] if after else None
+    except (ValueError, TypeError):
+        return [], None, None, 'invalid_cursor'
+    
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        
+        where_clauses = ["city_id=%s"]
+        params = [city_id]
+        
+        if start_time:
+            where_clauses.append("recorded_time >= %s")
+            params.append(start_time)
+        
+        if end_time:
+            where_clauses.append("recorded_time <= %s")
+            params.append(end_time)
+        
+        total = None
+        if with_total:
+            cur.execute(f"SELECT COUNT(*) FROM air_quality_data WHERE {' AND '.join(where_clauses)}", params)
+            total = cur.fetchone()[0]
+        
+        if after_key:
+            where_clauses.append("(recorded_time, id) < (%s, %s)")
+            params.extend(after_key)
+        
+        query_sql = f"""
+            SELECT id, city_id, recorded_time, aqi, aqi_level, dominant_pol, 
+                   pm25, pm10, o3, no2, so2, co, source, attribution
+            FROM air_quality_data
+            WHERE {' AND '.join(where_clauses)}
+            ORDER BY recorded_time DESC, id DESC
+            LIMIT %s
+        """
+        params.append(page_size + 1)
+        cur.execute(query_sql, params)
+        rows = cur.fetchall()
+        
+        items = [_reading_from_row(row) for row in rows[:page_size]]
+        next_cursor = None
+        if len(rows) > page_size:
+            last = items[-1]
+            next_cursor = encode_cursor(last["recorded_time"], last["id"])
+        
+        return items, next_cursor, total, None
+    except Exception as e:
+        return [], None, None, str(e)
+    finally:
+        put_conn(conn)
+
+class ExportRows:
+    # Rows of an opened export cursor: the first chunk is already fetched,
+    # the rest follows fetch_size rows per round trip. Closes the dedicated
+    # connection when exhausted or closed.
+    def __init__(self, conn, cur, first, fetch_size):
+        self._conn = conn
+        self._cur = cur
+        self._first = first
+        self._fetch_size = fetch_size
+
+    def __iter__(self):
+        try:
+            rows = self._first
+            while rows:
+                yield from rows
+                if len(rows) < self._fetch_size:
+                    break
+                rows = self._cur.fetchmany(self._fetch_size)
+        finally:
+            self.close()
+
+    def close(self):
+        self._conn.close()
+
+def open_air_quality_rows(city_ids=None, start_time=None, end_time=None, fetch_size=5000):
+    # Streams READING_COLUMNS tuples (pollutants as floats) ordered by city and time from a named
+    # (server-side) cursor. A dedicated connection is used so a slow download
+    # never holds a pool connection. The connection, the query and the first
+    # fetch happen here, so their errors surface before a response has
+    # started. Returns (ExportRows, error).
+    where_clauses = []
+    params = []
+    
+    if city_ids is not None:
+        where_clauses.append("city_id = ANY(%s)")
+        params.append(list(city_ids))
+    if start_time:
+        where_clauses.append("recorded_time >= %s")
+        params.append(start_time)
+    if end_time:
+        where_clauses.append("recorded_time <= %s")
+        params.append(end_time)
+    
+    where_sql = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+    conn = None
+    try:
+        conn = psycopg2.connect(database_url())
+        conn.set_session(readonly=True)
+        cur = conn.cursor(name='air_quality_export')
+        # float8 instead of DECIMAL spares building a Decimal per value
+        select_sql = ', '.join(
+            f"{col}::float8" if col in ('pm25', 'pm10', 'o3', 'no2', 'so2', 'co') else col
+            for col in READING_COLUMNS
+        )
+        cur.execute(
+            f"SELECT {select_sql} FROM air_quality_data{where_sql} ORDER BY city_id, recorded_time",
+            params
+        )
+        first = cur.fetchmany(fetch_size)
+        return ExportRows(conn, cur, first, fetch_size), None
+    except Exception as e:
+        if conn is not None:
+            conn.close()
+        return None, str(e)
+
+ANALYSIS_POLLUTANTS = ROLLUP_POLLUTANTS
+
+def get_analysis_rows(city_ids, start_time=None):
+    # Rows for the anomaly detection, ordered by city and time, as all-float
+    # tuples (id, city_id, recorded_time in epoch microseconds, is_suspect,
+    # ANALYSIS_POLLUTANTS with NaN for missing values) so they convert to a
+    # NumPy matrix in one call. Epoch microseconds stay exact in a float64.
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        values_sql = ", ".join(f"COALESCE({p}::float8, 'NaN')" for p in ANALYSIS_POLLUTANTS)
+        params = [list(city_ids)]
+        time_sql = ""
+        if start_time:
+            time_sql = " AND recorded_time >= %s"
+            params.append(start_time)
+        cur.execute(f"""
+            SELECT id::float8, city_id::float8,
+                   (EXTRACT(EPOCH FROM recorded_time) * 1000000)::float8,
+                   is_suspect::int::float8, {values_sql}
+            FROM air_quality_data
+            WHERE city_id = ANY(%s){time_sql}
+            ORDER BY city_id, recorded_time
+        """, params)
+        return cur.fetchall(), None
+    except Exception as e:
+        return [], str(e)
+    finally:
+        put_conn(conn)
+
+def get_hourly_aqi(starts, days):
+    # Hourly mean AQI of the non-suspect readings, for the forecasting models.
+    # starts: {city_id: earliest recorded_time, or None for the last `days`
+    # days up to the city's latest day in air_quality_daily}. Returns
+    # ({city_id: (epoch hours, means)}, error), hours ascending; cities
+    # without readings are absent.
+    if not starts:
+        return {}, None
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        city_ids = list(starts)
+        # Default bounds come from the small rollup table instead of a
+        # newest-row probe into every partition; the LATERAL keeps the scan
+        # per city on the (city_id, recorded_time) index, pruning partitions
+        # older than the bound at run time
+        cur.execute("""
+            SELECT b.city_id,
+                   EXTRACT(EPOCH FROM DATE_TRUNC('hour', d.recorded_time))::bigint / 3600 AS h,
+                   AVG(d.aqi)::float8
+            FROM (
+                SELECT v.city_id, COALESCE(v.start_time, (
+                    SELECT MAX(bucket) FROM air_quality_daily WHERE city_id = v.city_id
+                ) + 1 - %s::int) AS start_time
+                FROM unnest(%s::int[], %s::timestamp[]) AS v(city_id, start_time)
+            ) b
+            CROSS JOIN LATERAL (
+                SELECT recorded_time, aqi
+                FROM air_quality_data
+                WHERE city_id = b.city_id AND recorded_time >= b.start_time
+                  AND aqi IS NOT NULL AND NOT is_suspect
+            ) d
+            GROUP BY 1, 2
+            ORDER BY 1, 2
+        """, (days, city_ids, [starts[city_id] for city_id in city_ids]))
+        history = {}
+        for city_id, hour, value in cur.fetchall():
+            hours, values = history.setdefault(city_id, ([], []))
+            hours.append(hour)
+            values.append(value)
+        return history, None
+    except Exception as e:
+        return {}, str(e)
+    finally:
+        put_conn(conn)
+
+def set_suspect_flags(changes, page_size=1000):
+    # changes: (id, recorded_time in epoch microseconds, is_suspect, reason).
+    # Refreshes the rollups of the touched days in the same transaction,
+    # since they leave suspect rows out. Returns (touched city ids, error).
+    if not changes:
+        return set(), None
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        touched = execute_values(cur, """
+            UPDATE air_quality_data d
+            SET is_suspect = v.is_suspect, suspect_reason = v.reason
+            FROM (VALUES %s) AS v(id, us, is_suspect, reason)
+            WHERE d.id = v.id
+              AND d.recorded_time = TIMESTAMP 'epoch' + v.us * INTERVAL '1 microsecond'
+            RETURNING d.city_id, d.recorded_time::date
+        """, changes, template="(%s::bigint, %s::float8, %s::boolean, %s::varchar)",
+            page_size=page_size, fetch=True)
+        
+        refresh_rollups_for(cur, touched)
+        
+        conn.commit()
+        return {city_id for city_id, _ in touched}, None
+    except Exception as e:
+        conn.rollback()
+        return set(), str(e)
+    finally:
+        put_conn(conn)
+
 def get_latest_air_quality(city_id):
     conn = get_conn()
     try:
@@ -122,20 +469,53 @@ def get_latest_air_quality(city_id):
     finally:
         put_conn(conn)
 
+def get_latest_air_quality_many(city_ids=None):
+    # Latest reading of many cities (all cities when city_ids is None) in one
+    # query: a LATERAL probe per city walks idx_air_quality_city_time from
+    # the newest row, so the cost is one index lookup per city however much
+    # history is stored. Returns ({city_id: reading}, error); cities without
+    # readings are absent.
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        if city_ids is None:
+            ids_sql = "SELECT id AS city_id FROM cities"
+            params = ()
+        else:
+            ids_sql = "SELECT DISTINCT unnest(%s::int[]) AS city_id"
+            params = (list(city_ids),)
+        cur.execute(f"""
+            SELECT a.id, a.city_id, a.recorded_time, a.aqi, a.aqi_level, a.dominant_pol,
+                   a.pm25, a.pm10, a.o3, a.no2, a.so2, a.co, a.source, a.attribution
+            FROM ({ids_sql}) ids
+            CROSS JOIN LATERAL (
+                SELECT id, city_id, recorded_time, aqi, aqi_level, dominant_pol,
+                       pm25, pm10, o3, no2, so2, co, source, attribution
+                FROM air_quality_data
+                WHERE city_id = ids.city_id
+                ORDER BY recorded_time DESC
+                LIMIT 1
+            ) a
+        """, params)
+        return {row[1]: _reading_from_row(row) for row in cur.fetchall()}, None
+    except Exception as e:
+        return {}, str(e)
+    finally:
+        put_conn(conn)
+
 def get_monthly_stats(city_id, months=12):
+    # Served from the air_quality_monthly rollup maintained by the write paths
     conn = get_conn()
     try:
         cur = conn.cursor()
         cur.execute("""
             SELECT 
-                DATE_TRUNC('month', recorded_time) as month,
-                COUNT(CASE WHEN aqi_level IN ('Excellent', 'Good') THEN 1 END)::float / 
-                NULLIF(COUNT(*), 0) as good_ratio,
-                AVG(pm25) as pm25_avg
-            FROM air_quality_data
+                bucket as month,
+                good_count::float / NULLIF(reading_count, 0) as good_ratio,
+                pm25_sum / NULLIF(pm25_count, 0) as pm25_avg
+            FROM air_quality_monthly
             WHERE city_id=%s
-            GROUP BY DATE_TRUNC('month', recorded_time)
-            ORDER BY month DESC
+            ORDER BY bucket DESC
             LIMIT %s
         """, (city_id, months))
         
@@ -1,106 +1,203 @@
 from backend.app.extensions.db import get_conn, put_conn
-from datetime import datetime, date
+from backend.app.extensions.event_buffer import EventBuffer
+from backend.app.utils.hll import HyperLogLog
+from psycopg2.extras import execute_values
+from collections import Counter, defaultdict
+from datetime import date
 import json
+import os
 
-def log_user_action(user_id, action_type, city_id=None, details=None):
+def insert_user_actions(rows):
     conn = get_conn()
     try:
         cur = conn.cursor()
-        cur.execute("""
+        execute_values(cur, """
             INSERT INTO user_analytics
             (user_id, action_date, action_type, city_id, details)
-            VALUES (%s, %s, %s, %s, %s)
-            RETURNING id
-        """, (user_id, date.today(), action_type, city_id, json.dumps(details) if details else None))
+            VALUES %s
+        """, rows, page_size=500)
+        
+        _apply_daily_aggregates(cur, rows)
         
-        analytics_id = cur.fetchone()[0]
         conn.commit()
-        return analytics_id, None
+        return len(rows), None
     except Exception as e:
         conn.rollback()
         return None, str(e)
     finally:
         put_conn(conn)
 
-def get_dau_stats(start_date, end_date):
+def _apply_daily_aggregates(cur, rows):
+    # rows: (user_id, action_date, action_type, city_id, details) tuples
+    counts = Counter((row[1], row[2], row[3] or 0) for row in rows)
+    execute_values(cur, """
+        INSERT INTO user_analytics_daily_counts (action_date, action_type, city_id, event_count)
+        VALUES %s
+        ON CONFLICT (action_date, action_type, city_id) DO UPDATE SET
+        event_count = user_analytics_daily_counts.event_count + EXCLUDED.event_count
+    """, [(k[0], k[1], k[2], v) for k, v in counts.items()])
+    
+    users_by_date = defaultdict(set)
+    for row in rows:
+        if row[0] is not None:
+            users_by_date[row[1]].add(row[0])
+    if not users_by_date:
+        return
+    
+    # Seed missing days first so the FOR UPDATE below serializes concurrent
+    # flushers instead of letting them overwrite each other's sketches
+    execute_values(cur, """
+        INSERT INTO user_analytics_daily_users (action_date, user_sketch, dau_estimate)
+        VALUES %s
+        ON CONFLICT (action_date) DO NOTHING
+    """, [(d, b"", 0) for d in users_by_date])
+    cur.execute("""
+        SELECT action_date, user_sketch FROM user_analytics_daily_users
+        WHERE action_date = ANY(%s)
+        FOR UPDATE
+    """, (list(users_by_date),))
+    
+    updates = []
+    for action_date, sketch_bytes in cur.fetchall():
+        sketch = HyperLogLog.from_bytes(sketch_bytes)
+        for user_id in users_by_date[action_date]:
+            sketch.add(user_id)
+        updates.append((action_date, sketch.to_bytes(), sketch.estimate()))
+    
+    execute_values(cur, """
+        UPDATE user_analytics_daily_users AS u
+        SET user_sketch = v.user_sketch, dau_estimate = v.dau_estimate
+        FROM (VALUES %s) AS v(action_date, user_sketch, dau_estimate)
+        WHERE u.action_date = v.action_date
+    """, updates, template="(%s::date, %s::bytea, %s::int)")
+
+def rebuild_usage_aggregates(start_date=None):
     conn = get_conn()
     try:
         cur = conn.cursor()
-        cur.execute("""
-            SELECT action_date, COUNT(DISTINCT user_id) as dau
+        if start_date:
+            cur.execute("DELETE FROM user_analytics_daily_counts WHERE action_date >= %s", (start_date,))
+            cur.execute("DELETE FROM user_analytics_daily_users WHERE action_date >= %s", (start_date,))
+        else:
+            cur.execute("TRUNCATE user_analytics_daily_counts, user_analytics_daily_users")
+        
+        reader = conn.cursor(name='usage_rebuild')
+        reader.itersize = 10000
+        reader.execute("""
+            SELECT user_id, action_date, action_type, city_id
             FROM user_analytics
-            WHERE action_date >= %s AND action_date <= %s AND user_id IS NOT NULL
-            GROUP BY action_date
-            ORDER BY action_date DESC
-        """, (start_date, end_date))
+            WHERE %s::date IS NULL OR action_date >= %s::date
+        """, (start_date, start_date))
         
-        items = []
-        for row in cur.fetchall():
-            items.append({
-                "date": row[0].isoformat() if row[0] else None,
-                "dau": row[1],
-            })
+        total = 0
+        while True:
+            rows = reader.fetchmany(10000)
+            if not rows:
+                break
+            _apply_daily_aggregates(cur, rows)
+            total += len(rows)
+        reader.close()
         
-        return items, None
+        conn.commit()
+        return total, None
     except Exception as e:
-        return [], str(e)
+        conn.rollback()
+        return None, str(e)
     finally:
         put_conn(conn)
 
-def get_top_cities(start_date, end_date, limit=5):
+def get_usage_summary(start_date, end_date, top_limit=5):
+    # DAU, top cities and feature usage from the daily aggregates in a single
+    # round trip; cost grows with the number of days, not events
     conn = get_conn()
     try:
         cur = conn.cursor()
         cur.execute("""
-            SELECT c.id, c.name, COUNT(*) as count
-            FROM user_analytics ua
-            LEFT JOIN cities c ON ua.city_id = c.id
-            WHERE ua.action_date >= %s AND ua.action_date <= %s AND ua.city_id IS NOT NULL
-            GROUP BY c.id, c.name
-            ORDER BY count DESC
-            LIMIT %s
-        """, (start_date, end_date, limit))
+            (SELECT 'dau' AS kind, action_date AS day, NULL::int AS city_id, NULL::text AS label,
+                    dau_estimate::bigint AS value
+             FROM user_analytics_daily_users
+             WHERE action_date >= %s AND action_date <= %s
+             ORDER BY action_date DESC)
+            UNION ALL
+            (SELECT 'city', NULL, c.id, c.name, SUM(d.event_count)
+             FROM user_analytics_daily_counts d
+             LEFT JOIN cities c ON d.city_id = c.id
+             WHERE d.action_date >= %s AND d.action_date <= %s AND d.city_id <> 0
+             GROUP BY c.id, c.name
+             ORDER BY SUM(d.event_count) DESC
+             LIMIT %s)
+            UNION ALL
+            (SELECT 'feature', NULL, NULL, action_type, SUM(event_count)
+             FROM user_analytics_daily_counts
+             WHERE action_date >= %s AND action_date <= %s
+             GROUP BY action_type
+             ORDER BY SUM(event_count) DESC)
+        """, (start_date, end_date, start_date, end_date, top_limit, start_date, end_date))
         
-        items = []
-        for row in cur.fetchall():
-            items.append({
-                "city_id": row[0],
-                "city_name": row[1],
-                "count": row[2],
-            })
+        summary = {"dau": [], "top_cities": [], "feature_usage": []}
+        for kind, day, city_id, label, value in cur.fetchall():
+            if kind == 'dau':
+                summary["dau"].append({
+                    "date": day.isoformat() if day else None,
+                    "dau": value,
+                })
+            elif kind == 'city':
+                summary["top_cities"].append({
+                    "city_id": city_id,
+                    "city_name": label,
+                    "count": value,
+                })
+            else:
+                summary["feature_usage"].append({
+                    "feature": label,
+                    "count": value,
+                })
         
-        return items, None
+        return summary, None
     except Exception as e:
-        return [], str(e)
+        return {"dau": [], "top_cities": [], "feature_usage": []}, str(e)
     finally:
         put_conn(conn)
 
-def get_feature_usage(start_date, end_date):
+def get_city_view_counts(start_date, action_type='view_data'):
     conn = get_conn()
     try:
         cur = conn.cursor()
         cur.execute("""
-            SELECT action_type, COUNT(*) as count
-            FROM user_analytics
-            WHERE action_date >= %s AND action_date <= %s
-            GROUP BY action_type
-            ORDER BY count DESC
-        """, (start_date, end_date))
-        
-        items = []
-        for row in cur.fetchall():
-            items.append({
-                "feature": row[0],
-                "count": row[1],
-            })
-        
-        return items, None
+            SELECT city_id, SUM(event_count)
+            FROM user_analytics_daily_counts
+            WHERE action_date >= %s AND action_type = %s AND city_id <> 0
+            GROUP BY city_id
+        """, (start_date, action_type))
+        return {row[0]: int(row[1]) for row in cur.fetchall()}, None
     except Exception as e:
-        return [], str(e)
+        return {}, str(e)
     finally:
         put_conn(conn)
 
-def get_health_advice(pollutant=None, aqi_level=None, target_group=None):
+# Analytics events are written off the request path in batches
+_buffer = EventBuffer(
+    insert_user_actions,
+    max_size=int(os.getenv('ANALYTICS_BUFFER_SIZE', '10000')),
+    batch_size=int(os.getenv('ANALYTICS_BATCH_SIZE', '500')),
+    flush_interval=float(os.getenv('ANALYTICS_FLUSH_INTERVAL', '2')),
+    policy=os.getenv('ANALYTICS_FULL_POLICY', 'drop'),
+    name='analytics-buffer'
+)
+
+def log_user_action(user_id, action_type, city_id=None, details=None):
+    queued = _buffer.put((user_id, date.today(), action_type, city_id, json.dumps(details) if details else None))
+    if not queued:
+        return None, "buffer_full"
+    return None, None
+
+def flush_user_actions():
+    _buffer.flush()
+
+def buffer_stats():
+    return _buffer.stats()
+
+def get_health_advice(pollutant=None, aqi_level=None, target_group=None, month=None):
     conn = get_conn()
     try:
         cur = conn.cursor()
@@ -108,6 +205,17 @@ def get_health_advice(pollutant=None, aqi_level=None, target_group=None):
         where_clauses = ["is_active = TRUE"]
         params = []
         
+        if month:
+            # A missing bound leaves that side open; start > end wraps over the new year
+            where_clauses.append("""(
+                (applicable_start_month IS NULL OR applicable_end_month IS NULL
+                 OR applicable_start_month <= applicable_end_month)
+                AND COALESCE(applicable_start_month, 1) <= %s AND %s <= COALESCE(applicable_end_month, 12)
+                OR applicable_start_month > applicable_end_month
+                AND (%s >= applicable_start_month OR %s <= applicable_end_month)
+            )""")
+            params.extend([month, month, month, month])
+        
         if pollutant:
             where_clauses.append("pollutant = %s")
             params.append(pollutant)
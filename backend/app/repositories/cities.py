@@ -1,4 +1,5 @@
 from backend.app.extensions.db import get_conn, put_conn
+from backend.app.utils.pagination import encode_cursor, decode_cursor
 
 def get_all_cities(q=None, province=None, page=1, page_size=20):
     conn = get_conn()
@@ -43,6 +44,107 @@ def get_all_cities(q=None, province=None, page=1, page_size=20):
     finally:
         put_conn(conn)
 
+def get_all_cities_keyset(q=None, province=None, cursor=None, page_size=20, with_total=False):
+    try:
+        after = decode_cursor(cursor, 2)
+        after_key = [str(after[0]), int(after[1])] if after else None
+    except (ValueError, TypeError):
+        return [], None, None, 'invalid_cursor'
+    
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        
+        where_clauses = []
+        params = []
+        
+        if q:
+            where_clauses.append("LOWER(name) LIKE LOWER(%s)")
+            params.append(f"%{q}%")
+        
+        if province:
+            where_clauses.append("province = %s")
+            params.append(province)
+        
+        total = None
+        if with_total:
+            where_sql = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+            cur.execute(f"SELECT COUNT(*) FROM cities{where_sql}", params)
+            total = cur.fetchone()[0]
+        
+        if after_key:
+            where_clauses.append("(name, id) > (%s, %s)")
+            params.extend(after_key)
+        
+        where_sql = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+        query_sql = f"SELECT id, name, province, lat, lon FROM cities{where_sql} ORDER BY name, id LIMIT %s"
+        params.append(page_size + 1)
+        cur.execute(query_sql, params)
+        rows = cur.fetchall()
+        
+        items = []
+        for row in rows[:page_size]:
+            items.append({
+                "id": row[0],
+                "name": row[1],
+                "province": row[2],
+                "lat": float(row[3]) if row[3] else None,
+                "lon": float(row[4]) if row[4] else None,
+            })
+        
+        next_cursor = None
+        if len(rows) > page_size:
+            next_cursor = encode_cursor(items[-1]["name"], items[-1]["id"])
+        
+        return items, next_cursor, total, None
+    except Exception as e:
+        return [], None, None, str(e)
+    finally:
+        put_conn(conn)
+
+def get_cities_by_ids(city_ids):
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT id, name, province, lat, lon FROM cities WHERE id = ANY(%s) ORDER BY name, id",
+            (list(city_ids),)
+        )
+        items = []
+        for row in cur.fetchall():
+            items.append({
+                "id": row[0],
+                "name": row[1],
+                "province": row[2],
+                "lat": float(row[3]) if row[3] else None,
+                "lon": float(row[4]) if row[4] else None,
+            })
+        return items, None
+    except Exception as e:
+        return [], str(e)
+    finally:
+        put_conn(conn)
+
+def get_city_catalog():
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT id, name, province, lat, lon FROM cities ORDER BY id")
+        items = []
+        for row in cur.fetchall():
+            items.append({
+                "id": row[0],
+                "name": row[1],
+                "province": row[2],
+                "lat": float(row[3]) if row[3] is not None else None,
+                "lon": float(row[4]) if row[4] is not None else None,
+            })
+        return items, None
+    except Exception as e:
+        return [], str(e)
+    finally:
+        put_conn(conn)
+
 def get_city_by_id(city_id):
     conn = get_conn()
     try:
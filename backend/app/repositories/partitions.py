@@ -0,0 +1,109 @@
+import re
+from datetime import date
+from backend.app.extensions.db import get_conn, put_conn
+
+PARTITION_PATTERN = re.compile(r'^air_quality_data_p(\d{4})(\d{2})$')
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+def list_partitions():
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = 'air_quality_data'
+            ORDER BY c.relname
+        """)
+        items = []
+        for row in cur.fetchall():
+            match = PARTITION_PATTERN.match(row[0])
+            items.append({
+                "name": row[0],
+                "month": f"{match.group(1)}-{match.group(2)}" if match else None,
+            })
+        return items, None
+    except Exception as e:
+        return [], str(e)
+    finally:
+        put_conn(conn)
+
+def ensure_partitions(months_ahead=3, today=None):
+    this_month = (today or date.today()).replace(day=1)
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        created = []
+        for offset in range(months_ahead + 1):
+            cur.execute("SELECT ensure_air_quality_partition(%s)", (_add_months(this_month, offset),))
+            created.append(cur.fetchone()[0])
+        conn.commit()
+        return created, None
+    except Exception as e:
+        conn.rollback()
+        return [], str(e)
+    finally:
+        put_conn(conn)
+
+def retention_cutoff(keep_months, today=None):
+    # First month whose raw readings are kept, None when everything is kept
+    if not keep_months or keep_months <= 0:
+        return None
+    return _add_months((today or date.today()).replace(day=1), -keep_months)
+
+def apply_retention(keep_months, drop=True, today=None):
+    # Whole partitions older than the retention window are detached (and
+    # dropped unless drop=False), which avoids large DELETEs and vacuum work.
+    # Expired rows that landed in the default partition (backfills older than
+    # the monthly partitions) are deleted, or moved to
+    # air_quality_data_default_expired when detaching. Rollup tables are left
+    # untouched so long-range statistics survive.
+    cutoff = retention_cutoff(keep_months, today)
+    if cutoff is None:
+        return [], None
+    partitions, error = list_partitions()
+    if error:
+        return [], error
+
+    expired = []
+    for item in partitions:
+        match = PARTITION_PATTERN.match(item["name"])
+        if match and date(int(match.group(1)), int(match.group(2)), 1) < cutoff:
+            expired.append(item["name"])
+
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        for name in expired:
+            cur.execute(f'ALTER TABLE air_quality_data DETACH PARTITION "{name}"')
+            if drop:
+                cur.execute(f'DROP TABLE "{name}"')
+            conn.commit()
+
+        cur.execute("SELECT to_regclass('air_quality_data_default') IS NOT NULL")
+        if cur.fetchone()[0]:
+            if drop:
+                cur.execute("DELETE FROM air_quality_data_default WHERE recorded_time < %s", (cutoff,))
+            else:
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS air_quality_data_default_expired
+                    (LIKE air_quality_data INCLUDING DEFAULTS)
+                """)
+                cur.execute("""
+                    WITH moved AS (DELETE FROM air_quality_data_default WHERE recorded_time < %s RETURNING *)
+                    INSERT INTO air_quality_data_default_expired SELECT * FROM moved
+                """, (cutoff,))
+            if cur.rowcount:
+                expired.append(f"air_quality_data_default ({cur.rowcount} rows)")
+            conn.commit()
+        return expired, None
+    except Exception as e:
+        conn.rollback()
+        return [], str(e)
+    finally:
+        put_conn(conn)
@@ -0,0 +1,209 @@
+import os
+from backend.app.extensions.db import get_conn, put_conn
+from psycopg2.extras import execute_values
+
+ROLLUP_POLLUTANTS = ('aqi', 'pm25', 'pm10', 'o3', 'no2', 'so2', 'co')
+
+# (city, month) buckets a refresh locks one by one; above this it locks the
+# rollup tables, since advisory locks share max_locks_per_transaction slots
+ROLLUP_LOCK_MAX_KEYS = int(os.getenv('ROLLUP_LOCK_MAX_KEYS', '64'))
+
+# Rollups are recomputed per touched (city, day) from the raw rows rather than
+# incremented, so upserts that overwrite an existing reading stay correct.
+# Rows flagged by the anomaly detection (is_suspect) are left out.
+_STAT_COLUMNS = ['reading_count', 'good_count'] + [
+    f"{p}_{agg}" for p in ROLLUP_POLLUTANTS for agg in ('count', 'sum', 'min', 'max')
+]
+
+_RAW_EXPRESSIONS = ["COUNT(*)", "COUNT(*) FILTER (WHERE d.aqi_level IN ('Excellent', 'Good'))"] + [
+    f"{agg}(d.{p})" for p in ROLLUP_POLLUTANTS for agg in ('COUNT', 'SUM', 'MIN', 'MAX')
+]
+
+_RAW_AGGREGATES = ", ".join(_RAW_EXPRESSIONS)
+
+_DAILY_AGGREGATES = ", ".join(
+    ["SUM(reading_count)", "SUM(good_count)"] +
+    [f"SUM({p}_count), SUM({p}_sum), MIN({p}_min), MAX({p}_max)" for p in ROLLUP_POLLUTANTS]
+)
+
+_UPSERT_SET = ", ".join(f"{col}=EXCLUDED.{col}" for col in _STAT_COLUMNS) + ", updated_at=CURRENT_TIMESTAMP"
+
+_ROLLUP_COLUMNS = "city_id, bucket, " + ", ".join(_STAT_COLUMNS)
+
+def _ensure_keys_table(cur):
+    cur.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS rollup_keys (
+            city_id INT NOT NULL,
+            day DATE NOT NULL
+        ) ON COMMIT DELETE ROWS
+    """)
+
+def _lock_tables(cur):
+    cur.execute("LOCK TABLE air_quality_daily, air_quality_monthly IN SHARE ROW EXCLUSIVE MODE")
+
+def _lock_keys(cur):
+    # Serializes refreshes of the same buckets across transactions (e.g. two
+    # source runners syncing one city), so neither recomputes from rows the
+    # other has not committed yet. A sync touches a few buckets and takes one
+    # transaction-scoped advisory lock per (city, month), which covers the
+    # month's days, in sorted order so concurrent refreshes cannot deadlock.
+    # Advisory locks use the shared lock table, so larger refreshes (history
+    # imports, rebuilds) lock both rollup tables once instead.
+    cur.execute("SELECT COUNT(DISTINCT (city_id, DATE_TRUNC('month', day))) FROM rollup_keys")
+    if cur.fetchone()[0] > ROLLUP_LOCK_MAX_KEYS:
+        _lock_tables(cur)
+        return
+    cur.execute("""
+        SELECT pg_advisory_xact_lock(k.city_id, k.month)
+        FROM (
+            SELECT DISTINCT city_id, EXTRACT(YEAR FROM day)::int * 12 + EXTRACT(MONTH FROM day)::int AS month
+            FROM rollup_keys
+            ORDER BY 1, 2
+        ) k
+    """)
+
+def _refresh_from_keys(cur, table_lock=False):
+    if table_lock:
+        _lock_tables(cur)
+    else:
+        _lock_keys(cur)
+    cur.execute("""
+        DELETE FROM air_quality_daily r
+        USING (SELECT DISTINCT city_id, day FROM rollup_keys) k
+        WHERE r.city_id = k.city_id AND r.bucket = k.day
+    """)
+    cur.execute(f"""
+        INSERT INTO air_quality_daily ({_ROLLUP_COLUMNS})
+        SELECT k.city_id, k.day, {_RAW_AGGREGATES}
+        FROM (SELECT DISTINCT city_id, day FROM rollup_keys) k
+        JOIN air_quality_data d
+          ON d.city_id = k.city_id
+         AND d.recorded_time >= k.day
+         AND d.recorded_time < k.day + 1
+         AND NOT d.is_suspect
+        GROUP BY k.city_id, k.day
+        ON CONFLICT (city_id, bucket) DO UPDATE SET {_UPSERT_SET}
+    """)
+    cur.execute(f"""
+        INSERT INTO air_quality_monthly ({_ROLLUP_COLUMNS})
+        SELECT r.city_id, k.month, {_DAILY_AGGREGATES}
+        FROM (SELECT DISTINCT city_id, DATE_TRUNC('month', day)::date AS month FROM rollup_keys) k
+        JOIN air_quality_daily r
+          ON r.city_id = k.city_id
+         AND r.bucket >= k.month
+         AND r.bucket < (k.month + INTERVAL '1 month')::date
+        GROUP BY r.city_id, k.month
+        ON CONFLICT (city_id, bucket) DO UPDATE SET {_UPSERT_SET}
+    """)
+    cur.execute("""
+        DELETE FROM air_quality_monthly r
+        USING (SELECT DISTINCT city_id, DATE_TRUNC('month', day)::date AS month FROM rollup_keys) k
+        WHERE r.city_id = k.city_id AND r.bucket = k.month
+          AND NOT EXISTS (
+              SELECT 1 FROM air_quality_daily d
+              WHERE d.city_id = k.city_id
+                AND d.bucket >= k.month
+                AND d.bucket < (k.month + INTERVAL '1 month')::date
+          )
+    """)
+    cur.execute("DELETE FROM rollup_keys")
+
+def refresh_rollups_for(cur, keys):
+    # keys: iterable of (city_id, date); runs inside the caller's transaction
+    keys = set(keys)
+    if not keys:
+        return
+    _ensure_keys_table(cur)
+    execute_values(cur, "INSERT INTO rollup_keys (city_id, day) VALUES %s", list(keys))
+    _refresh_from_keys(cur)
+
+def refresh_rollups_from_query(cur, select_sql, params=None):
+    # select_sql must return (city_id, day) pairs; used for set-based callers
+    # such as the COPY importer that never hold the keys in Python; these lock
+    # the rollup tables rather than each bucket
+    _ensure_keys_table(cur)
+    cur.execute(f"INSERT INTO rollup_keys (city_id, day) {select_sql}", params or ())
+    _refresh_from_keys(cur, table_lock=True)
+
+def _scope(city_id, since, time_column, prefix=''):
+    # WHERE clauses and params limiting a rebuild or check to one city and to
+    # buckets from `since` on
+    clauses, params = [], []
+    if city_id is not None:
+        clauses.append(f"{prefix}city_id=%s")
+        params.append(city_id)
+    if since is not None:
+        clauses.append(f"{prefix}{time_column} >= %s")
+        params.append(since)
+    return clauses, params
+
+def rebuild_rollups(city_id=None, since=None):
+    # Recomputes the rollups from the raw rows. `since` (the first day of a
+    # month) leaves older buckets alone: once retention has dropped their raw
+    # rows the rollups are the only record of those months.
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        _lock_tables(cur)
+        bucket_clauses, bucket_params = _scope(city_id, since, 'bucket')
+        raw_clauses, raw_params = _scope(city_id, since, 'recorded_time')
+        if not bucket_clauses:
+            cur.execute("TRUNCATE air_quality_daily, air_quality_monthly")
+        else:
+            bucket_sql = " AND ".join(bucket_clauses)
+            cur.execute(f"DELETE FROM air_quality_daily WHERE {bucket_sql}", bucket_params)
+            cur.execute(f"DELETE FROM air_quality_monthly WHERE {bucket_sql}", bucket_params)
+        raw_where = " WHERE " + " AND ".join(raw_clauses) if raw_clauses else ""
+        refresh_rollups_from_query(
+            cur, f"SELECT DISTINCT city_id, recorded_time::date FROM air_quality_data{raw_where}", raw_params
+        )
+        cur.execute("SELECT COUNT(*) FROM air_quality_daily")
+        daily = cur.fetchone()[0]
+        cur.execute("SELECT COUNT(*) FROM air_quality_monthly")
+        monthly = cur.fetchone()[0]
+        conn.commit()
+        return {"daily_rows": daily, "monthly_rows": monthly}, None
+    except Exception as e:
+        conn.rollback()
+        return None, str(e)
+    finally:
+        put_conn(conn)
+
+def verify_rollups(city_id=None, since=None):
+    # Compares the monthly rollups with a direct aggregation of the raw rows
+    # and returns the (city_id, month) buckets that disagree; `since` as in
+    # rebuild_rollups.
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        raw_clauses, raw_params = _scope(city_id, since, 'recorded_time', 'd.')
+        where_sql = "WHERE " + " AND ".join(["NOT d.is_suspect"] + raw_clauses)
+        rollup_clauses, rollup_params = _scope(city_id, since, 'bucket')
+        rollup_where = "WHERE " + " AND ".join(rollup_clauses) if rollup_clauses else ""
+        params = raw_params + rollup_params
+        raw_columns = ", ".join(f"{expr} AS {col}" for expr, col in zip(_RAW_EXPRESSIONS, _STAT_COLUMNS))
+        differs = " OR ".join(
+            f"raw.{col}::numeric IS DISTINCT FROM rollup.{col}::numeric" for col in _STAT_COLUMNS
+        )
+        cur.execute(f"""
+            WITH raw AS (
+                SELECT d.city_id, DATE_TRUNC('month', d.recorded_time)::date AS bucket, {raw_columns}
+                FROM air_quality_data d
+                {where_sql}
+                GROUP BY 1, 2
+            ),
+            rollup AS (
+                SELECT {_ROLLUP_COLUMNS} FROM air_quality_monthly {rollup_where}
+            )
+            SELECT COALESCE(raw.city_id, rollup.city_id), COALESCE(raw.bucket, rollup.bucket)
+            FROM raw
+            FULL OUTER JOIN rollup ON raw.city_id = rollup.city_id AND raw.bucket = rollup.bucket
+            WHERE raw.city_id IS NULL OR rollup.city_id IS NULL OR {differs}
+            ORDER BY 1, 2
+        """, params)
+        mismatches = [{"city_id": row[0], "month": row[1].strftime("%Y-%m")} for row in cur.fetchall()]
+        return mismatches, None
+    except Exception as e:
+        return [], str(e)
+    finally:
+        put_conn(conn)
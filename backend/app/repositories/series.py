@@ -0,0 +1,83 @@
+from datetime import time as dt_time
+from backend.app.extensions.db import get_conn, put_conn
+from backend.app.repositories.rollups import ROLLUP_POLLUTANTS
+
+SERIES_INTERVALS = ('hour', 'day', 'week', 'month')
+SERIES_POLLUTANTS = ROLLUP_POLLUTANTS
+SERIES_AGGREGATES = ('avg', 'min', 'max', 'p95', 'count')
+
+# Aggregates the daily rollup can answer: it keeps count/sum/min/max per day
+ROLLUP_AGGREGATES = {
+    'avg': "ROUND(SUM({p}_sum) / NULLIF(SUM({p}_count), 0), 2)::float8",
+    'min': "MIN({p}_min)::float8",
+    'max': "MAX({p}_max)::float8",
+    'count': "SUM({p}_count)::int",
+}
+
+# Averages and percentiles are rounded to the 2 decimals readings are stored with
+RAW_AGGREGATES = {
+    'avg': "ROUND(AVG({p}), 2)::float8",
+    'min': "MIN({p})::float8",
+    'max': "MAX({p})::float8",
+    'p95': "ROUND((PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY {p}))::numeric, 2)::float8",
+    'count': "COUNT({p})::int",
+}
+
+def _day_aligned(value):
+    return value is None or value.time() == dt_time(0)
+
+def can_use_rollup(interval, aggregates, start_time, end_time):
+    # Whole days only: the daily rollup cannot split a day or compute percentiles
+    return interval != 'hour' and all(agg in ROLLUP_AGGREGATES for agg in aggregates) \
+        and _day_aligned(start_time) and _day_aligned(end_time)
+
+def get_series(city_ids, start_time, end_time, interval='day', pollutants=('aqi',), aggregates=('avg',)):
+    # Resamples readings in [start_time, end_time) into `interval` buckets in
+    # SQL and returns ({"source", "columns", "series": {city_id: {column: [values]}}}, error).
+    # Buckets without readings are omitted; suspect rows are left out as in
+    # the rollups.
+    columns = [f"{p}_{agg}" for p in pollutants for agg in aggregates]
+    use_rollup = can_use_rollup(interval, aggregates, start_time, end_time)
+    templates = ROLLUP_AGGREGATES if use_rollup else RAW_AGGREGATES
+    select_sql = ", ".join(templates[agg].format(p=p) for p in pollutants for agg in aggregates)
+
+    if use_rollup:
+        sql = f"""
+            SELECT city_id, DATE_TRUNC(%s, bucket::timestamp) AS b, {select_sql}
+            FROM air_quality_daily
+            WHERE city_id = ANY(%s) AND bucket >= %s::date AND bucket < %s::date
+            GROUP BY 1, 2
+            ORDER BY 1, 2
+        """
+    else:
+        sql = f"""
+            SELECT city_id, DATE_TRUNC(%s, recorded_time) AS b, {select_sql}
+            FROM air_quality_data
+            WHERE city_id = ANY(%s) AND recorded_time >= %s AND recorded_time < %s
+              AND NOT is_suspect
+            GROUP BY 1, 2
+            ORDER BY 1, 2
+        """
+
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute(sql, (interval, list(city_ids), start_time, end_time))
+        series = {
+            city_id: {"bucket": [], **{column: [] for column in columns}}
+            for city_id in city_ids
+        }
+        for row in cur.fetchall():
+            values = series[row[0]]
+            values["bucket"].append(row[1].isoformat())
+            for column, value in zip(columns, row[2:]):
+                values[column].append(value)
+        return {
+            "source": "rollup" if use_rollup else "raw",
+            "columns": ["bucket"] + columns,
+            "series": series,
+        }, None
+    except Exception as e:
+        return None, str(e)
+    finally:
+        put_conn(conn)
@@ -1,4 +1,5 @@
 from backend.app.extensions.db import get_conn, put_conn
+from backend.app.utils.pagination import encode_cursor, decode_cursor
 from datetime import datetime
 import json
 
@@ -24,10 +25,13 @@ def log_sync(sync_type, data_source, start_time=None, status="in_progress", erro
         put_conn(conn)
 
 def update_sync_log(log_id, end_time=None, success_count=None, fail_count=None, total_count=None,
-                   status=None, error_message=None, details=None):
+                   status=None, error_message=None, details=None, start_time=None, unchanged_count=None):
     fields = []
     values = []
     
+    if start_time is not None:
+        fields.append("start_time=%s")
+        values.append(start_time)
     if end_time is not None:
         fields.append("end_time=%s")
         values.append(end_time)
@@ -37,6 +41,9 @@ def update_sync_log(log_id, end_time=None, success_count=None, fail_count=None,
     if fail_count is not None:
         fields.append("fail_count=%s")
         values.append(fail_count)
+    if unchanged_count is not None:
+        fields.append("unchanged_count=%s")
+        values.append(unchanged_count)
     if total_count is not None:
         fields.append("total_count=%s")
         values.append(total_count)
@@ -47,7 +54,9 @@ def update_sync_log(log_id, end_time=None, success_count=None, fail_count=None,
         fields.append("error_message=%s")
         values.append(error_message)
     if details is not None:
-        fields.append("details=%s")
+        # Keys are merged into the stored details so the job runner's progress
+        # and the sync's own summary can be written independently
+        fields.append("details=COALESCE(details, '{}'::jsonb) || %s::jsonb")
         values.append(json.dumps(details))
     
     if not fields:
@@ -92,7 +101,7 @@ def get_sync_logs(start_date=None, end_date=None, page=1, page_size=20):
         offset = (page - 1) * page_size
         query_sql = f"""
             SELECT id, sync_type, data_source, start_time, end_time, success_count, fail_count,
-                   total_count, status, error_message, created_at
+                   total_count, status, error_message, created_at, unchanged_count
             FROM sync_logs{where_sql}
             ORDER BY created_at DESC
             LIMIT %s OFFSET %s
@@ -100,26 +109,7 @@ def get_sync_logs(start_date=None, end_date=None, page=1, page_size=20):
         params.extend([page_size, offset])
         cur.execute(query_sql, params)
         
-        items = []
-        for row in cur.fetchall():
-            duration = None
-            if row[3] and row[4]:
-                duration = (row[4] - row[3]).total_seconds()
-            
-            items.append({
-                "id": row[0],
-                "sync_type": row[1],
-                "data_source": row[2],
-                "start_time": row[3].isoformat() if row[3] else None,
-                "end_time": row[4].isoformat() if row[4] else None,
-                "success_count": row[5],
-                "fail_count": row[6],
-                "total_count": row[7],
-                "status": row[8],
-                "error_message": row[9],
-                "duration_seconds": duration,
-                "created_at": row[10].isoformat() if row[10] else None,
-            })
+        items = [_sync_log_from_row(row) for row in cur.fetchall()]
         
         return items, total, None
     except Exception as e:
@@ -127,6 +117,140 @@ def get_sync_logs(start_date=None, end_date=None, page=1, page_size=20):
     finally:
         put_conn(conn)
 
+def get_sync_logs_keyset(start_date=None, end_date=None, cursor=None, page_size=20, with_total=False):
+    try:
+        after = decode_cursor(cursor, 2)
+        after_key = [datetime.fromisoformat(after[0]), int(after[1])] if after else None
+    except (ValueError, TypeError):
+        return [], None, None, 'invalid_cursor'
+    
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        
+        where_clauses = []
+        params = []
+        
+        if start_date:
+            where_clauses.append("created_at >= %s")
+            params.append(start_date)
+        
+        if end_date:
+            where_clauses.append("created_at < %s + INTERVAL '1 day'")
+            params.append(end_date)
+        
+        total = None
+        if with_total:
+            where_sql = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+            cur.execute(f"SELECT COUNT(*) FROM sync_logs{where_sql}", params)
+            total = cur.fetchone()[0]
+        
+        if after_key:
+            where_clauses.append("(created_at, id) < (%s, %s)")
+            params.extend(after_key)
+        
+        where_sql = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+        query_sql = f"""
+            SELECT id, sync_type, data_source, start_time, end_time, success_count, fail_count,
+                   total_count, status, error_message, created_at, unchanged_count
+            FROM sync_logs{where_sql}
+            ORDER BY created_at DESC, id DESC
+            LIMIT %s
+        """
+        params.append(page_size + 1)
+        cur.execute(query_sql, params)
+        rows = cur.fetchall()
+        
+        items = [_sync_log_from_row(row) for row in rows[:page_size]]
+        next_cursor = None
+        if len(rows) > page_size:
+            next_cursor = encode_cursor(items[-1]["created_at"], items[-1]["id"])
+        
+        return items, next_cursor, total, None
+    except Exception as e:
+        return [], None, None, str(e)
+    finally:
+        put_conn(conn)
+
+def _sync_log_from_row(row):
+    duration = None
+    if row[3] and row[4]:
+        duration = (row[4] - row[3]).total_seconds()
+    
+    return {
+        "id": row[0],
+        "sync_type": row[1],
+        "data_source": row[2],
+        "start_time": row[3].isoformat() if row[3] else None,
+        "end_time": row[4].isoformat() if row[4] else None,
+        "success_count": row[5],
+        "fail_count": row[6],
+        "unchanged_count": row[11] or 0,
+        "total_count": row[7],
+        "status": row[8],
+        "error_message": row[9],
+        "duration_seconds": duration,
+        "created_at": row[10].isoformat() if row[10] else None,
+    }
+
+def get_sync_log(log_id):
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT id, sync_type, data_source, start_time, end_time, success_count, fail_count,
+                   total_count, status, error_message, created_at, unchanged_count, details
+            FROM sync_logs
+            WHERE id=%s
+        """, (log_id,))
+        row = cur.fetchone()
+        if not row:
+            return None, "not_found"
+        
+        item = _sync_log_from_row(row)
+        item["details"] = row[12]
+        return item, None
+    except Exception as e:
+        return None, str(e)
+    finally:
+        put_conn(conn)
+
+def find_active_syncs(sync_type, data_source, started_after):
+    # In-progress runs of one kind, newest first; rows older than
+    # `started_after` are treated as abandoned by a crashed worker
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT id, details
+            FROM sync_logs
+            WHERE sync_type=%s AND data_source=%s AND status='in_progress' AND start_time >= %s
+            ORDER BY start_time DESC, id DESC
+        """, (sync_type, data_source, started_after))
+        return [{"id": row[0], "details": row[1] or {}} for row in cur.fetchall()], None
+    except Exception as e:
+        return [], str(e)
+    finally:
+        put_conn(conn)
+
+def get_upstream_calls(data_source, ended_after):
+    # Upstream calls spent by the runs of one source that finished since
+    # `ended_after`, and the cities those runs covered
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT COALESCE(SUM((details->>'upstream_calls')::int), 0), COALESCE(SUM(total_count), 0)
+            FROM sync_logs
+            WHERE data_source=%s AND end_time >= %s AND jsonb_typeof(details->'upstream_calls') = 'number'
+        """, (data_source, ended_after))
+        calls, cities = cur.fetchone()
+        return (calls, cities), None
+    except Exception as e:
+        return (0, 0), str(e)
+    finally:
+        put_conn(conn)
+
 def get_sync_stats(days=7):
     conn = get_conn()
     try:
@@ -138,6 +262,7 @@ def get_sync_stats(days=7):
                 SUM(CASE WHEN status='success' THEN 1 ELSE 0 END) as success_count,
                 SUM(success_count) as total_success_data,
                 SUM(fail_count) as total_fail_data,
+                SUM(unchanged_count) as total_unchanged_data,
                 AVG(EXTRACT(EPOCH FROM (end_time - start_time))) as avg_duration
             FROM sync_logs
             WHERE created_at >= NOW() - INTERVAL '%s days'
@@ -152,7 +277,8 @@ def get_sync_stats(days=7):
                 "success_rate": success_rate,
                 "total_success_data": row[2] or 0,
                 "total_fail_data": row[3] or 0,
-                "average_duration_seconds": float(row[4]) if row[4] else None,
+                "total_unchanged_data": row[4] or 0,
+                "average_duration_seconds": float(row[5]) if row[5] else None,
             }, None
         
         return {
@@ -161,6 +287,7 @@ def get_sync_stats(days=7):
             "success_rate": 0,
             "total_success_data": 0,
             "total_fail_data": 0,
+            "total_unchanged_data": 0,
             "average_duration_seconds": None,
         }, None
     except Exception as e:
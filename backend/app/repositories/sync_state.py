@@ -0,0 +1,99 @@
+from backend.app.extensions.db import get_conn, put_conn
+from psycopg2.extras import execute_values
+
+STATE_COLUMNS = ('city_id', 'last_observed_at', 'last_checked_at', 'update_interval_sec',
+                 'consecutive_misses', 'next_due_at')
+
+# State is kept per (source, city) so one source's readings never move
+# another's watermark; the adaptive schedule (services/sync_planner.py)
+# drives this source only
+SCHEDULED_SOURCE = 'AQICN'
+
+def get_states(city_ids=None, source=SCHEDULED_SOURCE):
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        select_sql = f"SELECT {', '.join(STATE_COLUMNS)} FROM city_sync_state WHERE source = %s"
+        if city_ids is None:
+            cur.execute(select_sql, (source,))
+        else:
+            cur.execute(select_sql + " AND city_id = ANY(%s)", (source, list(city_ids)))
+        return {row[0]: dict(zip(STATE_COLUMNS, row)) for row in cur.fetchall()}, None
+    except Exception as e:
+        return {}, str(e)
+    finally:
+        put_conn(conn)
+
+def save_states(states, source=SCHEDULED_SOURCE):
+    # The observation watermark never moves backwards, even if two runs
+    # overlap and finish out of order.
+    if not states:
+        return 0, None
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        execute_values(cur, f"""
+            INSERT INTO city_sync_state (source, {', '.join(STATE_COLUMNS)}, updated_at)
+            VALUES %s
+            ON CONFLICT (source, city_id) DO UPDATE SET
+            last_observed_at=GREATEST(city_sync_state.last_observed_at, EXCLUDED.last_observed_at),
+            last_checked_at=EXCLUDED.last_checked_at,
+            update_interval_sec=EXCLUDED.update_interval_sec,
+            consecutive_misses=EXCLUDED.consecutive_misses,
+            next_due_at=EXCLUDED.next_due_at,
+            updated_at=EXCLUDED.updated_at
+        """, [(source,) + tuple(state.get(col) for col in STATE_COLUMNS) + (state.get('last_checked_at'),)
+              for state in states])
+        conn.commit()
+        return len(states), None
+    except Exception as e:
+        conn.rollback()
+        return 0, str(e)
+    finally:
+        put_conn(conn)
+
+def get_due_city_ids(now, limit):
+    # Cities never synced come first, then the most overdue ones
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT c.id
+            FROM cities c
+            LEFT JOIN city_sync_state s ON s.city_id = c.id AND s.source = %s
+            WHERE s.next_due_at IS NULL OR s.next_due_at <= %s
+            ORDER BY s.next_due_at NULLS FIRST, c.id
+            LIMIT %s
+        """, (SCHEDULED_SOURCE, now, limit))
+        return [row[0] for row in cur.fetchall()], None
+    except Exception as e:
+        return [], str(e)
+    finally:
+        put_conn(conn)
+
+def advance_watermarks(observed, checked_at, source):
+    # observed: (city_id, observed_at) pairs from a source outside the adaptive
+    # schedule; only its watermark moves, the schedule columns are left alone
+    latest = {}
+    for city_id, observed_at in observed:
+        if city_id not in latest or observed_at > latest[city_id]:
+            latest[city_id] = observed_at
+    if not latest:
+        return 0, None
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        execute_values(cur, """
+            INSERT INTO city_sync_state (source, city_id, last_observed_at, updated_at)
+            VALUES %s
+            ON CONFLICT (source, city_id) DO UPDATE SET
+            last_observed_at=GREATEST(city_sync_state.last_observed_at, EXCLUDED.last_observed_at),
+            updated_at=EXCLUDED.updated_at
+        """, [(source, city_id, observed_at, checked_at) for city_id, observed_at in latest.items()])
+        conn.commit()
+        return len(latest), None
+    except Exception as e:
+        conn.rollback()
+        return 0, str(e)
+    finally:
+        put_conn(conn)
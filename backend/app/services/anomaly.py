@@ -0,0 +1,159 @@
+import os
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from backend.app.repositories import air_quality, cities
+from backend.app.repositories.air_quality import ANALYSIS_POLLUTANTS
+from backend.app.services import data_cache
+from backend.app.utils.pagination import parse_bool
+
+# Scan the cities that got new readings at the end of every sync
+ANOMALY_DETECTION = parse_bool(os.getenv('ANOMALY_DETECTION', 'true'))
+# Previous readings of the same city the rolling mean / deviation covers
+ANOMALY_WINDOW = int(os.getenv('ANOMALY_WINDOW', '24'))
+# Valid readings needed in that window before a z-score counts
+ANOMALY_MIN_HISTORY = int(os.getenv('ANOMALY_MIN_HISTORY', '6'))
+ANOMALY_Z_THRESHOLD = float(os.getenv('ANOMALY_Z_THRESHOLD', '4'))
+ANOMALY_MAD_THRESHOLD = float(os.getenv('ANOMALY_MAD_THRESHOLD', '6'))
+# Floor for both spreads in AQI points, so a nearly flat series does not
+# turn every small change into an outlier
+ANOMALY_MIN_SPREAD = float(os.getenv('ANOMALY_MIN_SPREAD', '5'))
+# History loaded before the first new reading when scanning after a sync
+ANOMALY_CONTEXT_HOURS = float(os.getenv('ANOMALY_CONTEXT_HOURS', '168'))
+# Cities analysed together in one matrix; bounds memory for history scans
+ANOMALY_BATCH_CITIES = int(os.getenv('ANOMALY_BATCH_CITIES', '50'))
+
+# Column layout of air_quality.get_analysis_rows
+COL_ID, COL_CITY, COL_TIME, COL_SUSPECT = 0, 1, 2, 3
+FIRST_VALUE = 4
+
+# MAD * 1.4826 estimates the standard deviation of normally distributed data
+MAD_SCALE = 1.4826
+EPOCH = datetime(1970, 1, 1)
+
+def _group_starts(groups):
+    # For rows sorted by group: index of the first row of each row's group
+    change = np.empty(len(groups), dtype=bool)
+    change[:1] = True
+    change[1:] = groups[1:] != groups[:-1]
+    starts = np.flatnonzero(change)
+    return starts[np.cumsum(change) - 1]
+
+def rolling_zscores(values, row_start, window=None, min_history=None):
+    # z-score of every value against the previous `window` rows of the same
+    # group and column, from prefix sums of value, square and count; 0 where
+    # the value is missing or the history is too short
+    window = window or ANOMALY_WINDOW
+    min_history = min_history or ANOMALY_MIN_HISTORY
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    zero = np.zeros((1, values.shape[1]))
+    sums = np.vstack([zero, np.cumsum(filled, axis=0)])
+    squares = np.vstack([zero, np.cumsum(filled * filled, axis=0)])
+    counts = np.vstack([zero, np.cumsum(valid, axis=0)])
+
+    index = np.arange(len(values))
+    low = np.maximum(row_start, index - window)
+    count = counts[index] - counts[low]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (sums[index] - sums[low]) / count
+        variance = np.maximum((squares[index] - squares[low]) / count - mean * mean, 0.0)
+        z = (values - mean) / np.maximum(np.sqrt(variance), ANOMALY_MIN_SPREAD)
+    return np.where(valid & (count >= min_history), z, 0.0)
+
+def _group_median(groups, values):
+    # Median of each group's values, returned per element in input order
+    order = np.lexsort((values, groups))
+    sorted_groups = groups[order]
+    sorted_values = values[order]
+    change = np.empty(len(order), dtype=bool)
+    change[:1] = True
+    change[1:] = sorted_groups[1:] != sorted_groups[:-1]
+    starts = np.flatnonzero(change)
+    sizes = np.diff(np.append(starts, len(order)))
+    medians = (sorted_values[starts + (sizes - 1) // 2] + sorted_values[starts + sizes // 2]) / 2
+    result = np.empty(len(order))
+    result[order] = np.repeat(medians, sizes)
+    return result
+
+def robust_scores(values, groups):
+    # (value - median) / (1.4826 * MAD) within each group, per column
+    scores = np.zeros_like(values)
+    for column in range(values.shape[1]):
+        valid = ~np.isnan(values[:, column])
+        if not valid.any():
+            continue
+        group = groups[valid]
+        value = values[valid, column]
+        median = _group_median(group, value)
+        deviation = value - median
+        mad = _group_median(group, np.abs(deviation))
+        scores[valid, column] = deviation / np.maximum(MAD_SCALE * mad, ANOMALY_MIN_SPREAD)
+    return scores
+
+def detect(matrix):
+    # matrix: rows of air_quality.get_analysis_rows. A value is suspect when
+    # it is both a sudden jump against the city's recent readings (rolling
+    # z-score) and far outside the city's usual range (robust MAD score), in
+    # the same direction; a haze episode that builds up over hours passes.
+    # Returns (per-row bool array, {row index: reason}).
+    groups = matrix[:, COL_CITY]
+    values = matrix[:, FIRST_VALUE:]
+    z = rolling_zscores(values, _group_starts(groups))
+    robust = robust_scores(values, groups)
+    flagged = (np.abs(z) > ANOMALY_Z_THRESHOLD) & (np.abs(robust) > ANOMALY_MAD_THRESHOLD) & (z * robust > 0)
+    suspect = flagged.any(axis=1)
+    reasons = {
+        int(row): ",".join(p for p, hit in zip(ANALYSIS_POLLUTANTS, flagged[row]) if hit)
+        for row in np.flatnonzero(suspect)
+    }
+    return suspect, reasons
+
+def scan_cities(city_ids, since=None):
+    # Flags (and un-flags) readings of `city_ids` recorded at or after
+    # `since`, all history when None; readings up to ANOMALY_CONTEXT_HOURS
+    # before `since` serve as context only. Returns (stats, error).
+    started = time.perf_counter()
+    stats = {"rows": 0, "flagged": 0, "cleared": 0}
+    touched = set()
+    city_ids = sorted(set(city_ids))
+    load_from = since - timedelta(hours=ANOMALY_CONTEXT_HOURS) if since else None
+    since_us = (since - EPOCH) // timedelta(microseconds=1) if since else None
+
+    try:
+        for start in range(0, len(city_ids), ANOMALY_BATCH_CITIES):
+            rows, error = air_quality.get_analysis_rows(city_ids[start:start + ANOMALY_BATCH_CITIES], load_from)
+            if error:
+                return stats, error
+            if not rows:
+                continue
+
+            matrix = np.array(rows, dtype=np.float64)
+            suspect, reasons = detect(matrix)
+            in_scope = matrix[:, COL_TIME] >= since_us if since_us is not None else np.ones(len(matrix), dtype=bool)
+            changed = np.flatnonzero(in_scope & (suspect != (matrix[:, COL_SUSPECT] > 0)))
+            stats["rows"] += int(in_scope.sum())
+
+            changes = [
+                (int(matrix[i, COL_ID]), float(matrix[i, COL_TIME]), bool(suspect[i]), reasons.get(int(i)))
+                for i in changed
+            ]
+            cities_changed, error = air_quality.set_suspect_flags(changes)
+            if error:
+                return stats, error
+            touched |= cities_changed
+            stats["flagged"] += int(suspect[changed].sum())
+            stats["cleared"] += int(len(changed) - suspect[changed].sum())
+    finally:
+        if touched:
+            data_cache.on_rollups_changed(touched)
+
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    return stats, None
+
+def scan_history(since=None):
+    # On-demand scan over every city
+    items, error = cities.get_city_catalog()
+    if error:
+        return None, error
+    return scan_cities([city['id'] for city in items], since)
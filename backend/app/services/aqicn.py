@@ -1,129 +1,139 @@
 import os
-import requests
-from datetime import datetime
-from backend.app.repositories import cities, air_quality, sync_logs
+import time
+import threading
+from collections import defaultdict
+from backend.app.services.aqicn_client import AqicnClient, CircuitBreaker, FAIL_DEADLINE
+from backend.app.utils.concurrency import map_with_deadline
+from backend.app.utils.geo import tile_key, tile_bounds, nearest
 
 AQICN_API_TOKEN = os.getenv('AQICN_API_TOKEN', '2e1b5d79c4b27bfebf99f213f77c70985b32d52f')
-AQICN_BASE_URL = 'http://api.waqi.info'
+AQICN_BASE_URL = os.getenv('AQICN_BASE_URL', 'http://api.waqi.info')
+AQICN_REQUEST_TIMEOUT = float(os.getenv('AQICN_REQUEST_TIMEOUT', '10'))
+# Number of cities fetched in parallel during one sync run
+AQICN_SYNC_CONCURRENCY = int(os.getenv('AQICN_SYNC_CONCURRENCY', '8'))
+# Maximum requests per second sent to a single upstream host (0 disables the limit)
+AQICN_RATE_LIMIT = float(os.getenv('AQICN_RATE_LIMIT', '10'))
+# Wall-clock budget in seconds for a whole sync run
+AQICN_SYNC_DEADLINE = float(os.getenv('AQICN_SYNC_DEADLINE', '1800'))
+# Extra attempts for timeouts, connection errors, 5xx and 429, with jittered exponential back-off
+AQICN_RETRIES = int(os.getenv('AQICN_RETRIES', '2'))
+AQICN_RETRY_BACKOFF = float(os.getenv('AQICN_RETRY_BACKOFF', '0.5'))
+# Consecutive transient failures that open the circuit, and seconds before it is probed again
+AQICN_BREAKER_THRESHOLD = int(os.getenv('AQICN_BREAKER_THRESHOLD', '5'))
+AQICN_BREAKER_RESET = float(os.getenv('AQICN_BREAKER_RESET', '30'))
+# 'feed' requests every city separately; 'bounds' fetches tiles of cities with one map-bounds call each
+AQICN_SYNC_MODE = os.getenv('AQICN_SYNC_MODE', 'feed')
+# Tile edge in degrees for bounds mode, and how far a station may be from the city it is matched to
+AQICN_TILE_SIZE = float(os.getenv('AQICN_TILE_SIZE', '2.0'))
+AQICN_MATCH_RADIUS_KM = float(os.getenv('AQICN_MATCH_RADIUS_KM', '25'))
 
-def sync_air_quality_data(sync_log_id=None):
-    if not sync_log_id:
-        sync_log_id, _ = sync_logs.log_sync(
-            sync_type='scheduled',
-            data_source='AQICN',
-            start_time=datetime.utcnow(),
-            status='in_progress'
-        )
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client():
+    # One pooled client (session, rate limiter, circuit breaker) per upstream host
+    with _clients_lock:
+        client = _clients.get(AQICN_BASE_URL)
+        if client is None:
+            client = AqicnClient(
+                AQICN_BASE_URL,
+                AQICN_API_TOKEN,
+                timeout=AQICN_REQUEST_TIMEOUT,
+                retries=AQICN_RETRIES,
+                backoff=AQICN_RETRY_BACKOFF,
+                pool_size=AQICN_SYNC_CONCURRENCY,
+                rate_limit=AQICN_RATE_LIMIT,
+                breaker=CircuitBreaker(AQICN_BREAKER_THRESHOLD, AQICN_BREAKER_RESET)
+            )
+            _clients[AQICN_BASE_URL] = client
+        return client
+
+def reset_clients():
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+def fetch_cities_air_quality(city_list, concurrency=None, deadline=None):
+    # Yields (city, data, error) as cities complete: data is the raw feed
+    # object, error a failure reason from aqicn_client when data is None
+    concurrency = concurrency or AQICN_SYNC_CONCURRENCY
+    deadline_at = time.monotonic() + (deadline if deadline is not None else AQICN_SYNC_DEADLINE)
     
-    success_count = 0
-    fail_count = 0
-    error_message = None
+    # Cities still outstanding when the deadline passed are reported as failures
+    yield from map_with_deadline(
+        city_list, _fetch_before_deadline, concurrency, deadline_at, FAIL_DEADLINE, 'aqicn-fetch'
+    )
+
+def fetch_cities_by_bounds(city_list, concurrency=None, deadline=None):
+    # Cities with coordinates are grouped into AQICN_TILE_SIZE degree tiles and
+    # each tile is fetched with one map-bounds call; a city takes the nearest
+    # reporting station within AQICN_MATCH_RADIUS_KM. Cities without
+    # coordinates, without a station in range or in a failed tile fall back to
+    # their own feed. Yields (city, data, error) like fetch_cities_air_quality.
+    concurrency = concurrency or AQICN_SYNC_CONCURRENCY
+    deadline_at = time.monotonic() + (deadline if deadline is not None else AQICN_SYNC_DEADLINE)
     
-    try:
-        all_cities, _, _ = cities.get_all_cities(page=1, page_size=1000)
-        
-        if not all_cities:
-            error_message = "no_cities_found"
-            sync_logs.update_sync_log(
-                sync_log_id,
-                end_time=datetime.utcnow(),
-                status='failed',
-                success_count=0,
-                fail_count=0,
-                total_count=0,
-                error_message=error_message
-            )
-            return
-        
-        for city in all_cities:
-            try:
-                data = fetch_city_air_quality(city['name'], city['province'])
-                if data:
-                    data['city_id'] = city['id']
-                    air_quality.save_air_quality_data(
-                        city_id=data['city_id'],
-                        recorded_time=data['recorded_time'],
-                        aqi=data.get('aqi'),
-                        aqi_level=data.get('aqi_level'),
-                        dominant_pol=data.get('dominant_pol'),
-                        pm25=data.get('pm25'),
-                        pm10=data.get('pm10'),
-                        o3=data.get('o3'),
-                        no2=data.get('no2'),
-                        so2=data.get('so2'),
-                        co=data.get('co'),
-                        source='AQICN',
-                        attribution=data.get('attribution')
-                    )
-                    success_count += 1
-                else:
-                    fail_count += 1
-            except Exception as e:
-                fail_count += 1
-        
-        sync_logs.update_sync_log(
-            sync_log_id,
-            end_time=datetime.utcnow(),
-            status='success',
-            success_count=success_count,
-            fail_count=fail_count,
-            total_count=len(all_cities)
-        )
+    tiles = defaultdict(list)
+    fallback = []
+    for city in city_list:
+        if city.get('lat') is None or city.get('lon') is None:
+            fallback.append(city)
+        else:
+            tiles[tile_key(city['lat'], city['lon'], AQICN_TILE_SIZE)].append(city)
     
-    except Exception as e:
-        error_message = str(e)
-        sync_logs.update_sync_log(
-            sync_log_id,
-            end_time=datetime.utcnow(),
-            status='failed',
-            success_count=success_count,
-            fail_count=fail_count,
-            total_count=fail_count + success_count,
-            error_message=error_message
-        )
+    for key, stations, _ in map_with_deadline(
+        list(tiles), _fetch_tile, concurrency, deadline_at, FAIL_DEADLINE, 'aqicn-tile'
+    ):
+        for city in tiles[key]:
+            station, _ = nearest(city['lat'], city['lon'], stations or [], AQICN_MATCH_RADIUS_KM)
+            if station is not None:
+                yield city, _feed_from_station(station), None
+            else:
+                fallback.append(city)
+    
+    if fallback:
+        yield from fetch_cities_air_quality(fallback, concurrency, max(0.0, deadline_at - time.monotonic()))
 
-def fetch_city_air_quality(city_name, province=None):
-    try:
-        query = f"{city_name}"
-        if province:
-            query = f"{province},{city_name}"
-        
-        url = f"{AQICN_BASE_URL}/feed/{query}/?token={AQICN_API_TOKEN}"
-        response = requests.get(url, timeout=10)
-        
-        if response.status_code != 200:
-            return None
-        
-        data = response.json()
-        
-        if data.get('status') != 'ok':
-            return None
-        
-        aqicn_data = data.get('data', {})
-        
-        aqi_value = aqicn_data.get('aqi')
-        aqi_level = get_aqi_level(aqi_value)
-        
-        result = {
-            'recorded_time': datetime.utcnow(),
-            'aqi': aqi_value,
-            'aqi_level': aqi_level,
-            'dominant_pol': aqicn_data.get('dominentpol'),
-            'attribution': aqicn_data.get('attributions', [{}])[0].get('name', 'AQICN'),
-        }
-        
-        iaqi = aqicn_data.get('iaqi', {})
-        result['pm25'] = iaqi.get('pm25', {}).get('v')
-        result['pm10'] = iaqi.get('pm10', {}).get('v')
-        result['o3'] = iaqi.get('o3', {}).get('v')
-        result['no2'] = iaqi.get('no2', {}).get('v')
-        result['so2'] = iaqi.get('so2', {}).get('v')
-        result['co'] = iaqi.get('co', {}).get('v')
-        
-        return result
+def _fetch_tile(key, deadline_at):
+    south, west, north, east = tile_bounds(key, AQICN_TILE_SIZE, AQICN_MATCH_RADIUS_KM)
+    stations, error = get_client().get_bounds(south, west, north, east, deadline=deadline_at)
+    if error:
+        return None, error
     
-    except Exception as e:
-        return None
+    points = []
+    for station in stations:
+        try:
+            lat, lon = float(station['lat']), float(station['lon'])
+            int(station['aqi'])
+        except (KeyError, TypeError, ValueError):
+            # Stations without a current reading report aqi as '-'
+            continue
+        points.append((lat, lon, station))
+    return points, None
+
+def _feed_from_station(station):
+    # Map-bounds results only carry the overall AQI; they are reshaped like a
+    # feed object without pollutant values so one parser handles both modes
+    info = station.get('station') or {}
+    return {
+        'aqi': int(station['aqi']),
+        'time': {'iso': info.get('time')},
+        'attributions': [{'name': info.get('name') or 'AQICN'}],
+        'iaqi': {},
+    }
+
+def _fetch_before_deadline(city, deadline_at):
+    if deadline_at - time.monotonic() <= 0:
+        return None, FAIL_DEADLINE
+    return fetch_city_air_quality(city['name'], city.get('province'), deadline=deadline_at)
+
+def fetch_city_air_quality(city_name, province=None, deadline=None):
+    query = f"{city_name}"
+    if province:
+        query = f"{province},{city_name}"
+    
+    return get_client().get_feed(query, deadline=deadline)
 
 def get_aqi_level(aqi_value):
     if aqi_value is None:
@@ -0,0 +1,211 @@
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+# Failure reasons reported by AqicnClient.get_feed and aggregated per sync run
+FAIL_TIMEOUT = 'timeout'
+FAIL_CONNECTION = 'connection_error'
+FAIL_SERVER_ERROR = 'http_5xx'
+FAIL_RATE_LIMITED = 'http_429'
+FAIL_CLIENT_ERROR = 'http_4xx'
+FAIL_INVALID_RESPONSE = 'invalid_response'
+FAIL_UPSTREAM = 'upstream_error'
+FAIL_CIRCUIT_OPEN = 'circuit_open'
+FAIL_DEADLINE = 'deadline_exceeded'
+FAIL_REQUEST = 'request_error'
+
+# Transient failures are retried and count against the circuit breaker;
+# the rest mean the upstream answered and retrying would not help
+RETRYABLE = {FAIL_TIMEOUT, FAIL_CONNECTION, FAIL_SERVER_ERROR, FAIL_RATE_LIMITED}
+
+class RateLimiter:
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def acquire(self, deadline=None):
+        if not self.interval:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            if deadline is not None and slot > deadline:
+                return False
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+        return True
+
+class CircuitBreaker:
+    # closed: requests flow. After `failure_threshold` consecutive transient
+    # failures it opens and rejects calls for `reset_timeout` seconds, then lets
+    # a single probe through (half-open); the probe's result closes or re-opens it.
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self.trips = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def cancel_probe(self):
+        # A probe that never reached the upstream says nothing about its health
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._probing:
+                    self.trips += 1
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+class AqicnClient:
+    def __init__(self, base_url, token, timeout=10.0, retries=2, backoff=0.5, backoff_max=8.0,
+                 pool_size=8, rate_limit=10.0, breaker=None):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.limiter = RateLimiter(rate_limit)
+        self.breaker = breaker or CircuitBreaker()
+        # One keep-alive pool shared by all fetch threads, sized to the sync
+        # concurrency so connections are reused instead of re-handshaking
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size), max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retried = 0
+
+    def get_feed(self, query, deadline=None):
+        # Returns (data, None) with the feed's `data` object, or (None, reason)
+        return self._call(f"/feed/{query}/", {}, dict, deadline)
+
+    def get_bounds(self, south, west, north, east, deadline=None):
+        # Returns ([station, ...], None) for every station inside the box, or
+        # (None, reason). Stations carry lat/lon, aqi and station.name/time.
+        latlng = f"{south:.4f},{west:.4f},{north:.4f},{east:.4f}"
+        return self._call("/map/bounds/", {'latlng': latlng}, list, deadline)
+
+    def _call(self, path, params, expected, deadline):
+        reason = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                delay = random.uniform(0, min(self.backoff_max, self.backoff * 2 ** (attempt - 1)))
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    return None, reason
+                time.sleep(delay)
+                with self._lock:
+                    self.retried += 1
+
+            if not self.breaker.allow():
+                # Keep the upstream's own failure if this call already saw one
+                return None, reason or FAIL_CIRCUIT_OPEN
+            data, reason = self._request(path, params, expected, deadline)
+            if reason in RETRYABLE:
+                self.breaker.record_failure()
+                continue
+            if reason == FAIL_DEADLINE:
+                self.breaker.cancel_probe()
+            else:
+                self.breaker.record_success()
+            return data, reason
+        return None, reason
+
+    def _request(self, path, params, expected, deadline):
+        if not self.limiter.acquire(deadline):
+            return None, FAIL_DEADLINE
+        timeout = self.timeout
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+            if timeout <= 0:
+                return None, FAIL_DEADLINE
+
+        with self._lock:
+            self.requests += 1
+        try:
+            response = self.session.get(
+                f"{self.base_url}{path}",
+                params=dict(params, token=self.token),
+                timeout=timeout
+            )
+        except requests.Timeout:
+            return None, FAIL_TIMEOUT
+        except requests.ConnectionError:
+            return None, FAIL_CONNECTION
+        except requests.RequestException:
+            return None, FAIL_REQUEST
+
+        if response.status_code >= 500:
+            return None, FAIL_SERVER_ERROR
+        if response.status_code == 429:
+            return None, FAIL_RATE_LIMITED
+        if response.status_code != 200:
+            return None, FAIL_CLIENT_ERROR
+
+        try:
+            payload = response.json()
+        except ValueError:
+            return None, FAIL_INVALID_RESPONSE
+        if not isinstance(payload, dict):
+            return None, FAIL_INVALID_RESPONSE
+        if payload.get('status') != 'ok':
+            # Quota errors come back as a normal error payload
+            if payload.get('data') == 'Over quota':
+                return None, FAIL_RATE_LIMITED
+            return None, FAIL_UPSTREAM
+        data = payload.get('data')
+        if not isinstance(data, expected):
+            return None, FAIL_INVALID_RESPONSE
+        return data, None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "base_url": self.base_url,
+                "requests": self.requests,
+                "retried": self.retried,
+                "circuit": self.breaker.state,
+                "circuit_trips": self.breaker.trips,
+            }
+
+    def close(self):
+        self.session.close()
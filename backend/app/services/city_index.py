@@ -0,0 +1,101 @@
+import heapq
+import math
+import os
+import threading
+import time
+from datetime import date, timedelta
+from backend.app.repositories import cities, analytics
+from backend.app.services import data_cache
+from backend.app.utils.geo import KdTree
+from backend.app.utils.text_search import TextIndex
+
+# Rebuild at least this often so cities changed outside the admin API
+# (imports, direct SQL) and recent popularity are picked up too
+CITY_INDEX_MAX_AGE = float(os.getenv('CITY_INDEX_MAX_AGE', '3600'))
+# Search ranking: minimum trigram similarity for a fuzzy match, share of the
+# score that comes from popularity (view_data events in the last N days)
+CITY_SEARCH_THRESHOLD = float(os.getenv('CITY_SEARCH_THRESHOLD', '0.3'))
+CITY_SEARCH_POPULARITY_WEIGHT = float(os.getenv('CITY_SEARCH_POPULARITY_WEIGHT', '0.1'))
+CITY_SEARCH_POPULARITY_DAYS = int(os.getenv('CITY_SEARCH_POPULARITY_DAYS', '30'))
+
+# A province match ranks below a city whose own name matches as well
+PROVINCE_MATCH_WEIGHT = 0.7
+
+class CityCatalog:
+    # Immutable per-process snapshot of the city table with its lookup structures
+    def __init__(self, items, views):
+        self.tree = KdTree(
+            (city['lat'], city['lon'], city) for city in items
+            if city['lat'] is not None and city['lon'] is not None
+        )
+        self.cities = {city['id']: city for city in items}
+        entries = [(city['id'], city['name'], 1.0) for city in items]
+        entries += [(city['id'], city['province'], PROVINCE_MATCH_WEIGHT) for city in items if city['province']]
+        self.text = TextIndex(entries)
+        top = max(views.values(), default=0)
+        # log scale, so a handful of very popular cities do not flatten the rest
+        self.popularity = {
+            city_id: math.log1p(count) / math.log1p(top)
+            for city_id, count in views.items() if city_id in self.cities
+        } if top else {}
+
+    def nearby(self, lat, lon, k, radius_km=None):
+        return [
+            dict(city, distance_km=round(distance, 3))
+            for city, distance in self.tree.query(lat, lon, k, radius_km)
+        ]
+
+    def search(self, q, limit):
+        weight = CITY_SEARCH_POPULARITY_WEIGHT
+        ranked = heapq.nsmallest(
+            limit,
+            (
+                (-(match * (1 - weight) + self.popularity.get(city_id, 0.0) * weight), city_id)
+                for city_id, match in self.text.search(q, CITY_SEARCH_THRESHOLD).items()
+            )
+        )
+        return [dict(self.cities[city_id], score=round(-score, 3)) for score, city_id in ranked]
+
+# (catalog, catalog version, built at); replaced as a whole so readers need no lock
+_index = None
+_build_lock = threading.Lock()
+
+def _is_current(index, version):
+    return index is not None and index[1] == version \
+        and time.monotonic() - index[2] < CITY_INDEX_MAX_AGE
+
+def get_catalog():
+    # Returns (catalog, error). Only a stale snapshot touches the database;
+    # the version check is a single cache lookup.
+    global _index
+    version = data_cache.city_catalog_version()
+    index = _index
+    if _is_current(index, version):
+        return index[0], None
+
+    with _build_lock:
+        index = _index
+        if _is_current(index, version):
+            return index[0], None
+        items, error = cities.get_city_catalog()
+        if error:
+            # Keep answering from the previous build while the database is unavailable
+            return (index[0], None) if index else (None, error)
+        views, _ = analytics.get_city_view_counts(date.today() - timedelta(days=CITY_SEARCH_POPULARITY_DAYS))
+        catalog = CityCatalog(items, views)
+        _index = (catalog, version, time.monotonic())
+        return catalog, None
+
+def nearby(lat, lon, k=5, radius_km=None):
+    # Returns ([city with distance_km], error), closest first
+    catalog, error = get_catalog()
+    if error:
+        return [], error
+    return catalog.nearby(lat, lon, k, radius_km), None
+
+def search(q, limit=10):
+    # Returns ([city with score], error), best match first
+    catalog, error = get_catalog()
+    if error:
+        return [], error
+    return catalog.search(q, limit), None
@@ -0,0 +1,167 @@
+import os
+import time
+from backend.app.extensions.cache import get_cache, MISS
+from backend.app.repositories import cities, air_quality, users
+
+# Longer than the hourly sync interval so a refreshed entry stays valid until
+# the next sync replaces it
+LATEST_CACHE_TTL = float(os.getenv('LATEST_CACHE_TTL', '7200'))
+CITY_CACHE_TTL = float(os.getenv('CITY_CACHE_TTL', '86400'))
+MONTHLY_STATS_CACHE_TTL = float(os.getenv('MONTHLY_STATS_CACHE_TTL', '3600'))
+# Served forecasts expire after about one sync interval, so a worker that
+# did not run the sync brings its copy up to date from the stored model;
+# an expired model is refitted from history
+FORECAST_CACHE_TTL = float(os.getenv('FORECAST_CACHE_TTL', '3600'))
+FORECAST_MODEL_TTL = float(os.getenv('FORECAST_MODEL_TTL', '604800'))
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '3600'))
+
+# Bumped on every city change so each worker's in-memory city index
+# (services/city_index.py) knows to rebuild
+CITY_CATALOG_VERSION_KEY = "cities:version"
+# Same for the health advice index (services/health_advice.py)
+HEALTH_ADVICE_VERSION_KEY = "health_advice:version"
+
+def _city_key(city_id):
+    return f"city:{city_id}"
+
+def _latest_key(city_id):
+    return f"latest:{city_id}"
+
+def _monthly_prefix(city_id):
+    return f"monthly:{city_id}:"
+
+def _user_tag_key(user_id):
+    return f"user_tag:{user_id}"
+
+def _forecast_key(city_id):
+    return f"forecast:{city_id}"
+
+def _forecast_model_key(city_id):
+    return f"forecast_model:{city_id}"
+
+def get_city(city_id):
+    cache = get_cache()
+    city = cache.get(_city_key(city_id))
+    if city is not MISS:
+        return city
+    city = cities.get_city_by_id(city_id)
+    cache.set(_city_key(city_id), city, CITY_CACHE_TTL)
+    return city
+
+def get_latest_air_quality(city_id):
+    cache = get_cache()
+    reading = cache.get(_latest_key(city_id))
+    if reading is not MISS:
+        return reading
+    reading = air_quality.get_latest_air_quality(city_id)
+    cache.set(_latest_key(city_id), reading, LATEST_CACHE_TTL)
+    return reading
+
+def get_latest_air_quality_many(city_ids):
+    # Cached readings come from one cache lookup and all misses from one
+    # query. Returns ({city_id: reading or None}, error).
+    cache = get_cache()
+    cached = cache.get_many([_latest_key(city_id) for city_id in city_ids])
+    readings = {}
+    missing = []
+    for city_id in city_ids:
+        reading = cached.get(_latest_key(city_id), MISS)
+        if reading is MISS:
+            missing.append(city_id)
+        else:
+            readings[city_id] = reading
+    if missing:
+        found, error = air_quality.get_latest_air_quality_many(missing)
+        if error:
+            return readings, error
+        fetched = {city_id: found.get(city_id) for city_id in missing}
+        cache.set_many({_latest_key(city_id): reading for city_id, reading in fetched.items()}, LATEST_CACHE_TTL)
+        readings.update(fetched)
+    return readings, None
+
+def get_monthly_stats(city_id, months=12):
+    cache = get_cache()
+    key = f"{_monthly_prefix(city_id)}{months}"
+    items = cache.get(key)
+    if items is not MISS:
+        return items, None
+    items, error = air_quality.get_monthly_stats(city_id, months)
+    if not error:
+        cache.set(key, items, MONTHLY_STATS_CACHE_TTL)
+    return items, error
+
+def refresh_latest(readings):
+    # Called by the sync right after its upsert. A cached reading is only
+    # replaced by one that is at least as recent.
+    cache = get_cache()
+    for reading in readings:
+        key = _latest_key(reading['city_id'])
+        cached = cache.peek(key)
+        if cached is not MISS and cached and cached.get('recorded_time') and reading.get('recorded_time') \
+                and cached['recorded_time'] > reading['recorded_time']:
+            continue
+        cache.set(key, reading, LATEST_CACHE_TTL)
+
+def on_readings_saved(readings):
+    refresh_latest(readings)
+    cache = get_cache()
+    for city_id in {reading['city_id'] for reading in readings}:
+        cache.delete_prefix(_monthly_prefix(city_id))
+
+def on_rollups_changed(city_ids):
+    cache = get_cache()
+    for city_id in city_ids:
+        cache.delete_prefix(_monthly_prefix(city_id))
+
+def get_forecast(city_id):
+    # The served forecast payload (None when the city has too little
+    # history), or MISS; services/forecast.py updates the model on a miss
+    return get_cache().get(_forecast_key(city_id))
+
+def get_forecast_models(city_ids):
+    keys = {city_id: _forecast_model_key(city_id) for city_id in city_ids}
+    cached = get_cache().get_many(list(keys.values()))
+    return {city_id: cached[key] for city_id, key in keys.items() if key in cached}
+
+def set_forecasts(results):
+    # results: {city_id: (model, payload)}
+    cache = get_cache()
+    cache.set_many({_forecast_model_key(city_id): model for city_id, (model, _) in results.items()}, FORECAST_MODEL_TTL)
+    cache.set_many({_forecast_key(city_id): payload for city_id, (_, payload) in results.items()}, FORECAST_CACHE_TTL)
+
+def invalidate_city(city_id):
+    cache = get_cache()
+    cache.delete(_city_key(city_id))
+    cache.delete(_latest_key(city_id))
+    cache.delete(_forecast_key(city_id))
+    cache.delete(_forecast_model_key(city_id))
+    cache.delete_prefix(_monthly_prefix(city_id))
+    cache.set(CITY_CATALOG_VERSION_KEY, time.time_ns(), CITY_CACHE_TTL)
+
+def city_catalog_version():
+    version = get_cache().peek(CITY_CATALOG_VERSION_KEY)
+    return None if version is MISS else version
+
+def get_user_tag(user_id):
+    # The user's health tag (None when unset or the user is gone)
+    cache = get_cache()
+    tag = cache.get(_user_tag_key(user_id))
+    if tag is not MISS:
+        return tag
+    user = users.get_by_id(user_id)
+    tag = user['tag'] if user else None
+    cache.set(_user_tag_key(user_id), tag, USER_CACHE_TTL)
+    return tag
+
+def invalidate_user(user_id):
+    get_cache().delete(_user_tag_key(user_id))
+
+def invalidate_health_advice():
+    get_cache().set(HEALTH_ADVICE_VERSION_KEY, time.time_ns(), CITY_CACHE_TTL)
+
+def health_advice_version():
+    version = get_cache().peek(HEALTH_ADVICE_VERSION_KEY)
+    return None if version is MISS else version
+
+def stats():
+    return get_cache().stats()
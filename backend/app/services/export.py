@@ -0,0 +1,221 @@
+import os
+import io
+import csv
+import sys
+import json
+import zlib
+import struct
+import threading
+from array import array
+from datetime import datetime, timedelta
+from backend.app.repositories import air_quality
+from backend.app.repositories.air_quality import READING_COLUMNS
+
+# Exports running at once; each holds its own database connection
+EXPORT_MAX_CONCURRENT = int(os.getenv('EXPORT_MAX_CONCURRENT', '4'))
+# Rows fetched per round trip from the server-side cursor
+EXPORT_FETCH_SIZE = int(os.getenv('EXPORT_FETCH_SIZE', '5000'))
+# Bytes buffered before a CSV / NDJSON chunk is sent
+EXPORT_CHUNK_SIZE = 65536
+# Rows per columnar row group
+EXPORT_ROW_GROUP_SIZE = int(os.getenv('EXPORT_ROW_GROUP_SIZE', '10000'))
+
+# format -> (mimetype, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'columnar': ('application/octet-stream', 'aqc'),
+}
+
+# Columnar layout (.aqc), little-endian throughout:
+#   magic b"AQCOL1\n", u32 header length, JSON header {"columns": [[name, type]], "compression": "zlib"}
+#   row groups: u32 row count (0 ends the file), then per column u32 length +
+#   zlib(null bitmap (bit set = value present) + values), where values are
+#   int32 / int64 (timestamps, microseconds since the epoch, UTC) / float64
+#   arrays, or for strings a dictionary (u32 count, u32 length + UTF-8 each)
+#   followed by int32 indexes
+COLUMNAR_MAGIC = b'AQCOL1\n'
+COLUMN_TYPES = {
+    'city_id': 'int32', 'recorded_time': 'timestamp', 'aqi': 'int32', 'aqi_level': 'string',
+    'dominant_pol': 'string', 'pm25': 'float64', 'pm10': 'float64', 'o3': 'float64',
+    'no2': 'float64', 'so2': 'float64', 'co': 'float64', 'source': 'string', 'attribution': 'string',
+}
+ARRAY_CODES = {'int32': 'i', 'timestamp': 'q', 'float64': 'd'}
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+_slots = threading.BoundedSemaphore(EXPORT_MAX_CONCURRENT)
+
+_json_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+def iter_csv(rows):
+    # Same columns as the --history import, so an export can be loaded back
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(READING_COLUMNS)
+    for row in rows:
+        # str() of a datetime is isoformat(sep=' '), what the importer reads
+        writer.writerow(row)
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+def iter_ndjson(rows):
+    time_position = READING_COLUMNS.index('recorded_time')
+    parts = []
+    size = 0
+    for row in rows:
+        values = list(row)
+        if values[time_position] is not None:
+            values[time_position] = values[time_position].isoformat()
+        line = _json_encoder.encode(dict(zip(READING_COLUMNS, values))) + '\n'
+        parts.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield ''.join(parts).encode('utf-8')
+            parts = []
+            size = 0
+    yield ''.join(parts).encode('utf-8')
+
+def _le_bytes(values):
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tobytes()
+
+def _encode_column(kind, values):
+    present = bytearray((len(values) + 7) // 8)
+    for i, value in enumerate(values):
+        if value is not None:
+            present[i >> 3] |= 1 << (i & 7)
+
+    if kind == 'string':
+        dictionary = {}
+        indexes = array('i', (dictionary.setdefault(v, len(dictionary)) if v is not None else -1 for v in values))
+        encoded = [struct.pack('<I', len(dictionary))]
+        for text in dictionary:
+            data = text.encode('utf-8')
+            encoded.append(struct.pack('<I', len(data)))
+            encoded.append(data)
+        body = b''.join(encoded) + _le_bytes(indexes)
+    elif kind == 'timestamp':
+        body = _le_bytes(array('q', (
+            (v - EPOCH) // MICROSECOND if v is not None else 0 for v in values
+        )))
+    elif kind == 'float64':
+        body = _le_bytes(array('d', (float(v) if v is not None else 0.0 for v in values)))
+    else:
+        body = _le_bytes(array('i', (v if v is not None else 0 for v in values)))
+    return zlib.compress(bytes(present) + body, 1)
+
+def iter_columnar(rows):
+    header = json.dumps({
+        'columns': [[column, COLUMN_TYPES[column]] for column in READING_COLUMNS],
+        'compression': 'zlib',
+    }).encode('utf-8')
+    yield COLUMNAR_MAGIC + struct.pack('<I', len(header)) + header
+
+    group = []
+    for row in rows:
+        group.append(row)
+        if len(group) >= EXPORT_ROW_GROUP_SIZE:
+            yield _row_group(group)
+            group = []
+    if group:
+        yield _row_group(group)
+    yield struct.pack('<I', 0)
+
+def _row_group(group):
+    parts = [struct.pack('<I', len(group))]
+    for position, column in enumerate(READING_COLUMNS):
+        block = _encode_column(COLUMN_TYPES[column], [row[position] for row in group])
+        parts.append(struct.pack('<I', len(block)))
+        parts.append(block)
+    return b''.join(parts)
+
+def read_columnar(fp):
+    # Yields row dicts from a .aqc file object; the reference decoder for consumers
+    if fp.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+        raise ValueError('not a columnar export')
+    header = json.loads(fp.read(struct.unpack('<I', fp.read(4))[0]))
+    columns = header['columns']
+    while True:
+        count = struct.unpack('<I', fp.read(4))[0]
+        if count == 0:
+            return
+        decoded = []
+        for _, kind in columns:
+            block = zlib.decompress(fp.read(struct.unpack('<I', fp.read(4))[0]))
+            bitmap_size = (count + 7) // 8
+            present, body = block[:bitmap_size], block[bitmap_size:]
+            if kind == 'string':
+                offset = 4
+                dictionary = []
+                for _ in range(struct.unpack_from('<I', body)[0]):
+                    length = struct.unpack_from('<I', body, offset)[0]
+                    dictionary.append(body[offset + 4:offset + 4 + length].decode('utf-8'))
+                    offset += 4 + length
+                values = [dictionary[i] if i >= 0 else None for i in _from_le('i', body[offset:])]
+            elif kind == 'timestamp':
+                values = [EPOCH + MICROSECOND * v for v in _from_le('q', body)]
+            else:
+                values = list(_from_le(ARRAY_CODES[kind], body))
+            decoded.append([v if present[i >> 3] & (1 << (i & 7)) else None for i, v in enumerate(values)])
+        for i in range(count):
+            yield {name: decoded[c][i] for c, (name, _) in enumerate(columns)}
+
+def _from_le(code, data):
+    values = array(code)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+WRITERS = {'csv': iter_csv, 'ndjson': iter_ndjson, 'columnar': iter_columnar}
+
+class ExportStream:
+    # Iterable of encoded chunks for one export. Holds an export slot and a
+    # database connection until exhausted or closed (the WSGI server closes
+    # it when the client disconnects). `source` is an opened
+    # air_quality.ExportRows, so only encoding runs while streaming.
+    def __init__(self, fmt, source):
+        self.rows = 0
+        self._source = source
+        self._chunks = WRITERS[fmt](self._counted(self._source))
+        self._closed = False
+
+    def _counted(self, rows):
+        for row in rows:
+            self.rows += 1
+            yield row
+
+    def __iter__(self):
+        try:
+            yield from self._chunks
+        finally:
+            self.close()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._chunks.close()
+        self._source.close()
+        _slots.release()
+
+def open_export(fmt, city_ids=None, start_time=None, end_time=None):
+    # Returns (ExportStream, error)
+    if fmt not in WRITERS:
+        return None, 'invalid_format'
+    if not _slots.acquire(blocking=False):
+        return None, 'export_busy'
+    try:
+        source, error = air_quality.open_air_quality_rows(city_ids, start_time, end_time, EXPORT_FETCH_SIZE)
+        if error:
+            _slots.release()
+            return None, 'query_failed'
+        return ExportStream(fmt, source), None
+    except Exception:
+        _slots.release()
+        raise
@@ -0,0 +1,249 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from backend.app.repositories import air_quality, cities
+from backend.app.services import data_cache
+from backend.app.services.aqicn import get_aqi_level
+from backend.app.utils.pagination import parse_bool
+
+# Fold the new hours of the synced cities into their models after every sync
+FORECAST_ENABLED = parse_bool(os.getenv('FORECAST_ENABLED', 'true'))
+# History a new model is fitted on, counted back from the city's latest reading
+FORECAST_TRAIN_DAYS = int(os.getenv('FORECAST_TRAIN_DAYS', '90'))
+# Age in hours at which a training sample counts half, so models follow the season
+FORECAST_HALF_LIFE_HOURS = float(os.getenv('FORECAST_HALF_LIFE_HOURS', '720'))
+# Ridge penalty, relative to the mean diagonal of X'X
+FORECAST_RIDGE_ALPHA = float(os.getenv('FORECAST_RIDGE_ALPHA', '0.01'))
+# Missing hours bridged with the previous hour's mean
+FORECAST_MAX_GAP_HOURS = int(os.getenv('FORECAST_MAX_GAP_HOURS', '3'))
+# Worker processes for a full retrain; each opens its own database connection
+FORECAST_WORKERS = int(os.getenv('FORECAST_WORKERS', str(os.cpu_count() or 1)))
+# Cities loaded and fitted per task
+FORECAST_BATCH_CITIES = int(os.getenv('FORECAST_BATCH_CITIES', '50'))
+
+# Hours predicted after the latest hour. The features are the 24 latest
+# hourly means, so every horizon also sees its target hour one day earlier
+# (the seasonal naive forecast, kept as the fallback and the baseline).
+HORIZON = 24
+LAGS = 24
+# Samples per backtest block: each block is scored with the weights fitted
+# on the blocks before it and then added to the model
+BLOCK_HOURS = 168
+# Stored models of another version are refitted from history
+MODEL_VERSION = 1
+
+NAIVE_COLUMNS = [1 + LAGS - k for k in range(1, HORIZON + 1)]
+EPOCH = datetime(1970, 1, 1)
+
+def hour_to_datetime(hour):
+    return EPOCH + timedelta(hours=int(hour))
+
+def fill_gaps(hours, values):
+    # Dense hourly series from the first to the last hour; gaps of up to
+    # FORECAST_MAX_GAP_HOURS repeat the previous mean, longer ones stay NaN
+    start = hours[0]
+    series = np.full(hours[-1] - start + 1, np.nan)
+    series[hours - start] = values
+    index = np.arange(len(series))
+    valid = ~np.isnan(series)
+    last = np.maximum.accumulate(np.where(valid, index, -1))
+    fill = ~valid & (last >= 0) & (index - last <= FORECAST_MAX_GAP_HOURS)
+    series[fill] = series[last[fill]]
+    return series
+
+def features(series, start):
+    # One row per origin hour with a full day of lags, oldest first:
+    # [1, y(t), y(t-1) .. y(t-23), sin and cos of the hour of day]
+    lags = sliding_window_view(series, LAGS)[:, ::-1]
+    angle = (start + LAGS - 1 + np.arange(len(lags))) % 24 * (2 * np.pi / 24)
+    return np.column_stack([np.ones(len(lags)), lags, np.sin(angle), np.cos(angle)])
+
+def solve(xtx, xty):
+    penalty = np.eye(len(xtx)) * (FORECAST_RIDGE_ALPHA * np.trace(xtx) / len(xtx))
+    # The intercept is not shrunk
+    penalty[0, 0] = 0.0
+    return np.linalg.solve(xtx + penalty, xty)
+
+def _empty_state():
+    size = 1 + LAGS + 2
+    return {
+        "v": MODEL_VERSION, "through": None, "clock": None, "samples": 0,
+        "xtx": np.zeros((size, size)), "xty": np.zeros((size, HORIZON)),
+        "err": np.zeros(HORIZON), "naive_err": np.zeros(HORIZON), "evaluated": 0.0,
+    }
+
+def fit(state, hours, values):
+    # Adds the samples whose HORIZON target hours are complete (before the
+    # latest hour, which may still be filling up) and newer than the model,
+    # then forecasts from the latest hour. The model is the exponentially
+    # decayed X'X / X'Y of those samples, so an update only touches the new
+    # hours. Returns the new JSON-serializable state, or the old one when
+    # the hours given span less than a day.
+    if state is not None and state.get("v") != MODEL_VERSION:
+        state = None
+    if len(hours) == 0 or hours[-1] - hours[0] + 1 < LAGS:
+        return state
+
+    model = _empty_state() if state is None else {
+        **state, **{key: np.array(state[key]) for key in ("xtx", "xty", "err", "naive_err")}
+    }
+    start, latest = int(hours[0]), int(hours[-1])
+    series = fill_gaps(hours, values)
+    x = features(series, start)
+    origins = start + LAGS - 1 + np.arange(len(x))
+    if len(series) >= LAGS + HORIZON:
+        targets = sliding_window_view(series[LAGS:], HORIZON)
+    else:
+        targets = np.empty((0, HORIZON))
+    complete = max(len(targets) - 1, 0)
+    x_train, y_train = x[:complete], targets[:complete]
+    keep = ~np.isnan(x_train).any(axis=1) & ~np.isnan(y_train).any(axis=1)
+    if model["through"] is not None:
+        keep &= origins[:complete] > model["through"]
+    rows = np.flatnonzero(keep)
+
+    decay = 0.5 ** (1 / FORECAST_HALF_LIFE_HOURS)
+    coef = solve(model["xtx"], model["xty"]) if model["samples"] else None
+    for block in range(0, len(rows), BLOCK_HOURS):
+        picked = rows[block:block + BLOCK_HOURS]
+        bx, by, bo = x_train[picked], y_train[picked], origins[picked]
+        clock = int(bo[-1])
+        if model["clock"] is not None:
+            aged = decay ** (clock - model["clock"])
+            for key in ("xtx", "xty", "err", "naive_err"):
+                model[key] *= aged
+            model["evaluated"] *= aged
+        weights = decay ** (clock - bo)
+        if coef is not None:
+            model["err"] += weights @ np.abs(bx @ coef - by)
+            model["naive_err"] += weights @ np.abs(bx[:, NAIVE_COLUMNS] - by)
+            model["evaluated"] += float(weights.sum())
+        weighted = bx * weights[:, None]
+        model["xtx"] += weighted.T @ bx
+        model["xty"] += weighted.T @ by
+        model["samples"] += len(picked)
+        model["clock"] = clock
+        model["through"] = int(bo[-1])
+        coef = solve(model["xtx"], model["xty"])
+
+    # Per horizon, ridge only where its backtest beats the seasonal naive forecast
+    evaluated = model["evaluated"]
+    if coef is not None and evaluated > 0:
+        use_ridge = model["err"] <= model["naive_err"]
+    else:
+        use_ridge = np.zeros(HORIZON, dtype=bool)
+    errors = np.where(use_ridge, model["err"], model["naive_err"])
+    model["methods"] = ["ridge" if ridge else "seasonal_naive" for ridge in use_ridge]
+    model["mae"] = [round(float(e / evaluated), 1) for e in errors] if evaluated > 0 else None
+    model["origin"] = latest
+    model["forecast"] = None
+    if not np.isnan(x[-1]).any():
+        naive = x[-1][NAIVE_COLUMNS]
+        predicted = np.where(use_ridge, x[-1] @ coef, naive) if coef is not None else naive
+        model["forecast"] = [int(round(v)) for v in np.clip(predicted, 0, 500)]
+    model["trained_at"] = datetime.utcnow().isoformat()
+    for key in ("xtx", "xty", "err", "naive_err"):
+        model[key] = model[key].tolist()
+    return model
+
+def to_payload(city_id, model):
+    # What /data/forecast serves, cached apart from the (larger) model
+    if model is None or model.get("forecast") is None:
+        return None
+    origin = hour_to_datetime(model["origin"])
+    return {
+        "city_id": city_id,
+        "origin": origin.isoformat(),
+        "trained_at": model["trained_at"],
+        "samples": model["samples"],
+        "points": [
+            {
+                "time": (origin + timedelta(hours=k + 1)).isoformat(),
+                "aqi": value,
+                "aqi_level": get_aqi_level(value),
+                "method": model["methods"][k],
+                "mae": model["mae"][k] if model["mae"] else None,
+            }
+            for k, value in enumerate(model["forecast"])
+        ],
+    }
+
+def _resume_from(model):
+    # Hours an existing model still needs: the lags of its first new sample,
+    # plus the hours a gap at their start is filled from
+    if not model or model.get("v") != MODEL_VERSION or model.get("through") is None:
+        return None
+    return hour_to_datetime(model["through"] - LAGS + 2 - FORECAST_MAX_GAP_HOURS)
+
+def train_batch(items):
+    # items: [(city_id, stored model or None)]. Module-level so it can run in
+    # a worker process, which loads its own history. Returns
+    # ({city_id: (model, payload)}, error).
+    history, error = air_quality.get_hourly_aqi(
+        {city_id: _resume_from(model) for city_id, model in items}, FORECAST_TRAIN_DAYS
+    )
+    if error:
+        return {}, error
+    results = {}
+    for city_id, model in items:
+        hours, values = history.get(city_id, ((), ()))
+        model = fit(model, np.array(hours, dtype=np.int64), np.array(values, dtype=np.float64))
+        results[city_id] = (model, to_payload(city_id, model))
+    return results, None
+
+def train(city_ids, full=False, workers=1):
+    # Updates the models of `city_ids` from their stored state, or refits
+    # them from history when `full`. Batches go to a pool of `workers`
+    # processes (spawned, so none inherits the parent's connections or
+    # threads). Returns (stats, error).
+    started = time.perf_counter()
+    city_ids = sorted(set(city_ids))
+    batches = [city_ids[i:i + FORECAST_BATCH_CITIES] for i in range(0, len(city_ids), FORECAST_BATCH_CITIES)]
+    workers = max(1, min(workers, len(batches)))
+    stats = {"cities": len(city_ids), "forecasts": 0, "workers": workers}
+
+    def tasks():
+        for batch in batches:
+            models = {} if full else data_cache.get_forecast_models(batch)
+            yield [(city_id, models.get(city_id)) for city_id in batch]
+
+    def store(results):
+        for result, error in results:
+            if error:
+                return error
+            data_cache.set_forecasts(result)
+            stats["forecasts"] += sum(1 for _, payload in result.values() if payload)
+        return None
+
+    if workers > 1:
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            error = store(pool.map(train_batch, tasks()))
+    else:
+        error = store(map(train_batch, tasks()))
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    return stats, error
+
+def train_all(workers=None):
+    # Full refit of every city, e.g. after a history import
+    items, error = cities.get_city_catalog()
+    if error:
+        return None, error
+    return train([city['id'] for city in items], full=True, workers=workers or FORECAST_WORKERS)
+
+def get_forecast(city_id):
+    # Served from the cache. On a miss the stored model is brought up to
+    # date, or fitted from history when there is none. Returns (payload or
+    # None, error).
+    payload = data_cache.get_forecast(city_id)
+    if payload is not data_cache.MISS:
+        return payload, None
+    models = data_cache.get_forecast_models([city_id])
+    results, error = train_batch([(city_id, models.get(city_id))])
+    if error:
+        return None, error
+    data_cache.set_forecasts(results)
+    return results[city_id][1], None
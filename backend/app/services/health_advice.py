@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+from datetime import datetime
+from backend.app.repositories import analytics
+from backend.app.services import data_cache
+
+# Rebuild at least this often so rules edited in the database directly are
+# picked up; POST /admin/health-advice/reload rebuilds every worker at once
+HEALTH_ADVICE_MAX_AGE = float(os.getenv('HEALTH_ADVICE_MAX_AGE', '600'))
+
+# Rules for everyone: the fallback when none target the user's group, and
+# for users without a tag
+GENERAL_TARGET_GROUP = 'normal'
+# Rules keyed on the overall AQI level rather than the dominant pollutant
+GENERAL_POLLUTANT = 'aqi'
+
+MONTHS = range(1, 13)
+
+def applicable_months(start, end):
+    # Months a rule applies in. A missing bound leaves that side open and
+    # start > end wraps over the new year (e.g. 11..2 is Nov-Feb).
+    start = start or 1
+    end = end or 12
+    if start <= end:
+        return [month for month in MONTHS if start <= month <= end]
+    return [month for month in MONTHS if month >= start or month <= end]
+
+def _key(pollutant, aqi_level, target_group, month):
+    return ((pollutant or '').casefold(), (aqi_level or '').casefold(), (target_group or '').casefold(), month)
+
+class AdviceIndex:
+    # Immutable per-process snapshot of the active rules, expanded to one
+    # entry per (pollutant, aqi_level, target_group, month) so a lookup is a
+    # single dict probe
+    def __init__(self, items):
+        entries = {}
+        for item in items:
+            for month in applicable_months(item['applicable_start_month'], item['applicable_end_month']):
+                key = _key(item['pollutant'], item['aqi_level'], item['target_group'], month)
+                entries.setdefault(key, []).append(item)
+        self.entries = {key: tuple(rules) for key, rules in entries.items()}
+        self.rules = len(items)
+
+    def lookup(self, pollutant, aqi_level, target_group, month):
+        return self.entries.get(_key(pollutant, aqi_level, target_group, month), ())
+
+    def advice_for(self, reading, target_group, month):
+        # The user's group before the general one, and within a group the
+        # dominant pollutant's rules before the overall AQI ones; the first
+        # non-empty wins
+        groups = [target_group, GENERAL_TARGET_GROUP] if target_group else [GENERAL_TARGET_GROUP]
+        pollutants = [p for p in (reading.get('dominant_pol'), GENERAL_POLLUTANT) if p]
+        for group in groups:
+            for pollutant in pollutants:
+                rules = self.lookup(pollutant, reading.get('aqi_level'), group, month)
+                if rules:
+                    return rules
+        return ()
+
+# (index, version, built at); replaced as a whole so readers need no lock
+_index = None
+_build_lock = threading.Lock()
+
+def _is_current(index, version):
+    return index is not None and index[1] == version \
+        and time.monotonic() - index[2] < HEALTH_ADVICE_MAX_AGE
+
+def get_index():
+    # Returns (index, error); like city_index.get_catalog, only a stale
+    # snapshot touches the database
+    global _index
+    version = data_cache.health_advice_version()
+    index = _index
+    if _is_current(index, version):
+        return index[0], None
+
+    with _build_lock:
+        index = _index
+        if _is_current(index, version):
+            return index[0], None
+        items, error = analytics.get_health_advice()
+        if error:
+            return (index[0], None) if index else (None, error)
+        advice = AdviceIndex(items)
+        _index = (advice, version, time.monotonic())
+        return advice, None
+
+def advice_for(reading, tag):
+    # Advice for a latest reading and a user tag, in the reading's month.
+    # Returns ([rule], error).
+    if not reading or not reading.get('aqi_level'):
+        return [], None
+    index, error = get_index()
+    if error:
+        return [], error
+    recorded = reading.get('recorded_time')
+    month = datetime.fromisoformat(recorded).month if recorded else datetime.utcnow().month
+    return list(index.advice_for(reading, tag, month)), None
@@ -0,0 +1,175 @@
+import csv
+import io
+import itertools
+import json
+import os
+import time
+from datetime import datetime, timezone
+from backend.app.repositories import cities, air_quality
+from backend.app.services.aqicn import get_aqi_level
+
+POLLUTANT_FIELDS = ('pm25', 'pm10', 'o3', 'no2', 'so2', 'co')
+
+# Input rows per COPY transaction. Each chunk is merged, rolled up and
+# committed on its own, so a failure keeps the chunks before it and the
+# import can resume from `committed_rows`.
+HISTORY_CHUNK_ROWS = int(os.getenv('HISTORY_CHUNK_ROWS', '200000'))
+
+class CsvRowStream:
+    # File-like adapter handed to COPY: rows are encoded lazily as COPY
+    # pulls data, so only one buffer's worth of the input is held in memory.
+    def __init__(self, rows, columns):
+        self._rows = iter(rows)
+        self._columns = columns
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator='\n')
+        self._pending = ''
+        self.count = 0
+
+    def read(self, size=-1):
+        while size < 0 or len(self._pending) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._writer.writerow([_csv_value(row.get(col)) for col in self._columns])
+            self.count += 1
+            if self._buffer.tell() >= 65536:
+                self._drain()
+        self._drain()
+        if size < 0 or size >= len(self._pending):
+            chunk, self._pending = self._pending, ''
+        else:
+            chunk, self._pending = self._pending[:size], self._pending[size:]
+        return chunk
+
+    def _drain(self):
+        self._pending += self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+
+def _csv_value(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return value
+
+def iter_history_file(path):
+    lower = path.lower()
+    if lower.endswith('.jsonl') or lower.endswith('.ndjson'):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    elif lower.endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                yield row
+    else:
+        raise ValueError(f"unsupported_file_type: {path}")
+
+def build_city_lookup():
+    items, _, error = cities.get_all_cities(page=1, page_size=100000)
+    if error:
+        raise RuntimeError(error)
+    # Keyed by (name, province), (name, '') and the id itself, so explicit
+    # city_id columns are checked against the catalog too
+    lookup = {}
+    for city in items:
+        lookup[city['id']] = city['id']
+        lookup[(city['name'].lower(), (city['province'] or '').lower())] = city['id']
+        lookup.setdefault((city['name'].lower(), ''), city['id'])
+    return lookup
+
+# Value parsing shared by every ingestion path (the sync sources use these too)
+def parse_timestamp(value):
+    # ISO-8601 text or datetime -> naive UTC (the storage convention), or None
+    if not value:
+        return None
+    if not isinstance(value, datetime):
+        try:
+            value = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def to_number(value, cast=float):
+    if value is None or value == '' or value == '-':
+        return None
+    return cast(float(value))
+
+def normalize_history_row(raw, city_lookup, default_source='IMPORT'):
+    city_id = raw.get('city_id')
+    if city_id not in (None, ''):
+        # Unknown ids are skipped like unknown names instead of failing the
+        # whole COPY on the foreign key
+        city_id = city_lookup.get(int(city_id))
+    else:
+        name = (raw.get('city') or raw.get('city_name') or '').strip().lower()
+        province = (raw.get('province') or '').strip().lower()
+        city_id = city_lookup.get((name, province)) or city_lookup.get((name, ''))
+    if not city_id:
+        return None
+
+    recorded = parse_timestamp(raw.get('recorded_time'))
+    if recorded is None:
+        return None
+
+    aqi = to_number(raw.get('aqi'), int)
+    row = {
+        'city_id': city_id,
+        'recorded_time': recorded,
+        'aqi': aqi,
+        'aqi_level': raw.get('aqi_level') or get_aqi_level(aqi),
+        'dominant_pol': raw.get('dominant_pol') or None,
+        'source': raw.get('source') or default_source,
+        'attribution': raw.get('attribution') or None,
+    }
+    for field in POLLUTANT_FIELDS:
+        row[field] = to_number(raw.get(field))
+    return row
+
+def import_history_file(path, default_source='IMPORT', skip_rows=0):
+    # Returns (stats, error); on error stats['committed_rows'] input rows
+    # (counted from the start of the file) are stored, and passing that as
+    # `skip_rows` resumes after them
+    lookup = build_city_lookup()
+    stats = {'file': path, 'read': 0, 'skipped': 0, 'copied': 0, 'merged': 0,
+             'chunks': 0, 'committed_rows': skip_rows}
+    raw_rows = itertools.islice(iter_history_file(path), skip_rows, None)
+
+    def normalized_rows(chunk):
+        for raw in chunk:
+            stats['read'] += 1
+            try:
+                row = normalize_history_row(raw, lookup, default_source)
+            except (TypeError, ValueError):
+                row = None
+            if row is None:
+                stats['skipped'] += 1
+                continue
+            yield row
+
+    started = time.perf_counter()
+    error = None
+    while True:
+        first = next(raw_rows, None)
+        if first is None:
+            break
+        chunk = itertools.chain([first], itertools.islice(raw_rows, HISTORY_CHUNK_ROWS - 1))
+        stream = CsvRowStream(normalized_rows(chunk), air_quality.READING_COLUMNS)
+        result, error = air_quality.copy_air_quality_history(stream)
+        if error:
+            break
+        stats['chunks'] += 1
+        stats['copied'] += result['copied']
+        stats['merged'] += result['merged']
+        stats['committed_rows'] = skip_rows + stats['read']
+    elapsed = time.perf_counter() - started
+
+    stats['seconds'] = elapsed
+    stats['rows_per_second'] = stats['read'] / elapsed if elapsed > 0 else None
+    return stats, error
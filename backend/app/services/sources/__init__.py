@@ -0,0 +1,22 @@
+# Air quality source adapters and the shared ingestion pipeline
+from backend.app.services.sources.aqicn import AqicnSource
+from backend.app.services.sources.openaq import OpenAqSource
+from backend.app.services.sources.file_drop import FileDropSource
+from backend.app.services.sources.pipeline import run_sync
+
+SOURCES = {
+    AqicnSource.name: AqicnSource,
+    OpenAqSource.name: OpenAqSource,
+    FileDropSource.name: FileDropSource,
+}
+
+def create_source(name):
+    source_class = SOURCES.get(name)
+    return source_class() if source_class else None
+
+def sync_source(name, sync_log_id=None, city_ids=None, progress=None, should_yield=None):
+    # A fresh adapter per run keeps per-run state (files read, counters) apart
+    return run_sync(create_source(name), sync_log_id, city_ids, progress, should_yield)
+
+__all__ = ['SOURCES', 'create_source', 'sync_source', 'run_sync',
+           'AqicnSource', 'OpenAqSource', 'FileDropSource']
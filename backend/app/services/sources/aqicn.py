@@ -0,0 +1,37 @@
+from datetime import datetime
+from backend.app.services import aqicn
+from backend.app.services.sources.base import SourceAdapter, POLLUTANT_FIELDS, parse_timestamp, to_number
+
+class AqicnSource(SourceAdapter):
+    name = 'AQICN'
+    scheduled = True
+
+    def fetch(self, city_list, deadline=None):
+        if aqicn.AQICN_SYNC_MODE == 'bounds':
+            return aqicn.fetch_cities_by_bounds(city_list, deadline=deadline)
+        return aqicn.fetch_cities_air_quality(city_list, deadline=deadline)
+
+    def normalize(self, city, raw):
+        aqi_value = to_number(raw.get('aqi'), int)
+        # The feed reports the station's own observation time with its UTC
+        # offset; fall back to the fetch time when the station has none
+        recorded = parse_timestamp((raw.get('time') or {}).get('iso')) or datetime.utcnow()
+        attributions = raw.get('attributions') or [{}]
+        
+        reading = {
+            'city_id': city['id'],
+            'recorded_time': recorded,
+            'aqi': aqi_value,
+            'aqi_level': aqicn.get_aqi_level(aqi_value),
+            'dominant_pol': raw.get('dominentpol'),
+            'source': self.name,
+            'attribution': attributions[0].get('name', 'AQICN'),
+        }
+        
+        iaqi = raw.get('iaqi') or {}
+        for field in POLLUTANT_FIELDS:
+            reading[field] = to_number((iaqi.get(field) or {}).get('v'))
+        return reading
+
+    def stats(self):
+        return aqicn.get_client().stats()
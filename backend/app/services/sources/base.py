@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+from backend.app.services.history_import import POLLUTANT_FIELDS, parse_timestamp, to_number
+
+# Validation failure reasons, counted next to the fetch failure reasons
+INVALID_RECORD = 'invalid_record'
+INVALID_TIME = 'invalid_time'
+INVALID_AQI = 'invalid_aqi'
+INVALID_POLLUTANT = 'invalid_pollutant'
+
+# Readings stamped further ahead than this are rejected as clock errors
+MAX_FUTURE_SKEW = timedelta(hours=2)
+MAX_AQI = 999
+
+class SourceAdapter:
+    # A source turns one upstream into air_quality_data readings for the
+    # shared pipeline (sources.pipeline.run_sync):
+    #   fetch(city_list, deadline) yields (city, raw, error); city may be None
+    #     when the source resolves cities itself in normalize()
+    #   normalize(city, raw) maps one raw record to a reading dict with the
+    #     air_quality.READING_COLUMNS keys, or None if it cannot be used
+    #   validate(reading) returns a failure reason or None
+    # The pipeline handles watermarks, batching, caches, rollups and sync_logs.
+    name = None
+    # Whether fetch() works on the city list (False: the source finds its own records)
+    per_city = True
+    # Skip readings that are not newer than the city's last stored observation
+    incremental = True
+    # Report per-city outcomes to the adaptive scheduler (services/sync_planner.py)
+    scheduled = False
+
+    def fetch(self, city_list, deadline=None):
+        raise NotImplementedError
+
+    def normalize(self, city, raw):
+        raise NotImplementedError
+
+    def validate(self, reading):
+        if not reading.get('city_id'):
+            return INVALID_RECORD
+        recorded = reading.get('recorded_time')
+        if not isinstance(recorded, datetime) or recorded > datetime.utcnow() + MAX_FUTURE_SKEW:
+            return INVALID_TIME
+        aqi = reading.get('aqi')
+        if aqi is not None and not 0 <= aqi <= MAX_AQI:
+            return INVALID_AQI
+        for field in POLLUTANT_FIELDS:
+            value = reading.get(field)
+            if value is not None and value < 0:
+                return INVALID_POLLUTANT
+        return None
+
+    def close(self, success):
+        # Called once after the run has been written (e.g. to archive input files)
+        pass
+
+    def stats(self):
+        return {}
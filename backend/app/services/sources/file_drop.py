@@ -0,0 +1,74 @@
+import os
+import shutil
+from backend.app.services.history_import import iter_history_file, build_city_lookup, normalize_history_row
+from backend.app.services.sources.base import SourceAdapter
+
+# Directory scanned for .csv / .jsonl / .ndjson files; empty disables the source
+FILE_DROP_DIR = os.getenv('FILE_DROP_DIR', '')
+
+FAIL_NOT_CONFIGURED = 'not_configured'
+FAIL_UNREADABLE = 'unreadable_file'
+
+FILE_EXTENSIONS = ('.csv', '.jsonl', '.ndjson')
+
+class FileDropSource(SourceAdapter):
+    # Picks up every supported file in FILE_DROP_DIR, using the same columns as
+    # `import_data.py --history`. Files are moved to processed/ once their rows
+    # are written, or to failed/ with none of their rows applied if any part
+    # could not be parsed; after a write error they stay in place and are
+    # retried on the next run (upserts are idempotent).
+    name = 'FILE'
+    per_city = False
+    # Dropped files are usually backfills, so older readings must not be skipped
+    incremental = False
+
+    def __init__(self, directory=None):
+        self.directory = directory or FILE_DROP_DIR
+        self._lookup = None
+        self._read = []
+        self._unreadable = []
+
+    def fetch(self, city_list, deadline=None):
+        if not self.directory or not os.path.isdir(self.directory):
+            yield None, None, FAIL_NOT_CONFIGURED
+            return
+        self._lookup = build_city_lookup()
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if not os.path.isfile(path) or not name.lower().endswith(FILE_EXTENSIONS):
+                continue
+            try:
+                # Parsed once up front so a file broken halfway is rejected
+                # whole, before any of its rows are written
+                for _ in iter_history_file(path):
+                    pass
+            except (OSError, UnicodeDecodeError, ValueError):
+                self._unreadable.append(path)
+                yield None, None, FAIL_UNREADABLE
+                continue
+            for raw in iter_history_file(path):
+                yield None, raw, None
+            self._read.append(path)
+
+    def normalize(self, city, raw):
+        return normalize_history_row(raw, self._lookup, default_source=self.name)
+
+    def close(self, success):
+        self._move(self._unreadable, 'failed')
+        if success:
+            self._move(self._read, 'processed')
+
+    def _move(self, paths, folder):
+        if not paths:
+            return
+        target = os.path.join(self.directory, folder)
+        os.makedirs(target, exist_ok=True)
+        for path in paths:
+            shutil.move(path, os.path.join(target, os.path.basename(path)))
+
+    def stats(self):
+        return {
+            "directory": self.directory,
+            "files": len(self._read),
+            "unreadable_files": len(self._unreadable),
+        }
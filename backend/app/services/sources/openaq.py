@@ -0,0 +1,194 @@
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from backend.app.services.aqicn import get_aqi_level
+from backend.app.services.aqicn_client import (
+    RateLimiter, CircuitBreaker, FAIL_TIMEOUT, FAIL_CONNECTION, FAIL_SERVER_ERROR, FAIL_RATE_LIMITED,
+    FAIL_CLIENT_ERROR, FAIL_INVALID_RESPONSE, FAIL_CIRCUIT_OPEN, FAIL_DEADLINE, FAIL_REQUEST, RETRYABLE
+)
+from backend.app.services.sources.base import SourceAdapter, parse_timestamp, to_number
+from backend.app.utils.concurrency import map_with_deadline
+
+OPENAQ_BASE_URL = os.getenv('OPENAQ_BASE_URL', 'https://api.openaq.org')
+OPENAQ_API_KEY = os.getenv('OPENAQ_API_KEY', '')
+OPENAQ_REQUEST_TIMEOUT = float(os.getenv('OPENAQ_REQUEST_TIMEOUT', '10'))
+# Search radius in metres around a city's coordinates for its monitoring location
+OPENAQ_RADIUS_M = int(os.getenv('OPENAQ_RADIUS_M', '25000'))
+OPENAQ_CONCURRENCY = int(os.getenv('OPENAQ_CONCURRENCY', '4'))
+# The free API tier allows 60 requests per minute
+OPENAQ_RATE_LIMIT = float(os.getenv('OPENAQ_RATE_LIMIT', '1'))
+OPENAQ_SYNC_DEADLINE = float(os.getenv('OPENAQ_SYNC_DEADLINE', '1800'))
+
+FAIL_NOT_CONFIGURED = 'not_configured'
+FAIL_NO_COORDINATES = 'no_coordinates'
+FAIL_NO_LOCATION = 'no_location'
+
+# US EPA breakpoints (concentration in µg/m³ -> AQI) for the particulate
+# sensors; OpenAQ reports concentrations while air_quality_data stores the
+# AQI sub-indices that AQICN publishes, so gases with mixed units are skipped
+AQI_BREAKPOINTS = {
+    'pm25': [(0.0, 9.0, 0, 50), (9.1, 35.4, 51, 100), (35.5, 55.4, 101, 150),
+             (55.5, 125.4, 151, 200), (125.5, 225.4, 201, 300), (225.5, 325.4, 301, 500)],
+    'pm10': [(0, 54, 0, 50), (55, 154, 51, 100), (155, 254, 101, 150),
+             (255, 354, 151, 200), (355, 424, 201, 300), (425, 604, 301, 500)],
+}
+
+def concentration_to_aqi(pollutant, value):
+    if value is None or value < 0:
+        return None
+    for c_low, c_high, i_low, i_high in AQI_BREAKPOINTS[pollutant]:
+        if value <= c_high:
+            value = max(value, c_low)
+            return round((i_high - i_low) / (c_high - c_low) * (value - c_low) + i_low)
+    return 500
+
+# Location lookups (with their sensor list) rarely change, so they are kept
+# for the life of the process and cost one call per city only once
+_locations = {}
+_locations_lock = threading.Lock()
+
+class OpenAqSource(SourceAdapter):
+    name = 'OPENAQ'
+
+    def __init__(self):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=max(1, OPENAQ_CONCURRENCY), max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['X-API-Key'] = OPENAQ_API_KEY
+        self.limiter = RateLimiter(OPENAQ_RATE_LIMIT)
+        self.breaker = CircuitBreaker()
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def fetch(self, city_list, deadline=None):
+        if not OPENAQ_API_KEY:
+            for city in city_list:
+                yield city, None, FAIL_NOT_CONFIGURED
+            return
+        deadline_at = time.monotonic() + (deadline if deadline is not None else OPENAQ_SYNC_DEADLINE)
+        yield from map_with_deadline(
+            city_list, self._fetch_city, OPENAQ_CONCURRENCY, deadline_at, FAIL_DEADLINE, 'openaq-fetch'
+        )
+
+    def _fetch_city(self, city, deadline_at):
+        if city.get('lat') is None or city.get('lon') is None:
+            return None, FAIL_NO_COORDINATES
+        location, error = self._location_for(city, deadline_at)
+        if error:
+            return None, error
+        latest, error = self._get(f"/v3/locations/{location['id']}/latest", {}, deadline_at)
+        if error:
+            return None, error
+        return {'location': location, 'latest': latest.get('results') or []}, None
+
+    def _location_for(self, city, deadline_at):
+        with _locations_lock:
+            location = _locations.get(city['id'])
+        if location is not None:
+            return location, None
+        payload, error = self._get('/v3/locations', {
+            'coordinates': f"{city['lat']},{city['lon']}",
+            'radius': OPENAQ_RADIUS_M,
+            'limit': 1,
+        }, deadline_at)
+        if error:
+            return None, error
+        results = payload.get('results') or []
+        if not results:
+            return None, FAIL_NO_LOCATION
+        with _locations_lock:
+            _locations[city['id']] = results[0]
+        return results[0], None
+
+    def _get(self, path, params, deadline_at):
+        if not self.breaker.allow():
+            return None, FAIL_CIRCUIT_OPEN
+        if not self.limiter.acquire(deadline_at):
+            self.breaker.cancel_probe()
+            return None, FAIL_DEADLINE
+        timeout = min(OPENAQ_REQUEST_TIMEOUT, deadline_at - time.monotonic())
+        if timeout <= 0:
+            self.breaker.cancel_probe()
+            return None, FAIL_DEADLINE
+
+        with self._lock:
+            self.requests += 1
+        try:
+            response = self.session.get(f"{OPENAQ_BASE_URL}{path}", params=params, timeout=timeout)
+            if response.status_code >= 500:
+                error = FAIL_SERVER_ERROR
+            elif response.status_code == 429:
+                error = FAIL_RATE_LIMITED
+            elif response.status_code != 200:
+                error = FAIL_CLIENT_ERROR
+            else:
+                payload = response.json()
+                error = None if isinstance(payload, dict) else FAIL_INVALID_RESPONSE
+        except requests.Timeout:
+            error = FAIL_TIMEOUT
+        except requests.ConnectionError:
+            error = FAIL_CONNECTION
+        except requests.RequestException:
+            error = FAIL_REQUEST
+        except ValueError:
+            error = FAIL_INVALID_RESPONSE
+
+        if error in RETRYABLE:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return (None, error) if error else (payload, None)
+
+    def normalize(self, city, raw):
+        sensors = {
+            sensor['id']: (sensor.get('parameter') or {}).get('name')
+            for sensor in raw['location'].get('sensors') or []
+        }
+        sub_indices = {}
+        recorded = None
+        for item in raw['latest']:
+            pollutant = sensors.get(item.get('sensorsId'))
+            if pollutant not in AQI_BREAKPOINTS:
+                continue
+            observed = parse_timestamp((item.get('datetime') or {}).get('utc'))
+            if observed is None:
+                continue
+            sub_indices[pollutant] = concentration_to_aqi(pollutant, to_number(item.get('value')))
+            recorded = max(recorded, observed) if recorded else observed
+
+        sub_indices = {k: v for k, v in sub_indices.items() if v is not None}
+        if not sub_indices:
+            return None
+        dominant = max(sub_indices, key=sub_indices.get)
+        aqi_value = sub_indices[dominant]
+        return {
+            'city_id': city['id'],
+            'recorded_time': recorded,
+            'aqi': aqi_value,
+            'aqi_level': get_aqi_level(aqi_value),
+            'dominant_pol': dominant,
+            'pm25': sub_indices.get('pm25'),
+            'pm10': sub_indices.get('pm10'),
+            'o3': None,
+            'no2': None,
+            'so2': None,
+            'co': None,
+            'source': self.name,
+            'attribution': f"OpenAQ: {raw['location'].get('name') or raw['location']['id']}",
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                "base_url": OPENAQ_BASE_URL,
+                "requests": self.requests,
+                "circuit": self.breaker.state,
+                "circuit_trips": self.breaker.trips,
+                "cached_locations": len(_locations),
+            }
+
+    def close(self, success):
+        self.session.close()
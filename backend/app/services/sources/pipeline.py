@@ -0,0 +1,235 @@
+import os
+import time
+from collections import Counter
+from datetime import datetime
+from backend.app.repositories import cities, air_quality, sync_logs, sync_state
+from backend.app.services import anomaly, data_cache, forecast, sync_planner
+from backend.app.services.aqicn_client import FAIL_CIRCUIT_OPEN, FAIL_DEADLINE
+from backend.app.services.sources.base import INVALID_RECORD
+
+# Readings written per batched upsert
+PIPELINE_BATCH_SIZE = int(os.getenv('PIPELINE_BATCH_SIZE', '500'))
+
+# Failures that say nothing about the station itself: an open circuit or the
+# run deadline leave the city due for the next tick instead of backing it off
+NOT_STATION_FAILURES = (FAIL_CIRCUIT_OPEN, FAIL_DEADLINE)
+
+class SyncRun:
+    # Counters and batch buffer for one source run
+    def __init__(self, source, states):
+        self.source = source
+        self.states = states
+        self.batch = []
+        self.failures = Counter()
+        self.outcomes = []
+        self.observed = []
+        self.records = 0
+        self.success_count = 0
+        self.fail_count = 0
+        self.unchanged_count = 0
+        self.write_seconds = 0.0
+        self.error_message = None
+
+    def add(self, city, raw, error):
+        self.records += 1
+        if error:
+            self._fail(city, error)
+            return
+        try:
+            reading = self.source.normalize(city, raw)
+        except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+            reading = None
+        reason = INVALID_RECORD if reading is None else self.source.validate(reading)
+        if reason:
+            self._fail(city, reason)
+            return
+
+        reading['source'] = reading.get('source') or self.source.name
+        if self.source.incremental:
+            last_seen = self.states.get(reading['city_id'], {}).get('last_observed_at')
+            if last_seen is not None and reading['recorded_time'] <= last_seen:
+                self.unchanged_count += 1
+                self.outcomes.append((reading['city_id'], 'unchanged', None))
+                return
+
+        self.batch.append(reading)
+        if len(self.batch) >= PIPELINE_BATCH_SIZE:
+            self.flush()
+
+    def _fail(self, city, reason):
+        self.fail_count += 1
+        self.failures[reason] += 1
+        if city is not None and reason not in NOT_STATION_FAILURES:
+            self.outcomes.append((city['id'], 'failed', None))
+
+    def flush(self):
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, []
+        started = time.perf_counter()
+        saved, save_error = air_quality.save_air_quality_batch(batch)
+        self.write_seconds += time.perf_counter() - started
+        if save_error:
+            # Not the station's fault: these cities stay due for the next tick
+            self.fail_count += len(batch)
+            self.error_message = save_error
+            return
+
+        self.success_count += len(batch)
+        for reading in batch:
+            self.outcomes.append((reading['city_id'], 'changed', reading['recorded_time']))
+            self.observed.append((reading['city_id'], reading['recorded_time']))
+        if saved:
+            data_cache.on_readings_saved(saved)
+
+    def metrics(self, elapsed):
+        return {
+            "records": self.records,
+            "written": self.success_count,
+            "unchanged": self.unchanged_count,
+            "failed": self.fail_count,
+            "seconds": round(elapsed, 3),
+            "write_seconds": round(self.write_seconds, 3),
+            "records_per_second": round(self.records / elapsed, 1) if elapsed > 0 else None,
+        }
+
+def detect_anomalies(observed):
+    # Post-write stage: flags suspect readings among the new ones, with the
+    # cities' recent history as context. Never fails the sync.
+    if not anomaly.ANOMALY_DETECTION or not observed:
+        return None
+    try:
+        stats, error = anomaly.scan_cities(
+            {city_id for city_id, _ in observed}, min(recorded for _, recorded in observed)
+        )
+    except Exception as e:
+        stats, error = None, str(e)
+    return {"error": error} if error else stats
+
+def update_forecasts(observed):
+    # Post-write stage: folds the new hours of the synced cities into their
+    # forecast models. Never fails the sync.
+    if not forecast.FORECAST_ENABLED or not observed:
+        return None
+    try:
+        stats, error = forecast.train({city_id for city_id, _ in observed})
+    except Exception as e:
+        stats, error = None, str(e)
+    return {"error": error} if error else stats
+
+def upstream_calls(source, requests_before):
+    # Calls this run made upstream, retries and fallbacks included, from the
+    # client's request counter; None for sources without one
+    requests_after = source.stats().get("requests")
+    if requests_before is None or requests_after is None:
+        return None
+    return requests_after - requests_before
+
+def run_sync(source, sync_log_id=None, city_ids=None, progress=None, should_yield=None):
+    # Runs one source end to end: fetch -> normalize -> validate -> skip
+    # unchanged -> batched upsert (rollups included) -> caches -> anomaly
+    # flags -> forecast models -> watermarks / schedule -> sync_logs.
+    # `progress` is called as progress(completed, total, fetched, failed);
+    # total is None when the source does not work from the city list.
+    # `should_yield` is polled between cities of a per-city source; once it
+    # returns True the fetch stops, what was read is written as usual and
+    # the ids of the cities not reached are returned.
+    if not sync_log_id:
+        sync_log_id, _ = sync_logs.log_sync(
+            sync_type='scheduled',
+            data_source=source.name,
+            start_time=datetime.utcnow(),
+            status='in_progress'
+        )
+
+    run = None
+    started = time.perf_counter()
+    requests_before = source.stats().get("requests")
+    try:
+        all_cities = []
+        if source.per_city:
+            if city_ids:
+                all_cities, _ = cities.get_cities_by_ids(city_ids)
+            else:
+                all_cities, _, _ = cities.get_all_cities(page=1, page_size=1000)
+
+            if not all_cities:
+                sync_logs.update_sync_log(
+                    sync_log_id,
+                    end_time=datetime.utcnow(),
+                    status='failed',
+                    success_count=0,
+                    fail_count=0,
+                    total_count=0,
+                    error_message="no_cities_found"
+                )
+                return
+
+        states = {}
+        if source.incremental and source.per_city:
+            states, _ = sync_state.get_states([city['id'] for city in all_cities], source.name)
+
+        run = SyncRun(source, states)
+        total = len(all_cities) if source.per_city else None
+        reached = set()
+        remaining = []
+        records = source.fetch(all_cities)
+        for city, raw, error in records:
+            run.add(city, raw, error)
+            if progress:
+                fetched = run.records - run.fail_count
+                progress(run.records, total, fetched, run.fail_count)
+            if city is not None:
+                reached.add(city['id'])
+            if source.per_city and should_yield and should_yield():
+                remaining = [city['id'] for city in all_cities if city['id'] not in reached]
+                if remaining:
+                    # Cancels the fetches not started yet
+                    records.close()
+                    break
+        run.flush()
+        anomalies = detect_anomalies(run.observed)
+        forecasts = update_forecasts(run.observed)
+
+        now = datetime.utcnow()
+        if source.scheduled:
+            sync_planner.record_outcomes(run.outcomes, states, now)
+        elif source.incremental:
+            sync_state.advance_watermarks(run.observed, now, source.name)
+        source.close(run.error_message is None)
+
+        sync_logs.update_sync_log(
+            sync_log_id,
+            end_time=datetime.utcnow(),
+            status='failed' if run.error_message else 'success',
+            success_count=run.success_count,
+            fail_count=run.fail_count,
+            unchanged_count=run.unchanged_count,
+            total_count=total if total is not None else run.records,
+            error_message=run.error_message,
+            details={
+                "failures": dict(run.failures),
+                "metrics": run.metrics(time.perf_counter() - started),
+                "upstream": source.stats(),
+                # Charged against SYNC_HOURLY_BUDGET by the planner
+                "upstream_calls": upstream_calls(source, requests_before),
+                "anomalies": anomalies,
+                "forecast": forecasts,
+                "yielded": {"remaining": len(remaining)} if remaining else None,
+            }
+        )
+        return remaining
+
+    except Exception as e:
+        success_count = run.success_count if run else 0
+        fail_count = run.fail_count if run else 0
+        sync_logs.update_sync_log(
+            sync_log_id,
+            end_time=datetime.utcnow(),
+            status='failed',
+            success_count=success_count,
+            fail_count=fail_count,
+            total_count=fail_count + success_count,
+            error_message=str(e),
+            details={"upstream_calls": upstream_calls(source, requests_before)}
+        )
@@ -0,0 +1,113 @@
+import math
+import os
+from datetime import date, timedelta
+from backend.app.repositories import sync_state, sync_logs, analytics
+
+# Seconds between scheduler ticks that queue the cities currently due
+SYNC_PLANNER_TICK = int(os.getenv('SYNC_PLANNER_TICK', '300'))
+# Upstream calls (retries and fallbacks included) AQICN syncs may spend per
+# hour before scheduled syncs stop handing out cities (0 disables the cap)
+SYNC_HOURLY_BUDGET = int(os.getenv('SYNC_HOURLY_BUDGET', '1000'))
+# Bounds in seconds for one city's regular refresh interval
+SYNC_MIN_INTERVAL = int(os.getenv('SYNC_MIN_INTERVAL', '900'))
+SYNC_MAX_INTERVAL = int(os.getenv('SYNC_MAX_INTERVAL', '21600'))
+# Assumed station cadence until enough observations have been seen
+SYNC_DEFAULT_INTERVAL = int(os.getenv('SYNC_DEFAULT_INTERVAL', '3600'))
+# Missed checks tolerated before a station backs off, and the longest back-off
+SYNC_BACKOFF_AFTER = int(os.getenv('SYNC_BACKOFF_AFTER', '2'))
+SYNC_MAX_BACKOFF = int(os.getenv('SYNC_MAX_BACKOFF', '86400'))
+# Days of view_data events counted as demand
+SYNC_DEMAND_DAYS = int(os.getenv('SYNC_DEMAND_DAYS', '7'))
+
+# Weight of the newest observed gap in the cadence moving average
+CADENCE_ALPHA = 0.3
+
+def demand_factor(views):
+    # 1.0 for cities nobody opens, shrinking towards 0.25 for the busiest ones
+    return max(0.25, 1.0 / (1.0 + math.log2(1 + views) / 4))
+
+def update_cadence(previous, last_observed, observed):
+    if last_observed is None or observed is None or observed <= last_observed:
+        return previous
+    gap = (observed - last_observed).total_seconds()
+    if gap > SYNC_MAX_BACKOFF:
+        # A gap this long is an outage, not the station's cadence
+        return previous
+    if previous is None:
+        return gap
+    return CADENCE_ALPHA * gap + (1 - CADENCE_ALPHA) * previous
+
+def next_interval(cadence, misses, views):
+    interval = (cadence or SYNC_DEFAULT_INTERVAL) * demand_factor(views)
+    interval = min(max(interval, SYNC_MIN_INTERVAL), SYNC_MAX_INTERVAL)
+    if misses > SYNC_BACKOFF_AFTER:
+        interval = min(interval * 2 ** (misses - SYNC_BACKOFF_AFTER), SYNC_MAX_BACKOFF)
+    return interval
+
+def plan_city(state, outcome, observed, views, now):
+    # outcome is 'changed' (new observation saved), 'unchanged' (station
+    # reported nothing newer) or 'failed' (no usable response)
+    last_observed = state.get('last_observed_at')
+    cadence = state.get('update_interval_sec')
+    misses = state.get('consecutive_misses') or 0
+
+    if outcome == 'changed':
+        cadence = update_cadence(cadence, last_observed, observed)
+        last_observed = max(last_observed, observed) if last_observed else observed
+        misses = 0
+    elif outcome == 'failed':
+        misses += 1
+    else:
+        # Polling a hot city faster than its station publishes is expected;
+        # it only counts as a miss once the observation is clearly overdue
+        expected_gap = cadence or SYNC_DEFAULT_INTERVAL
+        if last_observed is None or (now - last_observed).total_seconds() > 2 * expected_gap:
+            misses += 1
+
+    interval = next_interval(cadence, misses, views)
+    next_due = now + timedelta(seconds=interval)
+    if misses <= SYNC_BACKOFF_AFTER and last_observed is not None:
+        # Nothing newer can be published before the next expected observation
+        expected = last_observed + timedelta(seconds=cadence or SYNC_DEFAULT_INTERVAL)
+        next_due = min(max(next_due, expected), now + timedelta(seconds=SYNC_MAX_INTERVAL))
+
+    return {
+        "city_id": state["city_id"],
+        "last_observed_at": last_observed,
+        "last_checked_at": now,
+        "update_interval_sec": cadence,
+        "consecutive_misses": misses,
+        "next_due_at": next_due,
+    }
+
+def record_outcomes(outcomes, states, now):
+    # outcomes: (city_id, outcome, observed_at) for every city a sync touched
+    if not outcomes:
+        return 0, None
+    views, _ = analytics.get_city_view_counts(date.today() - timedelta(days=SYNC_DEMAND_DAYS))
+    planned = [
+        plan_city(states.get(city_id) or {"city_id": city_id}, outcome, observed, views.get(city_id, 0), now)
+        for city_id, outcome, observed in outcomes
+    ]
+    return sync_state.save_states(planned)
+
+def tick_budget(now):
+    # Cities this tick may hand out: its share of the hourly budget, less
+    # whatever the calls actually made in the last hour already used up,
+    # converted at the calls per city those runs cost
+    if SYNC_HOURLY_BUDGET <= 0:
+        return None
+    share = max(1, SYNC_HOURLY_BUDGET * SYNC_PLANNER_TICK // 3600)
+    (calls, synced), error = sync_logs.get_upstream_calls(sync_state.SCHEDULED_SOURCE, now - timedelta(hours=1))
+    if error:
+        return share
+    calls_per_city = calls / synced if calls and synced else 1.0
+    remaining = SYNC_HOURLY_BUDGET - calls
+    return max(0, min(share, int(remaining / calls_per_city)))
+
+def due_city_ids(now):
+    # Most overdue cities first; the rest stay due for the next tick
+    limit = tick_budget(now)
+    if limit == 0:
+        return [], None
+    return sync_state.get_due_city_ids(now, limit)
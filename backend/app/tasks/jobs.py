@@ -0,0 +1,266 @@
+import itertools
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from backend.app.repositories import sync_logs
+from backend.app.services import sync_planner, sources
+
+# Lower values run first, so manual requests jump ahead of a queued scheduled
+# run; a running scheduled run yields to them between cities
+PRIORITY_MANUAL = 0
+PRIORITY_SCHEDULED = 10
+
+# Minimum seconds between progress writes to sync_logs.details
+SYNC_PROGRESS_INTERVAL = float(os.getenv('SYNC_PROGRESS_INTERVAL', '2'))
+# In-progress sync_logs rows older than this are treated as abandoned when coalescing
+SYNC_STALE_AFTER = int(os.getenv('SYNC_STALE_AFTER', '3600'))
+
+# Sources besides AQICN queued on a fixed interval by the scheduler, e.g. "OPENAQ,FILE"
+SYNC_EXTRA_SOURCES = [name.strip().upper() for name in os.getenv('SYNC_EXTRA_SOURCES', '').split(',') if name.strip()]
+SYNC_EXTRA_INTERVAL = int(os.getenv('SYNC_EXTRA_INTERVAL', '3600'))
+
+class SyncJob:
+    def __init__(self, sync_id, sync_type, source, city_ids, priority, details):
+        self.sync_id = sync_id
+        self.sync_type = sync_type
+        self.source = source
+        self.city_ids = city_ids
+        self.priority = priority
+        self.details = details
+        self.state = 'queued'
+
+    def covers(self, source, city_ids):
+        if self.source != source:
+            return False
+        if self.city_ids is None:
+            return True
+        return city_ids is not None and set(city_ids) <= set(self.city_ids)
+
+    def describe(self, coalesced=False):
+        return {
+            "sync_id": self.sync_id,
+            "sync_type": self.sync_type,
+            "source": self.source,
+            "city_ids": self.city_ids,
+            "state": self.state,
+            "coalesced": coalesced,
+        }
+
+class SyncProgress:
+    # Collects per-city progress from a running sync and writes it to
+    # sync_logs.details at most once every `interval` seconds
+    def __init__(self, job, interval=None):
+        self.job = job
+        self.interval = SYNC_PROGRESS_INTERVAL if interval is None else interval
+        self._last_write = 0.0
+
+    def __call__(self, completed, total, fetched, failed):
+        self.job.details['progress'] = {
+            "completed": completed,
+            "total": total,
+            "fetched": fetched,
+            "failed": failed,
+        }
+        finished = total is not None and completed >= total
+        if finished or time.monotonic() - self._last_write >= self.interval:
+            self.flush()
+
+    def flush(self):
+        self.job.details['state'] = self.job.state
+        self._last_write = time.monotonic()
+        try:
+            sync_logs.update_sync_log(self.job.sync_id, details=self.job.details)
+        except Exception as e:
+            print(f"Warning: Failed to record progress for sync {self.job.sync_id}: {e}")
+
+class SyncJobRunner:
+    # Each source gets one background worker per process fed by its own
+    # priority queue, so different sources sync concurrently while runs of the
+    # same source never overlap. A request already covered by a queued or
+    # running job (same source, same or wider city set) is coalesced into that
+    # job instead of starting another run; the sync_logs check extends this to
+    # jobs owned by other workers.
+    def __init__(self, name='sync-runner'):
+        self.name = name
+        self._queues = {}
+        self._threads = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._active = {}
+        self.completed = 0
+        self.coalesced = 0
+
+    def submit(self, source='AQICN', city_ids=None, sync_type='manual', priority=None):
+        if source not in sources.SOURCES:
+            return None, "source_not_supported"
+        if priority is None:
+            priority = PRIORITY_MANUAL if sync_type == 'manual' else PRIORITY_SCHEDULED
+        city_ids = sorted(set(city_ids)) if city_ids else None
+
+        with self._lock:
+            for job in self._active.values():
+                if job.covers(source, city_ids) and (sync_type != 'manual' or job.sync_type == 'manual'):
+                    self.coalesced += 1
+                    return job.describe(coalesced=True), None
+
+            existing = self._find_elsewhere(source, city_ids, sync_type)
+            if existing:
+                self.coalesced += 1
+                return existing, None
+
+            details = {"city_ids": city_ids, "priority": priority, "state": 'queued', "progress": None}
+            sync_id, error = sync_logs.log_sync(
+                sync_type=sync_type,
+                data_source=source,
+                start_time=datetime.utcnow(),
+                status='in_progress',
+                details=details
+            )
+            if error:
+                return None, error
+
+            job = SyncJob(sync_id, sync_type, source, city_ids, priority, details)
+            self._active[sync_id] = job
+            self._queue_for(source).put((priority, next(self._seq), job))
+
+        self._ensure_thread(source)
+        return job.describe(), None
+
+    def _find_elsewhere(self, source, city_ids, sync_type):
+        # Scheduled runs also yield to in-progress manual runs, not just to
+        # other scheduled ones
+        types = ['manual'] if sync_type == 'manual' else ['manual', 'scheduled']
+        started_after = datetime.utcnow() - timedelta(seconds=SYNC_STALE_AFTER)
+        for kind in types:
+            rows, error = sync_logs.find_active_syncs(kind, source, started_after)
+            if error:
+                continue
+            for row in rows:
+                if row["id"] in self._active:
+                    continue
+                job = SyncJob(row["id"], kind, source, row["details"].get("city_ids"), None, row["details"])
+                job.state = row["details"].get("state") or 'running'
+                if job.covers(source, city_ids):
+                    return job.describe(coalesced=True)
+        return None
+
+    def _queue_for(self, source):
+        if source not in self._queues:
+            self._queues[source] = queue.PriorityQueue()
+        return self._queues[source]
+
+    def _ensure_thread(self, source):
+        with self._lock:
+            thread = self._threads.get(source)
+            if thread is not None and thread.is_alive():
+                return
+            thread = threading.Thread(
+                target=self._run, args=(self._queue_for(source),),
+                name=f"{self.name}-{source.lower()}", daemon=True
+            )
+            self._threads[source] = thread
+            thread.start()
+
+    def _run(self, jobs_queue):
+        while True:
+            _, _, job = jobs_queue.get()
+            self._execute(job)
+            jobs_queue.task_done()
+
+    def _higher_priority_waiting(self, job):
+        # Whether a job queued for the same source outranks `job`
+        jobs_queue = self._queue_for(job.source)
+        with jobs_queue.mutex:
+            return bool(jobs_queue.queue) and jobs_queue.queue[0][0] < job.priority
+
+    def _execute(self, job):
+        job.state = 'running'
+        # Queue time is not counted in the run's duration
+        sync_logs.update_sync_log(job.sync_id, start_time=datetime.utcnow())
+        progress = SyncProgress(job)
+        progress.flush()
+        remaining = None
+        try:
+            remaining = sources.sync_source(
+                job.source, job.sync_id, city_ids=job.city_ids, progress=progress,
+                should_yield=lambda: self._higher_priority_waiting(job)
+            )
+        except Exception as e:
+            sync_logs.update_sync_log(
+                job.sync_id,
+                end_time=datetime.utcnow(),
+                status='failed',
+                error_message=str(e)
+            )
+        finally:
+            job.state = 'finished'
+            progress.flush()
+            with self._lock:
+                self._active.pop(job.sync_id, None)
+                self.completed += 1
+
+        if remaining:
+            # The cities the yielded run did not reach go back in the queue
+            # behind the job it yielded to (or coalesce into it)
+            _, error = self.submit(job.source, remaining, sync_type=job.sync_type, priority=job.priority)
+            if error:
+                print(f"Warning: Failed to requeue sync {job.sync_id}: {error}")
+
+    def busy_city_ids(self, source='AQICN'):
+        # City ids already queued or running for `source`; None means all cities
+        busy = set()
+        with self._lock:
+            for job in self._active.values():
+                if job.source != source:
+                    continue
+                if job.city_ids is None:
+                    return None
+                busy.update(job.city_ids)
+        return busy
+
+    def wait(self):
+        with self._lock:
+            queues = list(self._queues.values())
+        for jobs_queue in queues:
+            jobs_queue.join()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active": [job.describe() for job in self._active.values()],
+                "completed": self.completed,
+                "coalesced": self.coalesced,
+            }
+
+_runner = SyncJobRunner()
+
+def submit_sync(source='AQICN', city_ids=None, sync_type='manual'):
+    return _runner.submit(source, city_ids, sync_type)
+
+def submit_scheduled_sync():
+    # Queues only the cities the planner reports as due, minus any already
+    # queued or running in this process
+    city_ids, error = sync_planner.due_city_ids(datetime.utcnow())
+    if error:
+        print(f"Warning: Failed to plan scheduled sync: {error}")
+        return
+    busy = _runner.busy_city_ids()
+    if busy is None:
+        return
+    city_ids = [city_id for city_id in city_ids if city_id not in busy]
+    if not city_ids:
+        return
+    _, error = _runner.submit(city_ids=city_ids, sync_type='scheduled')
+    if error:
+        print(f"Warning: Failed to queue scheduled sync: {error}")
+
+def submit_extra_syncs():
+    for source in SYNC_EXTRA_SOURCES:
+        _, error = _runner.submit(source, sync_type='scheduled')
+        if error:
+            print(f"Warning: Failed to queue scheduled {source} sync: {error}")
+
+def runner_stats():
+    return _runner.stats()
@@ -0,0 +1,103 @@
+import os
+import tempfile
+import threading
+import psycopg2
+from backend.app.extensions.db import database_url
+
+# 'advisory' uses a PostgreSQL session advisory lock, 'file' an OS file lock
+# (single host only). Either lock is released by the OS/DB when the owning
+# process dies, which lets another worker take over on its next check.
+SCHEDULER_LOCK = os.getenv('SCHEDULER_LOCK', 'advisory')
+SCHEDULER_LOCK_KEY = int(os.getenv('SCHEDULER_LOCK_KEY', '50031001'))
+SCHEDULER_LOCK_FILE = os.getenv('SCHEDULER_LOCK_FILE') or os.path.join(tempfile.gettempdir(), 'aqi_scheduler.lock')
+
+class AdvisoryLockLeader:
+    def __init__(self, dsn, key):
+        self.dsn = dsn
+        self.key = key
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def is_leader(self):
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    cur = self._conn.cursor()
+                    cur.execute("SELECT 1")
+                    cur.fetchone()
+                    return True
+                except Exception:
+                    self._close()
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.autocommit = True
+                cur = conn.cursor()
+                cur.execute("SELECT pg_try_advisory_lock(%s)", (self.key,))
+                if cur.fetchone()[0]:
+                    self._conn = conn
+                    return True
+                conn.close()
+            except Exception:
+                pass
+            return False
+
+    def release(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+class FileLockLeader:
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._lock = threading.Lock()
+
+    def is_leader(self):
+        with self._lock:
+            if self._fd is not None:
+                return True
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                _try_lock_fd(fd)
+            except OSError:
+                os.close(fd)
+                return False
+            os.ftruncate(fd, 0)
+            os.write(fd, str(os.getpid()).encode('ascii'))
+            self._fd = fd
+            return True
+
+    def release(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+def _try_lock_fd(fd):
+    try:
+        import fcntl
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except ImportError:
+        import msvcrt
+        msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+
+_leader = None
+
+def get_leader():
+    global _leader
+    if _leader is None:
+        if SCHEDULER_LOCK == 'file':
+            _leader = FileLockLeader(SCHEDULER_LOCK_FILE)
+        else:
+            _leader = AdvisoryLockLeader(database_url(), SCHEDULER_LOCK_KEY)
+    return _leader
+
+def is_leader():
+    return get_leader().is_leader()
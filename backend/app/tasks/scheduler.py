@@ -1,10 +1,40 @@
 import os
 from datetime import datetime
+from functools import wraps
 from apscheduler.schedulers.background import BackgroundScheduler
-from backend.app.services.aqicn import sync_air_quality_data
+from backend.app.repositories import partitions
+from backend.app.services import sync_planner
+from backend.app.tasks import leader, jobs
+
+# How often every worker re-checks (or tries to take over) scheduler leadership
+LEADER_CHECK_INTERVAL = int(os.getenv('LEADER_CHECK_INTERVAL', '30'))
+
+# Monthly air_quality_data partitions kept ready ahead of the current month
+AQ_PARTITIONS_AHEAD = int(os.getenv('AQ_PARTITIONS_AHEAD', '3'))
+# Months of raw readings to keep; 0 keeps everything
+AQ_RETENTION_MONTHS = int(os.getenv('AQ_RETENTION_MONTHS', '0'))
+# 'drop' removes expired partitions, 'detach' leaves them as standalone tables
+AQ_RETENTION_MODE = os.getenv('AQ_RETENTION_MODE', 'drop')
 
 scheduler = None
 
+def leader_only(func):
+    # Every Gunicorn worker runs a scheduler, but only the process holding the
+    # leader lock executes the jobs
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not leader.is_leader():
+            return None
+        return func(*args, **kwargs)
+    return wrapper
+
+def maintain_partitions():
+    _, error = partitions.ensure_partitions(AQ_PARTITIONS_AHEAD)
+    if error:
+        print(f"Warning: Partition maintenance failed: {error}")
+        return
+    partitions.apply_retention(AQ_RETENTION_MONTHS, drop=AQ_RETENTION_MODE != 'detach')
+
 def init_scheduler():
     global scheduler
     
@@ -14,11 +44,42 @@ def init_scheduler():
     scheduler = BackgroundScheduler()
     
     scheduler.add_job(
-        func=sync_air_quality_data,
+        func=leader_only(jobs.submit_scheduled_sync),
         trigger='interval',
-        hours=1,
+        seconds=sync_planner.SYNC_PLANNER_TICK,
+        next_run_time=datetime.now(),
         id='sync_air_quality',
-        name='Sync air quality data from AQICN',
+        name='Sync cities that are due from AQICN',
+        replace_existing=True
+    )
+    
+    if jobs.SYNC_EXTRA_SOURCES:
+        scheduler.add_job(
+            func=leader_only(jobs.submit_extra_syncs),
+            trigger='interval',
+            seconds=jobs.SYNC_EXTRA_INTERVAL,
+            id='sync_extra_sources',
+            name='Sync additional air quality sources',
+            replace_existing=True
+        )
+    
+    scheduler.add_job(
+        func=leader_only(maintain_partitions),
+        trigger='interval',
+        hours=24,
+        next_run_time=datetime.now(),
+        id='maintain_partitions',
+        name='Create upcoming air_quality_data partitions and apply retention',
+        replace_existing=True
+    )
+    
+    scheduler.add_job(
+        func=leader.is_leader,
+        trigger='interval',
+        seconds=LEADER_CHECK_INTERVAL,
+        next_run_time=datetime.now(),
+        id='leader_election',
+        name='Claim or keep scheduler leadership',
         replace_existing=True
     )
     
@@ -30,6 +91,7 @@ def stop_scheduler():
     if scheduler is not None and scheduler.running:
         scheduler.shutdown()
         scheduler = None
+        leader.get_leader().release()
 
 def get_scheduler():
     return scheduler
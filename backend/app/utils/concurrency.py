@@ -0,0 +1,25 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+
+def map_with_deadline(items, func, concurrency, deadline_at, timeout_result, thread_name_prefix='fetch'):
+    # Runs func(item, deadline_at) -> (data, error) on a bounded pool and yields
+    # (item, data, error) as calls complete. Items still outstanding when the
+    # monotonic deadline passes are yielded with `timeout_result` as the error.
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix=thread_name_prefix)
+    futures = {executor.submit(func, item, deadline_at): item for item in items}
+    pending = set(futures)
+    try:
+        for future in as_completed(futures, timeout=max(0.0, deadline_at - time.monotonic())):
+            pending.discard(future)
+            try:
+                data, error = future.result()
+            except Exception as e:
+                data, error = None, str(e) or type(e).__name__
+            yield futures[future], data, error
+    except FuturesTimeoutError:
+        pass
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    for future in pending:
+        yield futures[future], None, timeout_result
@@ -0,0 +1,113 @@
+import heapq
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def km_to_degrees(km, lat=0.0):
+    # (lat_degrees, lon_degrees) spanned by `km` around latitude `lat`
+    lat_deg = km / 111.32
+    lon_deg = lat_deg / max(0.01, math.cos(math.radians(min(89.0, abs(lat)))))
+    return lat_deg, lon_deg
+
+def tile_key(lat, lon, size):
+    return (math.floor(lat / size), math.floor(lon / size))
+
+def tile_bounds(key, size, pad_km=0.0):
+    # (south, west, north, east) of a tile, grown by `pad_km` on each side
+    south = key[0] * size
+    west = key[1] * size
+    pad_lat, pad_lon = km_to_degrees(pad_km, max(abs(south), abs(south + size)))
+    return (max(-90.0, south - pad_lat), max(-180.0, west - pad_lon),
+            min(90.0, south + size + pad_lat), min(180.0, west + size + pad_lon))
+
+def nearest(lat, lon, points, max_km=None):
+    # points: iterable of (lat, lon, item); returns (item, distance_km) or (None, None)
+    best, best_km = None, None
+    for p_lat, p_lon, item in points:
+        km = haversine_km(lat, lon, p_lat, p_lon)
+        if (max_km is None or km <= max_km) and (best_km is None or km < best_km):
+            best, best_km = item, km
+    return best, best_km
+
+def to_unit_vector(lat, lon):
+    phi = math.radians(lat)
+    lam = math.radians(lon)
+    return (math.cos(phi) * math.cos(lam), math.cos(phi) * math.sin(lam), math.sin(phi))
+
+def km_to_chord(km):
+    # Straight-line distance through the unit sphere for a surface distance
+    return 2 * math.sin(min(math.pi, km / EARTH_RADIUS_KM) / 2)
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+class KdTree:
+    # Static 3-d tree over points on the unit sphere. Chord length grows with
+    # great-circle distance, so nearest-by-chord is nearest on the globe with
+    # no special cases at the poles or the antimeridian.
+    def __init__(self, points):
+        # points: iterable of (lat, lon, item)
+        self.items = []
+        self.coords = []
+        for lat, lon, item in points:
+            self.items.append(item)
+            self.coords.append(to_unit_vector(lat, lon))
+        # Nodes are (index, axis, left, right); children are node tuples or None
+        self.root = self._build(list(range(len(self.items))), 0)
+
+    def __len__(self):
+        return len(self.items)
+
+    def _build(self, indexes, depth):
+        if not indexes:
+            return None
+        axis = depth % 3
+        indexes.sort(key=lambda i: self.coords[i][axis])
+        mid = len(indexes) // 2
+        return (indexes[mid], axis,
+                self._build(indexes[:mid], depth + 1),
+                self._build(indexes[mid + 1:], depth + 1))
+
+    def query(self, lat, lon, k=1, max_km=None):
+        # [(item, distance_km)] of the k nearest points, closest first;
+        # `max_km` drops points further away (k=None returns all within it)
+        if self.root is None or k == 0:
+            return []
+        target = to_unit_vector(lat, lon)
+        limit = km_to_chord(max_km) ** 2 if max_km is not None else math.inf
+        # Max-heap of the best candidates so far as (-squared_chord, index)
+        best = []
+        # Stack of (node, squared distance to the plane that led to it)
+        stack = [(self.root, 0.0)]
+        while stack:
+            node, plane_d2 = stack.pop()
+            full = k is not None and len(best) >= k
+            if plane_d2 > (min(limit, -best[0][0]) if full else limit):
+                continue
+            index, axis, left, right = node
+            point = self.coords[index]
+            d2 = ((point[0] - target[0]) ** 2 + (point[1] - target[1]) ** 2
+                  + (point[2] - target[2]) ** 2)
+            if d2 <= limit:
+                if not full:
+                    heapq.heappush(best, (-d2, index))
+                elif d2 < -best[0][0]:
+                    heapq.heapreplace(best, (-d2, index))
+            diff = target[axis] - point[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            # Near side is popped first; the far side is checked against the
+            # bound again when popped, once the near side has tightened it
+            if far is not None:
+                stack.append((far, diff * diff))
+            if near is not None:
+                stack.append((near, 0.0))
+        return [(self.items[index], chord_to_km(math.sqrt(-neg_d2)))
+                for neg_d2, index in sorted(best, reverse=True)]
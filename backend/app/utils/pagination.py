@@ -0,0 +1,22 @@
+import base64
+import json
+
+def encode_cursor(*values):
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(token, size):
+    # Raises ValueError for anything that is not a cursor produced by encode_cursor
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError('invalid_cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('invalid_cursor')
+    return values
+
+def parse_bool(value):
+    return str(value).lower() in ('1', 'true', 'yes')
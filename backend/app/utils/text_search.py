@@ -0,0 +1,75 @@
+import bisect
+from collections import Counter
+
+def normalize(text):
+    # Case-insensitive and whitespace-insensitive, so "new york" finds "NewYork"
+    return ''.join(str(text or '').casefold().split())
+
+def trigrams(text):
+    # Padded like pg_trgm, so short words (two-character city names) and
+    # word starts still produce trigrams
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class TextIndex:
+    # In-process fuzzy matcher: a sorted key array answers prefix lookups by
+    # binary search, and an inverted trigram index answers typo-tolerant
+    # lookups with pg_trgm-style similarity (shared / union of trigrams).
+    def __init__(self, entries):
+        # entries: iterable of (item, text, weight)
+        self._entries = []        # (item, text, weight, trigram count)
+        self._by_trigram = {}     # trigram -> [entry index]
+        for item, text, weight in entries:
+            text = normalize(text)
+            if not text:
+                continue
+            index = len(self._entries)
+            grams = trigrams(text)
+            self._entries.append((item, text, weight, len(grams)))
+            for gram in grams:
+                self._by_trigram.setdefault(gram, []).append(index)
+        self._keys = sorted((entry[1], index) for index, entry in enumerate(self._entries))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def search(self, query, threshold=0.3):
+        # {item: score in 0..1}; a prefix match scores 0.6..1 by how much of
+        # the text it covers, other matches score their trigram similarity
+        # (capped so a typo never outranks a prefix match)
+        query = normalize(query)
+        if not query:
+            return {}
+        scores = {}
+
+        def keep(index, score):
+            item, _, weight, _ = self._entries[index]
+            score *= weight
+            if score > scores.get(item, 0.0):
+                scores[item] = score
+
+        keys = self._keys
+        position = bisect.bisect_left(keys, (query,))
+        while position < len(keys) and keys[position][0].startswith(query):
+            text, index = keys[position]
+            keep(index, 1.0 if text == query else 0.6 + 0.4 * len(query) / len(text))
+            position += 1
+
+        if len(query) < 3:
+            # Every trigram of a shorter query anchors at the start of the
+            # text, so the prefix matches above already cover it
+            return scores
+        grams = trigrams(query)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._by_trigram.get(gram, ()))
+        # similarity >= threshold needs at least this many shared trigrams
+        # whatever the text's length, which rules out most candidates cheaply
+        min_shared = threshold * len(grams)
+        for index, count in shared.items():
+            if count < min_shared:
+                continue
+            similarity = count / (len(grams) + self._entries[index][3] - count)
+            if similarity >= threshold:
+                keep(index, min(similarity, 0.6))
+        return scores
@@ -0,0 +1,77 @@
+-- 空气质量日/月汇总表（由同步与批量导入增量维护，可通过 import_data.py --rebuild-rollups 重建）
+CREATE TABLE IF NOT EXISTS air_quality_daily (
+    city_id INT NOT NULL REFERENCES cities(id) ON DELETE CASCADE,
+    bucket DATE NOT NULL,
+    reading_count INT NOT NULL DEFAULT 0,
+    good_count INT NOT NULL DEFAULT 0,
+    aqi_count INT NOT NULL DEFAULT 0,
+    aqi_sum DECIMAL(16, 2),
+    aqi_min INT,
+    aqi_max INT,
+    pm25_count INT NOT NULL DEFAULT 0,
+    pm25_sum DECIMAL(16, 2),
+    pm25_min DECIMAL(8, 2),
+    pm25_max DECIMAL(8, 2),
+    pm10_count INT NOT NULL DEFAULT 0,
+    pm10_sum DECIMAL(16, 2),
+    pm10_min DECIMAL(8, 2),
+    pm10_max DECIMAL(8, 2),
+    o3_count INT NOT NULL DEFAULT 0,
+    o3_sum DECIMAL(16, 2),
+    o3_min DECIMAL(8, 2),
+    o3_max DECIMAL(8, 2),
+    no2_count INT NOT NULL DEFAULT 0,
+    no2_sum DECIMAL(16, 2),
+    no2_min DECIMAL(8, 2),
+    no2_max DECIMAL(8, 2),
+    so2_count INT NOT NULL DEFAULT 0,
+    so2_sum DECIMAL(16, 2),
+    so2_min DECIMAL(8, 2),
+    so2_max DECIMAL(8, 2),
+    co_count INT NOT NULL DEFAULT 0,
+    co_sum DECIMAL(16, 2),
+    co_min DECIMAL(8, 2),
+    co_max DECIMAL(8, 2),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (city_id, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS air_quality_monthly (
+    city_id INT NOT NULL REFERENCES cities(id) ON DELETE CASCADE,
+    bucket DATE NOT NULL,
+    reading_count INT NOT NULL DEFAULT 0,
+    good_count INT NOT NULL DEFAULT 0,
+    aqi_count INT NOT NULL DEFAULT 0,
+    aqi_sum DECIMAL(16, 2),
+    aqi_min INT,
+    aqi_max INT,
+    pm25_count INT NOT NULL DEFAULT 0,
+    pm25_sum DECIMAL(16, 2),
+    pm25_min DECIMAL(8, 2),
+    pm25_max DECIMAL(8, 2),
+    pm10_count INT NOT NULL DEFAULT 0,
+    pm10_sum DECIMAL(16, 2),
+    pm10_min DECIMAL(8, 2),
+    pm10_max DECIMAL(8, 2),
+    o3_count INT NOT NULL DEFAULT 0,
+    o3_sum DECIMAL(16, 2),
+    o3_min DECIMAL(8, 2),
+    o3_max DECIMAL(8, 2),
+    no2_count INT NOT NULL DEFAULT 0,
+    no2_sum DECIMAL(16, 2),
+    no2_min DECIMAL(8, 2),
+    no2_max DECIMAL(8, 2),
+    so2_count INT NOT NULL DEFAULT 0,
+    so2_sum DECIMAL(16, 2),
+    so2_min DECIMAL(8, 2),
+    so2_max DECIMAL(8, 2),
+    co_count INT NOT NULL DEFAULT 0,
+    co_sum DECIMAL(16, 2),
+    co_min DECIMAL(8, 2),
+    co_max DECIMAL(8, 2),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (city_id, bucket)
+);
+
+CREATE INDEX IF NOT EXISTS idx_air_quality_daily_bucket ON air_quality_daily(bucket DESC);
+CREATE INDEX IF NOT EXISTS idx_air_quality_monthly_bucket ON air_quality_monthly(bucket DESC);
@@ -0,0 +1,98 @@
+-- 空气质量数据表按月分区（recorded_time 范围分区）
+-- 在已有 003 表结构上执行：迁移现有数据，并创建分区维护函数
+BEGIN;
+
+-- 创建（或补齐）某个月的分区；默认分区中落在该月的数据会被搬入新分区
+CREATE OR REPLACE FUNCTION ensure_air_quality_partition(p_month DATE)
+RETURNS TEXT AS $$
+DECLARE
+    v_start DATE := DATE_TRUNC('month', p_month)::date;
+    v_end DATE := (DATE_TRUNC('month', p_month) + INTERVAL '1 month')::date;
+    v_name TEXT := 'air_quality_data_p' || TO_CHAR(p_month, 'YYYYMM');
+BEGIN
+    IF to_regclass(v_name) IS NOT NULL THEN
+        RETURN v_name;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I (LIKE air_quality_data INCLUDING DEFAULTS)', v_name);
+
+    IF to_regclass('air_quality_data_default') IS NOT NULL THEN
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM air_quality_data_default
+                            WHERE recorded_time >= %L AND recorded_time < %L RETURNING *)
+             INSERT INTO %I SELECT * FROM moved',
+            v_start, v_end, v_name
+        );
+    END IF;
+
+    EXECUTE format(
+        'ALTER TABLE air_quality_data ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        v_name, v_start, v_end
+    );
+    RETURN v_name;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    v_month DATE;
+    v_last DATE;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'air_quality_data'::regclass) = 'p' THEN
+        RAISE NOTICE 'air_quality_data is already partitioned';
+        RETURN;
+    END IF;
+
+    ALTER TABLE air_quality_data RENAME TO air_quality_data_legacy;
+    ALTER INDEX IF EXISTS idx_air_quality_city_time RENAME TO idx_air_quality_legacy_city_time;
+    ALTER INDEX IF EXISTS idx_air_quality_time RENAME TO idx_air_quality_legacy_time;
+
+    CREATE TABLE air_quality_data (
+        id INT NOT NULL DEFAULT nextval('air_quality_data_id_seq'),
+        city_id INT NOT NULL REFERENCES cities(id) ON DELETE CASCADE,
+        recorded_time TIMESTAMP NOT NULL,
+        aqi INT,
+        aqi_level VARCHAR(32),
+        dominant_pol VARCHAR(16),
+        pm25 DECIMAL(8, 2),
+        pm10 DECIMAL(8, 2),
+        o3 DECIMAL(8, 2),
+        no2 DECIMAL(8, 2),
+        so2 DECIMAL(8, 2),
+        co DECIMAL(8, 2),
+        source VARCHAR(32),
+        attribution TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (id, recorded_time),
+        UNIQUE (city_id, recorded_time)
+    ) PARTITION BY RANGE (recorded_time);
+
+    ALTER SEQUENCE air_quality_data_id_seq OWNED BY air_quality_data.id;
+
+    CREATE INDEX idx_air_quality_city_time ON air_quality_data(city_id, recorded_time DESC);
+    CREATE INDEX idx_air_quality_time ON air_quality_data(recorded_time DESC);
+
+    -- 捕获超出已建分区范围的数据，避免写入失败
+    CREATE TABLE air_quality_data_default PARTITION OF air_quality_data DEFAULT;
+
+    -- 为历史数据所在月份及未来 3 个月建立分区
+    SELECT DATE_TRUNC('month', COALESCE(MIN(recorded_time), NOW()))::date INTO v_month
+    FROM air_quality_data_legacy;
+    v_last := (DATE_TRUNC('month', NOW()) + INTERVAL '3 months')::date;
+    WHILE v_month <= v_last LOOP
+        PERFORM ensure_air_quality_partition(v_month);
+        v_month := (v_month + INTERVAL '1 month')::date;
+    END LOOP;
+
+    INSERT INTO air_quality_data
+        (id, city_id, recorded_time, aqi, aqi_level, dominant_pol, pm25, pm10, o3, no2, so2, co,
+         source, attribution, created_at)
+    SELECT id, city_id, recorded_time, aqi, aqi_level, dominant_pol, pm25, pm10, o3, no2, so2, co,
+           source, attribution, created_at
+    FROM air_quality_data_legacy;
+
+    DROP TABLE air_quality_data_legacy;
+END;
+$$;
+
+COMMIT;
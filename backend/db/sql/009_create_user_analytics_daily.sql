@@ -0,0 +1,17 @@
+-- 用户访问日汇总表（由分析事件写入时增量维护，可通过 import_data.py --rebuild-usage 重建）
+CREATE TABLE IF NOT EXISTS user_analytics_daily_counts (
+    action_date DATE NOT NULL,
+    action_type VARCHAR(32) NOT NULL,
+    city_id INT NOT NULL DEFAULT 0,
+    event_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (action_date, action_type, city_id)
+);
+
+-- 每日活跃用户 HyperLogLog 草图
+CREATE TABLE IF NOT EXISTS user_analytics_daily_users (
+    action_date DATE PRIMARY KEY,
+    user_sketch BYTEA NOT NULL,
+    dau_estimate INT NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_analytics_daily_counts_city ON user_analytics_daily_counts(city_id, action_date);
@@ -0,0 +1,10 @@
+-- 城市同步水位表：记录每个城市上游站点最近一次观测时间，未变化的城市在同步时跳过写入
+CREATE TABLE IF NOT EXISTS city_sync_state (
+    city_id INT PRIMARY KEY REFERENCES cities(id) ON DELETE CASCADE,
+    last_observed_at TIMESTAMP,
+    last_checked_at TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 同步日志增加“未变化”计数
+ALTER TABLE sync_logs ADD COLUMN IF NOT EXISTS unchanged_count INT DEFAULT 0;
@@ -0,0 +1,6 @@
+-- 按城市自适应同步调度：记录上游更新周期估计、连续未更新次数与下次到期时间
+ALTER TABLE city_sync_state ADD COLUMN IF NOT EXISTS update_interval_sec DOUBLE PRECISION;
+ALTER TABLE city_sync_state ADD COLUMN IF NOT EXISTS consecutive_misses INT NOT NULL DEFAULT 0;
+ALTER TABLE city_sync_state ADD COLUMN IF NOT EXISTS next_due_at TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS idx_city_sync_state_next_due ON city_sync_state(next_due_at);
@@ -0,0 +1,5 @@
+-- 城市名称模糊搜索：pg_trgm GIN 索引支持 LOWER(name) LIKE '%q%' 与相似度查询，避免逐键输入时全表扫描
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_cities_name_trgm ON cities USING GIN (LOWER(name) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_cities_province_trgm ON cities USING GIN (LOWER(province) gin_trgm_ops);
@@ -0,0 +1,5 @@
+-- 异常数据标记：由异常检测（滚动 z-score + MAD）标记可疑读数，汇总表与统计查询排除这些行
+ALTER TABLE air_quality_data ADD COLUMN IF NOT EXISTS is_suspect BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE air_quality_data ADD COLUMN IF NOT EXISTS suspect_reason VARCHAR(64);
+
+CREATE INDEX IF NOT EXISTS idx_air_quality_suspect ON air_quality_data(city_id, recorded_time) WHERE is_suspect;
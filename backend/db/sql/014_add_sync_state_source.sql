@@ -0,0 +1,4 @@
+-- 同步水位按数据源区分：每个数据源只用自己的最近观测时间判断“未变化”，避免其他数据源的读数推进水位导致跳过与误退避
+ALTER TABLE city_sync_state ADD COLUMN IF NOT EXISTS source VARCHAR(32) NOT NULL DEFAULT 'AQICN';
+ALTER TABLE city_sync_state DROP CONSTRAINT IF EXISTS city_sync_state_pkey;
+ALTER TABLE city_sync_state ADD CONSTRAINT city_sync_state_pkey PRIMARY KEY (source, city_id);
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+按地理范围批量抓取压测脚本
+在本地模拟 AQICN 服务器上比较逐城市 feed 模式与 map-bounds 分块模式的请求次数和耗时
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.scripts.fake_aqicn import FakeAqicnServer
+from backend.app.services import aqicn
+
+def make_cities(count, coverage, seed):
+    # 城市随机分布在中国东部范围内；按 coverage 比例在城市附近放置站点
+    rng = random.Random(seed)
+    city_list = []
+    stations = []
+    for i in range(count):
+        lat = rng.uniform(22.0, 42.0)
+        lon = rng.uniform(104.0, 122.0)
+        city_list.append({'id': i, 'name': f'City{i}', 'province': None, 'lat': lat, 'lon': lon})
+        if rng.random() < coverage:
+            stations.append((lat + rng.uniform(-0.05, 0.05), lon + rng.uniform(-0.05, 0.05)))
+    return city_list, stations
+
+def run_mode(server, mode, city_list):
+    aqicn.AQICN_SYNC_MODE = mode
+    server.reset()
+    fetch = aqicn.fetch_cities_by_bounds if mode == 'bounds' else aqicn.fetch_cities_air_quality
+    started = time.perf_counter()
+    ok_count = sum(1 for _, data, _ in fetch(city_list) if data)
+    elapsed = time.perf_counter() - started
+    print(f"mode={mode:6}  elapsed={elapsed:6.2f}s  ok={ok_count}/{len(city_list)}  "
+          f"requests={server.request_count}")
+    return server.request_count
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare per-city feed sync with map-bounds tiles against a local fake server')
+    parser.add_argument('--cities', type=int, default=300, help='Number of fake cities')
+    parser.add_argument('--coverage', type=float, default=0.9, help='Share of cities with a station nearby')
+    parser.add_argument('--latency', type=float, default=0.05, help='Fake upstream latency in seconds')
+    parser.add_argument('--tile-size', type=float, default=aqicn.AQICN_TILE_SIZE, help='Tile edge in degrees')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    city_list, stations = make_cities(args.cities, args.coverage, args.seed)
+    server = FakeAqicnServer(latency=args.latency, stations=stations).start()
+    aqicn.AQICN_BASE_URL = server.base_url
+    aqicn.AQICN_RATE_LIMIT = 0
+    aqicn.AQICN_TILE_SIZE = args.tile_size
+    aqicn.reset_clients()
+
+    print(f"cities={args.cities} stations={len(stations)} latency={args.latency:.2f}s tile={args.tile_size}°")
+    print("-" * 60)
+    try:
+        feed_calls = run_mode(server, 'feed', city_list)
+        bounds_calls = run_mode(server, 'bounds', city_list)
+        if bounds_calls:
+            print(f"upstream calls reduced {feed_calls / bounds_calls:.1f}x")
+    finally:
+        server.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+城市搜索逐键延迟压测脚本
+模拟用户逐字输入城市名，统计进程内三元组/前缀索引每次按键的查询延迟；
+加 --database 时同时测量数据库 LIKE 查询（/data/cities?q=）的延迟作为对比
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.app.services.city_index import CityCatalog
+
+SYLLABLES = ['bei', 'jing', 'shang', 'hai', 'guang', 'zhou', 'shen', 'chuan', 'nan', 'xi',
+             'an', 'cheng', 'du', 'wu', 'han', 'hang', 'su', 'tian', 'jin', 'chong', 'qing',
+             'he', 'fei', 'ji', 'lin', 'chang', 'sha', 'kun', 'ming', 'lan', 'ning', 'tai']
+HANZI = '北京上海广州深圳南西安成都武汉杭苏天津重庆合肥吉林长沙昆明兰宁太原'
+
+def make_cities(count, seed):
+    rng = random.Random(seed)
+    provinces = [''.join(rng.choice(HANZI) for _ in range(2)) + '省' for _ in range(30)]
+    city_list = []
+    for i in range(count):
+        if rng.random() < 0.5:
+            name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+        else:
+            name = ''.join(rng.choice(HANZI) for _ in range(rng.randint(2, 3))) + '市'
+        city_list.append({'id': i + 1, 'name': f'{name}{i}', 'province': rng.choice(provinces),
+                          'lat': None, 'lon': None})
+    views = {rng.randint(1, count): rng.randint(1, 5000) for _ in range(count // 5)}
+    return city_list, views
+
+def keystrokes(city_list, typed, seed):
+    # 每个被输入的城市名依次产生 1..len 个前缀，其中一部分带一个错别字
+    rng = random.Random(seed)
+    queries = []
+    for city in rng.sample(city_list, min(typed, len(city_list))):
+        name = city['name']
+        if rng.random() < 0.2 and len(name) > 4:
+            pos = rng.randrange(1, len(name) - 1)
+            name = name[:pos] + name[pos + 1:]
+        queries.extend(name[:n] for n in range(1, len(name) + 1))
+    return queries
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+def report(label, samples):
+    ms = [s * 1000 for s in samples]
+    print(f"{label:10}  keystrokes={len(ms):6}  p50={percentile(ms, 0.5):7.3f}ms  "
+          f"p95={percentile(ms, 0.95):7.3f}ms  max={max(ms):7.3f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-keystroke latency of the in-process city search')
+    parser.add_argument('--cities', type=int, default=5000, help='Number of fake cities')
+    parser.add_argument('--typed', type=int, default=300, help='Number of city names typed')
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--database', action='store_true',
+                        help='Also time the LIKE query on DATABASE_URL with the same keystrokes')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    city_list, views = make_cities(args.cities, args.seed)
+    started = time.perf_counter()
+    catalog = CityCatalog(city_list, views)
+    print(f"cities={args.cities} index build={time.perf_counter() - started:.3f}s")
+    print("-" * 72)
+
+    queries = keystrokes(city_list, args.typed, args.seed)
+    samples = []
+    for q in queries:
+        started = time.perf_counter()
+        catalog.search(q, args.limit)
+        samples.append(time.perf_counter() - started)
+    report('in-memory', samples)
+
+    if args.database:
+        from backend.app.extensions import db
+        from backend.app.repositories import cities
+        db.init_db()
+        db_cities, _ = cities.get_city_catalog()
+        samples = []
+        for q in keystrokes(db_cities, args.typed, args.seed):
+            started = time.perf_counter()
+            cities.get_all_cities(q, None, 1, args.limit)
+            samples.append(time.perf_counter() - started)
+        if samples:
+            report('database', samples)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+预测模型训练与查询压测脚本
+对 DATABASE_URL 中的所有城市按不同进程数完整训练预测模型，统计耗时与吞吐；
+再测量无新数据时的增量更新耗时、/data/forecast 从缓存取预测的延迟，
+并汇总滚动回测中岭回归与季节性朴素预测的平均绝对误差
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import numpy as np
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+def main():
+    parser = argparse.ArgumentParser(description='Forecast training throughput and lookup latency')
+    parser.add_argument('--workers', default=f"1,{os.cpu_count() or 1}",
+                        help='Comma-separated worker counts to time a full retrain with')
+    parser.add_argument('--batch-cities', type=int, default=None,
+                        help='Cities per task (default FORECAST_BATCH_CITIES)')
+    parser.add_argument('--lookups', type=int, default=2000)
+    args = parser.parse_args()
+
+    from backend.app.extensions.db import init_db
+    from backend.app.repositories import cities
+    from backend.app.services import data_cache, forecast
+    init_db()
+    if args.batch_cities:
+        forecast.FORECAST_BATCH_CITIES = args.batch_cities
+
+    items, error = cities.get_city_catalog()
+    if error:
+        print(f"✗ {error}")
+        return 1
+    city_ids = [city['id'] for city in items]
+    print(f"cities={len(city_ids)} batch={forecast.FORECAST_BATCH_CITIES} train_days={forecast.FORECAST_TRAIN_DAYS}")
+    print("-" * 72)
+
+    for workers in sorted({int(w) for w in args.workers.split(',') if w.strip()}):
+        stats, error = forecast.train(city_ids, full=True, workers=workers)
+        if error:
+            print(f"✗ {error}")
+            return 1
+        print(f"full    workers={stats['workers']:2}  {stats['seconds']:7.2f}s  "
+              f"{stats['cities'] / stats['seconds']:8.1f} cities/s  forecasts={stats['forecasts']}")
+
+    stats, error = forecast.train(city_ids)
+    print(f"update  workers= 1  {stats['seconds']:7.2f}s  (no new readings)")
+
+    models = data_cache.get_forecast_models(city_ids)
+    evaluated = [m for m in models.values() if m and m['evaluated'] > 0]
+    if evaluated:
+        ridge = np.mean([np.array(m['err']) / m['evaluated'] for m in evaluated], axis=0)
+        naive = np.mean([np.array(m['naive_err']) / m['evaluated'] for m in evaluated], axis=0)
+        served = np.mean([m['mae'] for m in evaluated], axis=0)
+        chosen = np.sum([[method == 'ridge' for method in m['methods']] for m in evaluated], axis=0)
+        print("-" * 72)
+        print(f"backtest over {len(evaluated)} cities, mean absolute error in AQI:")
+        for hour in (1, 3, 6, 12, 24):
+            print(f"  +{hour:2}h  ridge={ridge[hour - 1]:6.2f}  seasonal naive={naive[hour - 1]:6.2f}  "
+                  f"served={served[hour - 1]:6.2f}  (ridge in {chosen[hour - 1]} cities)")
+
+    samples = []
+    for _ in range(args.lookups):
+        city_id = random.choice(city_ids)
+        started = time.perf_counter()
+        forecast.get_forecast(city_id)
+        samples.append((time.perf_counter() - started) * 1000)
+    print("-" * 72)
+    print(f"lookup  n={len(samples)}  p50={percentile(samples, 0.5):.3f}ms  "
+          f"p95={percentile(samples, 0.95):.3f}ms  max={max(samples):.3f}ms")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+同步并发压测脚本
+启动本地模拟 AQICN 服务器，比较不同并发度下抓取全部城市的耗时
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.scripts.fake_aqicn import FakeAqicnServer
+from backend.app.services import aqicn
+
+def run(city_count, latency, levels, failure_rate=0.0):
+    server = FakeAqicnServer(latency=latency, failure_rate=failure_rate).start()
+    aqicn.AQICN_BASE_URL = server.base_url
+    aqicn.AQICN_RATE_LIMIT = 0
+    aqicn.reset_clients()
+    
+    city_list = [{'id': i, 'name': f'City{i}', 'province': None} for i in range(city_count)]
+    
+    print(f"cities={city_count} latency={latency:.2f}s")
+    print("-" * 60)
+    try:
+        for concurrency in levels:
+            server.reset()
+            started = time.perf_counter()
+            ok_count = sum(
+                1 for _, data, _ in aqicn.fetch_cities_air_quality(city_list, concurrency=concurrency)
+                if data
+            )
+            elapsed = time.perf_counter() - started
+            print(f"concurrency={concurrency:3}  elapsed={elapsed:6.2f}s  "
+                  f"ok={ok_count}/{city_count}  requests={server.request_count}  "
+                  f"connections={server.connection_count}")
+    finally:
+        server.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark concurrent AQICN fetching against a local fake server')
+    parser.add_argument('--cities', type=int, default=100, help='Number of fake cities')
+    parser.add_argument('--latency', type=float, default=0.1, help='Fake upstream latency in seconds')
+    parser.add_argument('--levels', default='1,4,8,16', help='Comma separated concurrency levels')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of fake responses answered with 503')
+    args = parser.parse_args()
+    
+    levels = [int(x) for x in args.levels.split(',') if x.strip()]
+    run(args.cities, args.latency, levels, args.failure_rate)
+
+if __name__ == '__main__':
+    main()
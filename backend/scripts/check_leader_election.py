@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+调度器选主检查脚本
+启动多个进程模拟 Gunicorn worker，各自运行调度器；检查每个周期只有一个进程执行任务，
+并在杀掉 leader 后确认由其他进程接管
+"""
+
+import os
+import sys
+import time
+import signal
+import argparse
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+def worker(log_path, interval, lock_backend, lock_file):
+    os.environ['SCHEDULER_LOCK'] = lock_backend
+    os.environ['SCHEDULER_LOCK_FILE'] = lock_file
+    from datetime import datetime
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from backend.app.tasks import scheduler as scheduler_module
+    from backend.app.tasks import leader
+
+    def record():
+        with open(log_path, 'a') as f:
+            f.write(f"{os.getpid()} {time.time():.3f}\n")
+
+    sched = BackgroundScheduler()
+    sched.add_job(scheduler_module.leader_only(record), 'interval', seconds=interval, next_run_time=datetime.now())
+    sched.add_job(leader.is_leader, 'interval', seconds=max(1, interval // 2), next_run_time=datetime.now())
+    sched.start()
+    while True:
+        time.sleep(1)
+
+def read_log(log_path):
+    if not os.path.exists(log_path):
+        return []
+    with open(log_path) as f:
+        return [(int(pid), float(ts)) for pid, ts in (line.split() for line in f if line.strip())]
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that only one process runs scheduled jobs')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--interval', type=int, default=2, help='Job interval in seconds')
+    parser.add_argument('--duration', type=int, default=12, help='Seconds to run before and after killing the leader')
+    parser.add_argument('--lock', default='file', choices=['file', 'advisory'])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='leader_check_')
+    log_path = os.path.join(workdir, 'executions.log')
+    lock_file = os.path.join(workdir, 'scheduler.lock')
+
+    procs = [
+        multiprocessing.Process(target=worker, args=(log_path, args.interval, args.lock, lock_file), daemon=True)
+        for _ in range(args.workers)
+    ]
+    for p in procs:
+        p.start()
+
+    time.sleep(args.duration)
+    before = read_log(log_path)
+    leaders = {pid for pid, _ in before}
+    print(f"before kill: {len(before)} executions by {len(leaders)} process(es)")
+    if len(leaders) != 1:
+        print("✗ expected exactly one leader")
+        sys.exit(1)
+
+    leader_pid = leaders.pop()
+    os.kill(leader_pid, signal.SIGKILL)
+    kill_time = time.time()
+    time.sleep(args.duration)
+    after = [(pid, ts) for pid, ts in read_log(log_path) if ts > kill_time]
+    successors = {pid for pid, _ in after}
+    print(f"after kill:  {len(after)} executions by {len(successors)} process(es)")
+
+    for p in procs:
+        if p.is_alive():
+            p.terminate()
+
+    # The hand-over itself may land anywhere inside an interval, so spacing is
+    # checked within each leader's term
+    gaps = []
+    for term in (before, after):
+        times = sorted(ts for _, ts in term)
+        gaps.extend(b - a for a, b in zip(times, times[1:]))
+    overlapping = [g for g in gaps if g < args.interval * 0.5]
+
+    ok = len(successors) == 1 and leader_pid not in successors and not overlapping
+    print(f"min gap between executions: {min(gaps):.2f}s" if gaps else "no executions")
+    print("✓ single execution per interval with failover" if ok else "✗ leader election check failed")
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+本地 AQICN 模拟服务器
+按固定延迟返回 /feed/ 与 /map/bounds/ 接口的示例数据，用于压测同步流程
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+class FakeAqicnServer:
+    def __init__(self, latency=0.2, host='127.0.0.1', port=0, observed_at='2025-01-01T08:00:00+08:00',
+                 failure_rate=0.0, stations=None):
+        self.latency = latency
+        # /map/bounds/ 接口返回的站点列表：(lat, lon) 元组
+        self.stations = list(stations or [])
+        self.observed_at = observed_at
+        # 按该比例随机返回 503，用于验证重试与熔断
+        self.failure_rate = failure_rate
+        self.connection_count = 0
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset(self):
+        with self._lock:
+            self.request_count = 0
+            self.connection_count = 0
+
+    def _record_connection(self):
+        with self._lock:
+            self.connection_count += 1
+
+    def _record(self):
+        with self._lock:
+            self.request_count += 1
+
+    def _feed_payload(self, query):
+        return {
+            'status': 'ok',
+            'data': {
+                'aqi': 42,
+                'dominentpol': 'pm25',
+                'attributions': [{'name': 'Fake AQICN'}],
+                'city': {'name': query},
+                'time': {'iso': self.observed_at},
+                'iaqi': {
+                    'pm25': {'v': 42},
+                    'pm10': {'v': 30},
+                    'o3': {'v': 12},
+                    'no2': {'v': 8},
+                    'so2': {'v': 2},
+                    'co': {'v': 0.4},
+                },
+            },
+        }
+
+    def _bounds_payload(self, query):
+        try:
+            latlng = parse_qs(query).get('latlng', [''])[0]
+            lat1, lon1, lat2, lon2 = [float(x) for x in latlng.split(',')]
+        except ValueError:
+            return {'status': 'error', 'data': 'Invalid bounds'}
+        south, north = min(lat1, lat2), max(lat1, lat2)
+        west, east = min(lon1, lon2), max(lon1, lon2)
+        data = []
+        for uid, (lat, lon) in enumerate(self.stations):
+            if south <= lat <= north and west <= lon <= east:
+                data.append({
+                    'lat': lat,
+                    'lon': lon,
+                    'uid': uid,
+                    'aqi': '42',
+                    'station': {'name': f'Fake Station {uid}', 'time': self.observed_at},
+                })
+        return {'status': 'ok', 'data': data}
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1 keeps connections open so client-side pooling is measurable
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                server._record_connection()
+
+            def do_GET(self):
+                server._record()
+                time.sleep(server.latency)
+                status = 200
+                path, _, query = self.path.partition('?')
+                if server.failure_rate and random.random() < server.failure_rate:
+                    status = 503
+                    body = {'status': 'error', 'data': 'Service unavailable'}
+                elif path.startswith('/feed/'):
+                    body = server._feed_payload(path[len('/feed/'):].strip('/'))
+                elif path.rstrip('/') == '/map/bounds':
+                    body = server._bounds_payload(query)
+                else:
+                    body = {'status': 'error', 'data': 'Unknown request'}
+                raw = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -73,10 +73,10 @@ def check_imports():
         errors.append(f"✗ backend.app.tasks.scheduler: {e}")
     
     try:
-        print("✓ Importing backend.app.services.aqicn")
-        from backend.app.services.aqicn import sync_air_quality_data
+        print("✓ Importing backend.app.services.sources")
+        from backend.app.services.sources import sync_source
     except Exception as e:
-        errors.append(f"✗ backend.app.services.aqicn: {e}")
+        errors.append(f"✗ backend.app.services.sources: {e}")
     
     try:
         print("✓ Creating Flask app")
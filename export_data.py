@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+空气质量监测系统 - 历史数据导出脚本
+与 /data/export 接口输出相同：通过服务端游标流式读取，写出 CSV、NDJSON 或列式二进制文件，内存占用恒定
+"""
+
+import sys
+import time
+import argparse
+sys.path.insert(0, '.')
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from datetime import datetime
+
+def parse_args():
+    from backend.app.services.export import EXPORT_FORMATS
+
+    parser = argparse.ArgumentParser(description='Air quality history export tool')
+    parser.add_argument('--city-ids', default='',
+                        help='Comma-separated city ids (default: all cities)')
+    parser.add_argument('--start-time', type=datetime.fromisoformat, default=None,
+                        help='Earliest recorded_time, ISO format')
+    parser.add_argument('--end-time', type=datetime.fromisoformat, default=None,
+                        help='Latest recorded_time, ISO format')
+    parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+    parser.add_argument('--output', '-o', default=None,
+                        help='Output file (default: air_quality.<ext> in the current directory, "-" for stdout)')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    from backend.app.services import export
+
+    try:
+        city_ids = [int(x) for x in args.city_ids.split(',') if x.strip()] or None
+    except ValueError:
+        print(f"✗ 无效的城市 ID: {args.city_ids}", file=sys.stderr)
+        return 1
+
+    output = args.output or f"air_quality.{export.EXPORT_FORMATS[args.format][1]}"
+    stream, err = export.open_export(args.format, city_ids, args.start_time, args.end_time)
+    if err:
+        print(f"✗ 导出失败: {err}", file=sys.stderr)
+        return 1
+
+    start_time = time.time()
+    written = 0
+    fp = sys.stdout.buffer if output == '-' else open(output, 'wb')
+    try:
+        for chunk in stream:
+            fp.write(chunk)
+            written += len(chunk)
+    except Exception as e:
+        print(f"✗ 导出失败: {e}", file=sys.stderr)
+        return 1
+    finally:
+        stream.close()
+        if fp is not sys.stdout.buffer:
+            fp.close()
+
+    elapsed = time.time() - start_time
+    rate = stream.rows / elapsed if elapsed > 0 else 0
+    print(f"✓ 导出 {stream.rows} 行, {written / 1024 / 1024:.1f} MB -> {output} "
+          f"(耗时: {elapsed:.1f}秒, {rate:,.0f} 行/秒)", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,18 +1,18 @@
 #!/usr/bin/env python
 """
 空气质量监测系统 - 完整数据导入脚本
-支持从 AQICN API 导入空气质量数据
+支持从 AQICN API 导入空气质量数据，以及通过 COPY 批量导入 CSV/JSONL 历史数据
 """
 
 import sys
-import os
+import argparse
 sys.path.insert(0, '.')
 
 from dotenv import load_dotenv
 load_dotenv()
 
 from backend.app.repositories import cities, air_quality
-from backend.app.services.aqicn import sync_air_quality_data
+from backend.app.services.sources import sync_source
 from datetime import datetime
 import time
 
@@ -53,7 +53,7 @@ def sync_air_quality():
     
     try:
         start_time = time.time()
-        sync_air_quality_data()
+        sync_source('AQICN')
         elapsed = time.time() - start_time
         
         print("-" * 60)
@@ -93,8 +93,14 @@ def verify_data():
         cities_with_data = 0
         cities_without_data = 0
         
+        # 一次查询取回所有城市的最新数据
+        latest, error = air_quality.get_latest_air_quality_many([city['id'] for city in all_cities])
+        if error:
+            print(f"✗ 查询最新数据失败: {error}")
+            return False
+        
         for city in all_cities:
-            data = air_quality.get_latest_air_quality(city['id'])
+            data = latest.get(city['id'])
             if data:
                 aqi = data.get('aqi', 'N/A')
                 level = data.get('aqi_level', 'N/A')
@@ -113,7 +119,144 @@ def verify_data():
         print(f"✗ 验证失败: {e}")
         return False
 
+def import_history(paths, skip_rows=0):
+    """通过 COPY 分块批量导入历史数据文件；skip_rows 仅作用于第一个文件，用于中断后续传"""
+    from backend.app.services.history_import import import_history_file
+    
+    print(f"\n[历史数据导入] 共 {len(paths)} 个文件")
+    print("-" * 60)
+    
+    all_ok = True
+    for index, path in enumerate(paths):
+        try:
+            stats, err = import_history_file(path, skip_rows=skip_rows if index == 0 else 0)
+        except Exception as e:
+            stats, err = None, str(e)
+        
+        if err:
+            print(f"  ✗ {path} - 错误: {err}")
+            if stats and stats['committed_rows']:
+                print(f"    前 {stats['committed_rows']} 行已提交，可用 --history {path} --skip-rows {stats['committed_rows']} 续传")
+            all_ok = False
+            continue
+        
+        rate = stats['rows_per_second'] or 0
+        print(f"  ✓ {path}")
+        print(f"    读取 {stats['read']} 行, 跳过 {stats['skipped']} 行, "
+              f"写入 {stats['merged']} 行 ({stats['chunks']} 个事务), 耗时 {stats['seconds']:.1f}秒 ({rate:,.0f} 行/秒)")
+    
+    print("-" * 60)
+    return all_ok
+
+def rebuild_rollups(verify=False):
+    """根据原始数据重建日/月汇总表；启用数据保留策略时只重建仍保留原始数据的月份"""
+    from backend.app.repositories import rollups, partitions
+    from backend.app.tasks.scheduler import AQ_RETENTION_MONTHS
+    
+    print("\n[汇总表重建]")
+    print("-" * 60)
+    
+    since = partitions.retention_cutoff(AQ_RETENTION_MONTHS)
+    if since:
+        print(f"  保留策略 {AQ_RETENTION_MONTHS} 个月：{since:%Y-%m} 之前的汇总数据保持不变")
+    start_time = time.time()
+    result, err = rollups.rebuild_rollups(since=since)
+    if err:
+        print(f"  ✗ 重建失败: {err}")
+        return False
+    print(f"  ✓ 日汇总 {result['daily_rows']} 行, 月汇总 {result['monthly_rows']} 行 "
+          f"(耗时: {time.time() - start_time:.1f}秒)")
+    
+    if verify:
+        mismatches, err = rollups.verify_rollups(since=since)
+        if err:
+            print(f"  ✗ 校验失败: {err}")
+            return False
+        if mismatches:
+            print(f"  ✗ {len(mismatches)} 个城市月份与原始数据不一致:")
+            for item in mismatches[:20]:
+                print(f"    - city_id={item['city_id']} {item['month']}")
+            return False
+        print("  ✓ 汇总表与原始数据聚合结果一致")
+    
+    print("-" * 60)
+    return True
+
+def rebuild_usage():
+    """根据 user_analytics 原始事件重建访问日汇总表"""
+    from backend.app.repositories import analytics
+    
+    print("\n[访问统计汇总重建]")
+    print("-" * 60)
+    
+    start_time = time.time()
+    total, err = analytics.rebuild_usage_aggregates()
+    if err:
+        print(f"  ✗ 重建失败: {err}")
+        return False
+    print(f"  ✓ 已汇总 {total} 条访问事件 (耗时: {time.time() - start_time:.1f}秒)")
+    print("-" * 60)
+    return True
+
+def detect_anomalies(since=None):
+    """对历史数据运行异常检测，标记可疑读数"""
+    from backend.app.services import anomaly
+    
+    print("\n[异常检测]")
+    print("-" * 60)
+    
+    stats, err = anomaly.scan_history(since)
+    if err:
+        print(f"  ✗ 检测失败: {err}")
+        return False
+    rate = stats['rows'] / stats['seconds'] if stats['seconds'] else 0
+    print(f"  ✓ 检查 {stats['rows']} 行, 新标记 {stats['flagged']} 行, 取消标记 {stats['cleared']} 行 "
+          f"(耗时: {stats['seconds']:.1f}秒, {rate:,.0f} 行/秒)")
+    print("-" * 60)
+    return True
+
+def train_forecasts(workers=None):
+    """按历史数据重新训练所有城市的预测模型"""
+    from backend.app.services import forecast
+    
+    print("\n[训练预测模型]")
+    print("-" * 60)
+    
+    stats, err = forecast.train_all(workers)
+    if err:
+        print(f"  ✗ 训练失败: {err}")
+        return False
+    rate = stats['cities'] / stats['seconds'] if stats['seconds'] else 0
+    print(f"  ✓ {stats['cities']} 个城市, {stats['forecasts']} 个可预测 "
+          f"({stats['workers']} 个进程, 耗时: {stats['seconds']:.1f}秒, {rate:,.1f} 城市/秒)")
+    print("-" * 60)
+    return True
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Air quality data import tool')
+    parser.add_argument('--history', nargs='+', metavar='FILE',
+                        help='Bulk import historical readings from CSV/JSONL files instead of running the AQICN sync')
+    parser.add_argument('--skip-rows', type=int, default=0,
+                        help='Resume an interrupted --history import after this many rows of the first file')
+    parser.add_argument('--rebuild-rollups', action='store_true',
+                        help='Regenerate the daily/monthly rollup tables from air_quality_data')
+    parser.add_argument('--verify-rollups', action='store_true',
+                        help='Check the monthly rollups against a raw aggregation (implies --rebuild-rollups)')
+    parser.add_argument('--rebuild-usage', action='store_true',
+                        help='Regenerate the daily user analytics aggregates from user_analytics')
+    parser.add_argument('--detect-anomalies', action='store_true',
+                        help='Flag suspect readings in the stored history (rolling z-score + MAD)')
+    parser.add_argument('--since', type=datetime.fromisoformat, default=None,
+                        help='With --detect-anomalies: only re-check readings from this time on')
+    parser.add_argument('--train-forecasts', action='store_true',
+                        help='Refit every city forecast model from history in a process pool')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='With --train-forecasts: worker processes (default FORECAST_WORKERS)')
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    
     print("\n" + "=" * 60)
     print("🌍 空气质量监测系统 - 数据导入工具")
     print("=" * 60)
@@ -127,6 +270,21 @@ def main():
         print(f"\n✗ 数据库连接失败: {e}")
         return
     
+    if args.history or args.rebuild_rollups or args.verify_rollups or args.rebuild_usage or args.detect_anomalies \
+            or args.train_forecasts:
+        if args.history:
+            import_history(args.history, args.skip_rows)
+        if args.rebuild_rollups or args.verify_rollups:
+            rebuild_rollups(verify=args.verify_rollups)
+        if args.rebuild_usage:
+            rebuild_usage()
+        if args.detect_anomalies:
+            detect_anomalies(args.since)
+        if args.train_forecasts:
+            train_forecasts(args.workers)
+        print("=" * 60 + "\n")
+        return
+    
     # 步骤 1: 导入城市
     city_count = import_cities()
     
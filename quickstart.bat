@@ -64,6 +64,14 @@ echo    psql -U postgres -d air_quality_db -f backend\db\sql\003_create_air_qual
 echo    psql -U postgres -d air_quality_db -f backend\db\sql\004_create_health_advice.sql
 echo    psql -U postgres -d air_quality_db -f backend\db\sql\005_create_sync_logs.sql
 echo    psql -U postgres -d air_quality_db -f backend\db\sql\006_create_user_analytics.sql
+echo    psql -U postgres -d air_quality_db -f backend\db\sql\007_create_air_quality_rollups.sql
+echo    psql -U postgres -d air_quality_db -f backend\db\sql\008_partition_air_quality_data.sql
+echo    psql -U postgres -d air_quality_db -f backend\db\sql\009_create_user_analytics_daily.sql
+echo    psql -U postgres -d air_quality_db -f backend\db\sql\010_create_city_sync_state.sql
+echo    psql -U postgres -d air_quality_db -f backend\db\sql\011_add_city_sync_schedule.sql
+echo    psql -U postgres -d air_quality_db -f backend\db\sql\012_add_city_name_trigram_index.sql
+echo    psql -U postgres -d air_quality_db -f backend\db\sql\013_add_air_quality_suspect_flag.sql
+echo    psql -U postgres -d air_quality_db -f backend\db\sql\014_add_sync_state_source.sql
 echo.
 echo 4. 启动开发服务器
 echo    python run.py